@@ -1,14 +1,13 @@
 from flask import Flask, request, jsonify, render_template
 from dotenv import load_dotenv
 from python_viem import get_chain_by_id
-from web3 import Web3
-import base64
 from ccip_terminal.network import network_func
 import os
 import time
-import json
-from dataclasses import asdict
 from eth_account import Account
+from httpayer import tracing
+from httpayer_core.rpc_pool import get_web3
+from httpayer.codec import encode_header
 from httpayer.x402_exact import (
     verify_exact,
     settle_exact,
@@ -22,29 +21,15 @@ PRIVATE_KEY = PRIVATE_KEYS.split(",")[1] if PRIVATE_KEYS else None
 if not PRIVATE_KEY:
     raise ValueError("PRIVATE_KEYS environment variable must be set with at least one key.")
 
-w3 = network_func('avalanche')
 CHAIN_NAME = 'avalanche-fuji'
+# pooled AVALANCHE_FUJI_RPC_URLS when configured, else ccip-terminal's gateway
+w3 = get_web3(CHAIN_NAME) or network_func('avalanche')
 wallet  = Account.from_key(PRIVATE_KEY) if PRIVATE_KEY else None
 
 # ───────────────────────── helpers ───────────────────────────
 def _req_obj(j: dict) -> PaymentRequirements:
-    """Convert incoming JSON -> dataclass (minimal fields)."""
-    pr = j["paymentRequirements"]
-    return PaymentRequirements(
-        scheme              = pr["scheme"],
-        network             = pr["network"],
-        maxAmountRequired   = int(pr["maxAmountRequired"]),
-        resource            = pr["resource"],
-        payTo               = pr["payTo"],
-        asset               = Web3.to_checksum_address(pr["asset"]),
-        maxTimeoutSeconds   = pr.get("maxTimeoutSeconds", 60),
-        extra               = pr["extra"],
-    )
-
-def _encode_header(settle_resp: dict) -> str:
-    """exact-same Base64 (URL-safe, no padding) as JS SDK does."""
-    raw = json.dumps(settle_resp, separators=(",", ":")).encode()
-    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+    """Convert incoming JSON -> immutable requirements model."""
+    return PaymentRequirements.from_json(j["paymentRequirements"])
 
 # ───────────────────────── Flask app ─────────────────────────
 app = Flask(__name__)
@@ -61,18 +46,27 @@ def supported():
 
 @app.route("/facilitator/verify", methods=["POST"])
 def verify():
-    body = request.get_json(force=True)
-    payload = body["paymentPayload"]["payload"]
-    req     = _req_obj(body)
+    with tracing.span("facilitator.verify", parent=tracing.extract(request.headers)) as span:
+        with tracing.span("facilitator.decode"):
+            body = request.get_json(force=True)
+            payload = body["paymentPayload"]["payload"]
+            req     = _req_obj(body)
 
-    result = verify_exact(w3, payload, req)
-    return jsonify(asdict(result))
+        with tracing.span("facilitator.rpc", op="verify_exact"):
+            result = verify_exact(w3, payload, req)
+        span.set("valid", result.isValid)
+        return jsonify(result.to_dict())
 
 @app.route("/facilitator/settle", methods=["POST"])
 def settle():
-    body = request.get_json(force=True)
-    payload = body["paymentPayload"]["payload"]
-    req     = _req_obj(body)
+    with tracing.span("facilitator.settle", parent=tracing.extract(request.headers)):
+        return _settle()
+
+def _settle():
+    with tracing.span("facilitator.decode"):
+        body = request.get_json(force=True)
+        payload = body["paymentPayload"]["payload"]
+        req     = _req_obj(body)
 
     if wallet is None:
         payer = payload["authorization"]["from"]
@@ -82,10 +76,11 @@ def settle():
                         "network": req.network,
                         "payer": payer}), 200
 
-    result = settle_exact(w3, wallet, payload, req)
+    with tracing.span("facilitator.rpc", op="settle_exact"):
+        result = settle_exact(w3, wallet, payload, req)
     if result.success:
         # build header exactly like JS helper does
-        header = _encode_header({
+        header = encode_header({
             "success":    True,
             "transaction": result.transaction,
             "network":     result.network,
@@ -95,7 +90,7 @@ def settle():
         return jsonify({"header": header})
 
     # failure
-    return jsonify(asdict(result))
+    return jsonify(result.to_dict())
 
 if __name__ == "__main__":
     port = int(os.getenv("FACILITATOR_PORT", 5074))
@@ -0,0 +1,281 @@
+import time
+import atexit
+import hashlib
+import secrets
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from httpayer.cache import LRUCache
+
+class KeyBusy(RuntimeError):
+    """Raised when a key's concurrency slots stay taken for longer than the queue timeout."""
+
+def hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+class Tenant:
+    """Resolved API key: who it belongs to and how many calls it may run at once."""
+
+    __slots__ = ("key_hash", "name", "max_concurrency")
+
+    def __init__(self, key_hash: str, name: str, max_concurrency: int):
+        self.key_hash        = key_hash
+        self.name            = name
+        self.max_concurrency = max_concurrency
+
+class _FairSlots:
+    """
+    Counting semaphore that hands freed slots to waiters in arrival order.
+    At most `max_waiters` callers queue at once (None = unbounded); the rest
+    are turned away immediately.
+    """
+
+    def __init__(self, limit: int, max_waiters: Optional[int] = None):
+        self.limit       = limit
+        self.max_waiters = max_waiters
+        self.active      = 0
+        self.waiters     = deque()
+        self._lock       = threading.Lock()
+
+    def acquire(self, timeout: Optional[float]) -> bool:
+        with self._lock:
+            if self.active < self.limit and not self.waiters:
+                self.active += 1
+                return True
+            if self.max_waiters is not None and len(self.waiters) >= self.max_waiters:
+                return False
+            ticket = threading.Event()
+            self.waiters.append(ticket)
+        if ticket.wait(timeout):
+            return True
+        with self._lock:
+            if ticket.is_set():        # handed a slot just as we gave up
+                return True
+            self.waiters.remove(ticket)
+            return False
+
+    def release(self):
+        with self._lock:
+            if self.waiters:
+                # the slot passes straight to the oldest waiter
+                self.waiters.popleft().set()
+            else:
+                self.active -= 1
+
+class ApiKeyStore:
+    """
+    Multi-tenant API keys for the HTTPayer proxy.
+
+    Only SHA-256 hashes of the keys are stored (in SQLite). Lookups go
+    through an in-memory cache, which also remembers unknown keys briefly so
+    bad keys don't hit the database. Each key may run at most
+    `max_concurrency` proxied calls at once; up to `max_queued` extra calls
+    wait in FIFO order for up to `queue_timeout` seconds and any beyond that
+    are rejected at once. That way one busy tenant cannot occupy every
+    worker. Per-key call counts are buffered and written back in batches
+    (every `flush_every` calls, on `flush()` and at interpreter exit).
+
+    Keys are managed with `create`, `revoke`, `revoke_tenant` and
+    `set_limit`, or from the shell via `python -m x402_servers.keys`.
+    """
+
+    def __init__(self, db_path: str = ":memory:", *, cache_ttl: float = 60, cache_size: int = 10_000,
+                 max_concurrency: int = 4, queue_timeout: float = 5, max_queued: int = 8,
+                 flush_every: int = 100):
+        """
+        :param db_path: SQLite file holding keys and usage (":memory:" = process-local only).
+        :param cache_ttl: Seconds a looked-up key (or a miss) is trusted before re-reading it.
+        :param cache_size: Keys kept in the lookup cache.
+        :param max_concurrency: Default concurrent calls per key.
+        :param queue_timeout: Seconds a call waits for a free slot before `KeyBusy`.
+        :param max_queued: Calls per key allowed to wait for a slot; more raise `KeyBusy` at once.
+        :param flush_every: Calls buffered before usage counters are written back.
+        """
+        self.max_concurrency = max_concurrency
+        self.queue_timeout   = queue_timeout
+        self.max_queued      = max(0, int(max_queued))
+        self.flush_every     = max(1, int(flush_every))
+        self._cache          = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self._lock           = threading.Lock()
+        self._slots: Dict[str, _FairSlots] = {}
+        self._usage: Dict[str, int] = {}
+        self._pending = 0
+
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.executescript("""
+            CREATE TABLE IF NOT EXISTS api_keys (
+                key_hash        TEXT PRIMARY KEY,
+                tenant          TEXT NOT NULL,
+                max_concurrency INTEGER,
+                active          INTEGER NOT NULL DEFAULT 1,
+                created_at      INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS api_key_usage (
+                key_hash  TEXT PRIMARY KEY,
+                calls     INTEGER NOT NULL DEFAULT 0,
+                last_used INTEGER
+            );
+        """)
+        self._con.commit()
+        atexit.register(self.flush)
+
+    def create(self, tenant: str, max_concurrency: Optional[int] = None) -> str:
+        """Issue a new key for `tenant` and return it; only its hash is kept."""
+        api_key = "hp_" + secrets.token_urlsafe(32)
+        self.add(api_key, tenant, max_concurrency)
+        return api_key
+
+    def add(self, api_key: str, tenant: str, max_concurrency: Optional[int] = None,
+            exclusive: bool = False):
+        """
+        Register an existing key (e.g. one taken from the environment).
+
+        With `exclusive`, every other key of `tenant` is revoked, so a rotated
+        key stops working as soon as its replacement is registered.
+        """
+        key_hash = hash_key(api_key)
+        with self._lock:
+            if exclusive:
+                self._con.execute(
+                    "UPDATE api_keys SET active = 0 WHERE tenant = ? AND key_hash != ?",
+                    (tenant, key_hash),
+                )
+                self._cache.clear()
+            self._con.execute(
+                "INSERT OR REPLACE INTO api_keys (key_hash, tenant, max_concurrency, active, created_at) "
+                "VALUES (?, ?, ?, 1, ?)",
+                (key_hash, tenant, max_concurrency, int(time.time())),
+            )
+            self._con.commit()
+        self._cache.pop(key_hash)
+
+    def revoke(self, api_key: str):
+        key_hash = hash_key(api_key)
+        with self._lock:
+            self._con.execute("UPDATE api_keys SET active = 0 WHERE key_hash = ?", (key_hash,))
+            self._con.commit()
+        self._cache.pop(key_hash)
+
+    def revoke_tenant(self, tenant: str) -> int:
+        """Revoke every key of `tenant`; returns how many were active."""
+        with self._lock:
+            count = self._con.execute(
+                "UPDATE api_keys SET active = 0 WHERE tenant = ? AND active = 1", (tenant,)
+            ).rowcount
+            self._con.commit()
+        self._cache.clear()
+        return count
+
+    def set_limit(self, tenant: str, max_concurrency: Optional[int]) -> int:
+        """
+        Change the concurrency limit of all of `tenant`'s active keys.
+
+        :param max_concurrency: New per-key limit; None falls back to the store default.
+        :returns: Number of keys updated.
+        """
+        with self._lock:
+            count = self._con.execute(
+                "UPDATE api_keys SET max_concurrency = ? WHERE tenant = ? AND active = 1",
+                (max_concurrency, tenant),
+            ).rowcount
+            self._con.commit()
+        self._cache.clear()
+        return count
+
+    def tenants(self) -> List[dict]:
+        """Active tenants with their key count, per-key limit and flushed call count."""
+        self.flush()
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT k.tenant, COUNT(*), MAX(k.max_concurrency), COALESCE(SUM(u.calls), 0) "
+                "FROM api_keys k LEFT JOIN api_key_usage u ON u.key_hash = k.key_hash "
+                "WHERE k.active = 1 GROUP BY k.tenant ORDER BY k.tenant"
+            ).fetchall()
+        return [{"tenant": name, "keys": keys, "max_concurrency": limit or self.max_concurrency,
+                 "calls": calls} for name, keys, limit, calls in rows]
+
+    def lookup(self, api_key: Optional[str]) -> Optional[Tenant]:
+        """The tenant owning `api_key`, or None if it is unknown or revoked."""
+        if not api_key:
+            return None
+        key_hash = hash_key(api_key)
+        cached = self._cache.get(key_hash)
+        if cached is not None:
+            return cached or None
+        with self._lock:
+            row = self._con.execute(
+                "SELECT tenant, max_concurrency FROM api_keys WHERE key_hash = ? AND active = 1",
+                (key_hash,),
+            ).fetchone()
+        tenant = Tenant(key_hash, row[0], row[1] or self.max_concurrency) if row else None
+        self._cache.set(key_hash, tenant or False)
+        return tenant
+
+    def _slots_for(self, tenant: Tenant) -> _FairSlots:
+        with self._lock:
+            slots = self._slots.get(tenant.key_hash)
+            if slots is None:
+                slots = self._slots[tenant.key_hash] = _FairSlots(tenant.max_concurrency, self.max_queued)
+            elif slots.limit != tenant.max_concurrency:
+                # limit changed since the key was first used (see `set_limit`)
+                slots.limit = tenant.max_concurrency
+            return slots
+
+    def acquire(self, tenant: Tenant):
+        """
+        Take one of the tenant's concurrency slots and count the call.
+
+        :raises KeyBusy: if the key's queue is full or no slot frees up within `queue_timeout`
+        """
+        if not self._slots_for(tenant).acquire(self.queue_timeout):
+            raise KeyBusy(f"too many concurrent requests for this API key "
+                          f"(limit {tenant.max_concurrency})")
+        self._record(tenant.key_hash)
+
+    def release(self, tenant: Tenant):
+        self._slots_for(tenant).release()
+
+    @contextmanager
+    def slot(self, tenant: Tenant):
+        self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release(tenant)
+
+    def _record(self, key_hash: str):
+        with self._lock:
+            self._usage[key_hash] = self._usage.get(key_hash, 0) + 1
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush_locked()
+
+    def usage(self, api_key: str) -> int:
+        """Total calls made with `api_key`, including ones not yet flushed."""
+        key_hash = hash_key(api_key)
+        with self._lock:
+            row = self._con.execute(
+                "SELECT calls FROM api_key_usage WHERE key_hash = ?", (key_hash,)
+            ).fetchone()
+            return (row[0] if row else 0) + self._usage.get(key_hash, 0)
+
+    def flush(self):
+        """Write buffered usage counters back to SQLite."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._usage:
+            now = int(time.time())
+            self._con.executemany(
+                "INSERT INTO api_key_usage (key_hash, calls, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT(key_hash) DO UPDATE SET calls = calls + excluded.calls, "
+                "last_used = excluded.last_used",
+                [(h, n, now) for h, n in self._usage.items()],
+            )
+            self._con.commit()
+            self._usage.clear()
+        self._pending = 0
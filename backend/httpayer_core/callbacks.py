@@ -0,0 +1,207 @@
+import json
+import time
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# responses worth another attempt; any other 4xx goes straight to dead letters
+RETRYABLE_STATUSES = {408, 425, 429}
+
+class CallbackDispatcher:
+    """
+    Durable background delivery of payment callbacks (webhooks).
+
+    `submit()` only records the callback in SQLite and wakes a worker, so the
+    paying request never waits on the receiver. Worker threads POST each
+    callback through a per-host pooled session, retry failures with
+    exponential backoff and move callbacks that keep failing (or that the
+    receiver rejects outright) to a dead-letter state kept in the same table.
+    Undelivered callbacks survive a restart.
+    """
+
+    def __init__(self, db_path: str = ":memory:", *, workers: int = 4, max_queue: int = 10_000,
+                 max_attempts: int = 5, backoff: float = 1.0, max_backoff: float = 300,
+                 timeout=(3, 10), pool_size: int = 4):
+        """
+        :param db_path: SQLite file backing the queue (":memory:" = process-local only).
+        :param workers: Number of delivery threads.
+        :param max_queue: Pending callbacks kept before new ones are dead-lettered as ``queue_full``.
+        :param max_attempts: Deliveries tried before a callback is dead-lettered.
+        :param backoff: Base delay in seconds between attempts, doubled per failure.
+        :param max_backoff: Upper bound on that delay.
+        :param timeout: (connect, read) timeout for each delivery.
+        :param pool_size: Keep-alive connections kept per receiver host.
+        """
+        self.max_queue    = max_queue
+        self.max_attempts = max_attempts
+        self.backoff      = backoff
+        self.max_backoff  = max_backoff
+        self.timeout      = timeout
+        self.pool_size    = pool_size
+
+        self._lock     = threading.Lock()
+        self._wake     = threading.Condition(self._lock)
+        self._stopping = False
+        self._sessions: Dict[str, requests.Session] = {}
+
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS callbacks (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                url          TEXT NOT NULL,
+                body         TEXT NOT NULL,
+                status       TEXT NOT NULL DEFAULT 'pending',
+                attempts     INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                last_error   TEXT,
+                created_at   REAL NOT NULL
+            )
+        """)
+        self._con.execute("CREATE INDEX IF NOT EXISTS callbacks_due ON callbacks (status, next_attempt)")
+        # deliveries interrupted by a crash are simply tried again
+        self._con.execute("UPDATE callbacks SET status = 'pending' WHERE status = 'sending'")
+        self._con.commit()
+
+        self._threads = [threading.Thread(target=self._run, name=f"callback-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, url: str, body: dict) -> bool:
+        """
+        Queue `body` to be POSTed as JSON to `url`.
+
+        :return: False if the queue was full and the callback went straight to dead letters
+        """
+        now = time.time()
+        with self._lock:
+            pending = self._con.execute(
+                "SELECT COUNT(*) FROM callbacks WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+            full = pending >= self.max_queue
+            self._con.execute(
+                "INSERT INTO callbacks (url, body, status, next_attempt, last_error, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, json.dumps(body), "dead" if full else "pending", now,
+                 "queue_full" if full else None, now),
+            )
+            self._con.commit()
+            if not full:
+                self._wake.notify()
+        if full:
+            logging.warning(f"[callbacks] queue full, dead-lettered callback to {url}")
+        return not full
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._con.execute(
+                "SELECT COUNT(*) FROM callbacks WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+
+    def dead_letters(self, limit: int = 100) -> List[dict]:
+        """Most recent callbacks that gave up, newest first."""
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT id, url, body, attempts, last_error, created_at FROM callbacks "
+                "WHERE status = 'dead' ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"id": r[0], "url": r[1], "body": json.loads(r[2]), "attempts": r[3],
+                 "last_error": r[4], "created_at": r[5]} for r in rows]
+
+    def requeue(self, callback_id: int) -> bool:
+        """Give a dead-lettered callback a fresh set of attempts."""
+        with self._lock:
+            cur = self._con.execute(
+                "UPDATE callbacks SET status = 'pending', attempts = 0, next_attempt = ? "
+                "WHERE id = ? AND status = 'dead'", (time.time(), callback_id)
+            )
+            self._con.commit()
+            if cur.rowcount:
+                self._wake.notify()
+            return bool(cur.rowcount)
+
+    def close(self, timeout: Optional[float] = 5):
+        """Stop the workers; anything still queued is delivered after the next start."""
+        with self._lock:
+            self._stopping = True
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        for s in self._sessions.values():
+            s.close()
+
+    def _session(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._sessions[host] = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+            return session
+
+    def _claim(self):
+        """Block until a callback is due and mark it as being sent (lock held by caller)."""
+        while not self._stopping:
+            now = time.time()
+            row = self._con.execute(
+                "SELECT id, url, body, attempts FROM callbacks WHERE status = 'pending' "
+                "AND next_attempt <= ? ORDER BY next_attempt LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                self._con.execute("UPDATE callbacks SET status = 'sending' WHERE id = ?", (row[0],))
+                self._con.commit()
+                return row
+            nxt = self._con.execute(
+                "SELECT MIN(next_attempt) FROM callbacks WHERE status = 'pending'"
+            ).fetchone()[0]
+            self._wake.wait(None if nxt is None else max(0.0, nxt - now))
+        return None
+
+    def _run(self):
+        while True:
+            with self._lock:
+                row = self._claim()
+            if row is None:
+                return
+            cb_id, url, body, attempts = row
+            error, retryable = None, True
+            try:
+                resp = self._session(url).post(url, data=body, timeout=self.timeout,
+                                               headers={"Content-Type": "application/json"})
+                if resp.status_code >= 300:
+                    error = f"HTTP {resp.status_code}"
+                    retryable = resp.status_code >= 500 or resp.status_code in RETRYABLE_STATUSES
+                resp.close()
+            except requests.RequestException as e:
+                error = str(e)
+            except Exception as e:
+                # e.g. a malformed callback URL; no retry will fix it
+                error, retryable = f"{type(e).__name__}: {e}", False
+            self._finish(cb_id, url, attempts + 1, error, retryable)
+
+    def _finish(self, cb_id: int, url: str, attempts: int, error: Optional[str], retryable: bool):
+        with self._lock:
+            if error is None:
+                self._con.execute("DELETE FROM callbacks WHERE id = ?", (cb_id,))
+            elif not retryable or attempts >= self.max_attempts:
+                self._con.execute(
+                    "UPDATE callbacks SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, cb_id),
+                )
+                logging.warning(f"[callbacks] giving up on {url} after {attempts} attempt(s): {error}")
+            else:
+                delay = min(self.max_backoff, self.backoff * (2 ** (attempts - 1)))
+                self._con.execute(
+                    "UPDATE callbacks SET status = 'pending', attempts = ?, last_error = ?, "
+                    "next_attempt = ? WHERE id = ?",
+                    (attempts, error, time.time() + delay, cb_id),
+                )
+                self._wake.notify()
+            self._con.commit()
@@ -0,0 +1,195 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Union
+
+from web3 import Web3
+
+from httpayer.signer import PresignedSigner
+
+from .rpc_pool import get_web3
+
+BALANCE_OF_ABI = [{
+    "constant": True,
+    "inputs": [{"name": "account", "type": "address"}],
+    "name": "balanceOf",
+    "outputs": [{"name": "", "type": "uint256"}],
+    "stateMutability": "view",
+    "type": "function",
+}]
+
+class BalanceTracker:
+    """
+    In-memory token balances per (payer, network, asset), refreshed from chain.
+
+    Balances are debited locally as payments succeed, so routing stays
+    accurate between refreshes. All chain reads happen on a background
+    thread: it re-reads every tracked balance each `refresh_secs`, and reads
+    a newly asked-for balance as soon as it is first requested. Until that
+    read succeeds (and on networks without an RPC URL) the balance is None.
+    """
+
+    def __init__(self, rpc_urls: Dict[str, Union[str, List[str]]], refresh_secs: float = 30):
+        """
+        :param rpc_urls: x402 network id -> JSON-RPC URL(s), read through the shared `RpcPool`.
+        :param refresh_secs: Seconds between on-chain refreshes.
+        """
+        self.refresh_secs = refresh_secs
+        self._w3 = {}
+        for net, urls in rpc_urls.items():
+            w3 = get_web3(net, [urls] if isinstance(urls, str) else urls)
+            if w3 is not None:
+                self._w3[net] = w3
+        self._balances: Dict[tuple, Optional[int]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="payer-balances", daemon=True)
+        self._thread.start()
+
+    def tracks(self, network: str) -> bool:
+        return network in self._w3
+
+    def _fetch(self, key: tuple) -> Optional[int]:
+        address, network, asset = key
+        try:
+            token = self._w3[network].eth.contract(address=Web3.to_checksum_address(asset),
+                                                   abi=BALANCE_OF_ABI)
+            return token.functions.balanceOf(address).call()
+        except Exception as e:
+            logging.warning(f"[payers] balance refresh failed for {address} on {network}: {e}")
+            return None
+
+    def get(self, address: str, network: str, asset: str) -> Optional[int]:
+        """
+        Known balance, or None while it is unknown. Never touches the chain:
+        the first ask only queues the balance for the refresher thread.
+        """
+        if network not in self._w3:
+            return None
+        key = (address, network, asset.lower())
+        with self._lock:
+            if key in self._balances:
+                return self._balances[key]
+            self._balances[key] = None
+        self._wake.set()
+        return None
+
+    def debit(self, address: str, network: str, asset: str, amount: int):
+        key = (address, network, asset.lower())
+        with self._lock:
+            if self._balances.get(key) is not None:
+                self._balances[key] -= amount
+
+    def refresh(self, only_unknown: bool = False):
+        """Re-read tracked balances from chain; a failed read keeps the last known value."""
+        with self._lock:
+            keys = [k for k, v in self._balances.items() if v is None or not only_unknown]
+        for key in keys:
+            balance = self._fetch(key)
+            if balance is not None:
+                with self._lock:
+                    self._balances[key] = balance
+
+    def _run(self):
+        deadline = time.monotonic() + self.refresh_secs
+        while not self._stop.is_set():
+            woken = self._wake.wait(max(0.0, deadline - time.monotonic()))
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            if time.monotonic() >= deadline:
+                self.refresh()
+                deadline = time.monotonic() + self.refresh_secs
+            elif woken:
+                self.refresh(only_unknown=True)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+
+class PayerPool:
+    """
+    Spreads x402 payments across several funded accounts.
+
+    Each payment goes to the account with the fewest payments in flight that
+    can still cover the amount on the requirement's network (balance minus
+    what its in-flight payments have reserved), preferring the larger
+    balance on ties. Each account signs through its own `PresignedSigner`.
+    """
+
+    def __init__(self, private_keys: Iterable[str], *, rpc_urls: Optional[Dict[str, Union[str, List[str]]]] = None,
+                 refresh_secs: float = 30, pool_size: int = 4):
+        """
+        :param private_keys: Hex private keys of the paying accounts.
+        :param rpc_urls: x402 network id -> JSON-RPC URL(s) used to track balances.
+        :param refresh_secs: Seconds between on-chain balance refreshes.
+        :param pool_size: Pre-signed authorizations kept per account and target.
+        """
+        self.signers: List[PresignedSigner] = [PresignedSigner(k, pool_size=pool_size)
+                                               for k in private_keys]
+        if not self.signers:
+            raise ValueError("PayerPool needs at least one private key")
+        self.balances = BalanceTracker(rpc_urls or {}, refresh_secs)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, int] = {s.address: 0 for s in self.signers}
+        self._reserved: Dict[tuple, int] = {}
+
+    def _pick(self, network: str, asset: str, amount: int) -> PresignedSigner:
+        # memory-only reads; an unknown balance (None) does not exclude an account
+        balances = {s.address: self.balances.get(s.address, network, asset) for s in self.signers}
+        with self._lock:
+            best, best_rank = None, None
+            for s in self.signers:
+                balance = balances[s.address]
+                if balance is not None:
+                    balance -= self._reserved.get((s.address, network, asset), 0)
+                    if balance < amount:
+                        continue
+                rank = (self._inflight[s.address], -(balance or 0))
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = s, rank
+            if best is None:
+                raise RuntimeError(f"No payer account can cover {amount} on {network}")
+            self._inflight[best.address] += 1
+            key = (best.address, network, asset)
+            self._reserved[key] = self._reserved.get(key, 0) + amount
+            return best
+
+    @contextmanager
+    def acquire(self, requirement: dict):
+        """
+        Reserve an account for paying `requirement` and yield its signer.
+
+        Set ``paid = True`` on the yielded holder once the payment went
+        through so the account's tracked balance is debited:
+
+            with pool.acquire(exact) as payer:
+                resp = send(payer.signer)
+                payer.paid = resp.status_code < 400
+        """
+        network, asset = requirement["network"], requirement["asset"].lower()
+        amount = int(requirement["maxAmountRequired"])
+        signer = self._pick(network, asset, amount)
+        holder = _Payer(signer)
+        try:
+            yield holder
+        finally:
+            with self._lock:
+                self._inflight[signer.address] -= 1
+                self._reserved[(signer.address, network, asset)] -= amount
+            if holder.paid:
+                self.balances.debit(signer.address, network, asset, amount)
+
+    def close(self):
+        self.balances.close()
+        for s in self.signers:
+            s.close()
+
+class _Payer:
+    __slots__ = ("signer", "paid")
+
+    def __init__(self, signer: PresignedSigner):
+        self.signer = signer
+        self.paid = False
@@ -0,0 +1,225 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional
+
+from requests.exceptions import ConnectionError as RequestsConnectionError, ConnectTimeout
+from urllib3.exceptions import NewConnectionError
+from web3 import Web3
+from web3.exceptions import ProviderConnectionError
+from web3.providers import HTTPProvider, JSONBaseProvider
+
+# never sent to two endpoints at once: writes, and filters that live on one node
+NO_HEDGE_METHODS = {
+    "eth_sendRawTransaction", "eth_sendTransaction",
+    "eth_newFilter", "eth_newBlockFilter", "eth_newPendingTransactionFilter",
+    "eth_getFilterChanges", "eth_getFilterLogs", "eth_uninstallFilter",
+}
+
+# may already have been broadcast once the request reached a node, so these
+# only fail over when the connection could not be made at all
+SEND_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+
+def _never_sent(error: Exception) -> bool:
+    """True if `error` means the request never reached the endpoint."""
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, RequestsConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", error.args[0]), NewConnectionError)
+    return False
+
+class _Endpoint:
+    """One RPC URL with its smoothed latency and failure state."""
+
+    __slots__ = ("url", "provider", "latency", "failures", "down_until", "lock")
+
+    def __init__(self, url: str, timeout: float):
+        self.url        = url
+        # retries are the pool's job (on another endpoint), not the provider's
+        self.provider   = HTTPProvider(url, request_kwargs={"timeout": timeout},
+                                       exception_retry_configuration=None)
+        self.latency    = None          # EWMA of successful calls, seconds
+        self.failures   = 0             # consecutive
+        self.down_until = 0.0
+        self.lock       = threading.Lock()
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+class RpcPool(JSONBaseProvider):
+    """
+    web3 provider spreading one chain's JSON-RPC traffic over several URLs.
+
+    Each call goes to the healthy endpoint with the lowest moving-average
+    latency (endpoints not measured yet are tried first). Reads still
+    unanswered after `hedge_factor` times that endpoint's usual latency are
+    also sent to the next endpoint, and the first answer wins. Endpoints that
+    error or time out are skipped for a cooldown that doubles with each
+    consecutive failure, and the call fails over to the next one. While
+    every endpoint is cooling down calls fail fast; an endpoint is tried
+    again once its cooldown ends. Transactions and filter calls are never
+    hedged, only failed over; transactions only while no connection could be
+    made, since a timed-out send may still have been broadcast.
+
+        w3 = Web3(RpcPool(["https://rpc-a.example", "https://rpc-b.example"]))
+    """
+
+    def __init__(self, urls: Iterable[str], *, timeout: float = 10, alpha: float = 0.2,
+                 hedge_factor: float = 3.0, min_hedge: float = 0.2, max_hedges: int = 1,
+                 cooldown: float = 5, max_cooldown: float = 300):
+        """
+        :param urls: JSON-RPC URLs serving the same chain.
+        :param timeout: Seconds before a single request to one endpoint is abandoned.
+        :param alpha: Weight of the newest sample in the latency moving average.
+        :param hedge_factor: Hedge a read once it has taken this many times the endpoint's average latency.
+        :param min_hedge: Never hedge before this many seconds.
+        :param max_hedges: Extra endpoints a single read may be sent to.
+        :param cooldown: Seconds an endpoint is skipped after a failure, doubled per consecutive failure.
+        :param max_cooldown: Upper bound on that cooldown.
+        """
+        super().__init__()
+        urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+        if not urls:
+            raise ValueError("RpcPool needs at least one RPC URL")
+        self.endpoints    = [_Endpoint(u, timeout) for u in urls]
+        self.timeout      = timeout
+        self.alpha        = alpha
+        self.hedge_factor = hedge_factor
+        self.min_hedge    = min_hedge
+        self.max_hedges   = max_hedges
+        self.cooldown     = cooldown
+        self.max_cooldown = max_cooldown
+        self._executor    = (ThreadPoolExecutor(max_workers=4 * len(urls), thread_name_prefix="rpc-pool")
+                             if len(urls) > 1 else None)
+
+    def __repr__(self):
+        return f"RpcPool({[e.url for e in self.endpoints]})"
+
+    def ranked(self) -> List[_Endpoint]:
+        """Healthy endpoints in the order calls try them, fastest first."""
+        now = time.monotonic()
+        return sorted((e for e in self.endpoints if e.healthy(now)), key=lambda e: e.latency or 0.0)
+
+    def _candidates(self) -> List[_Endpoint]:
+        candidates = self.ranked()
+        if not candidates:
+            retry = min(e.down_until for e in self.endpoints) - time.monotonic()
+            raise ProviderConnectionError(f"all RPC endpoints are cooling down "
+                                          f"(next retry in {max(0.0, retry):.1f}s)")
+        return candidates
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [{"url": e.url, "healthy": e.healthy(now), "failures": e.failures,
+                 "latency_ms": None if e.latency is None else round(e.latency * 1000, 1)}
+                for e in self.endpoints]
+
+    def _record(self, endpoint: _Endpoint, elapsed: Optional[float], error: Optional[Exception]):
+        with endpoint.lock:
+            if error is None:
+                endpoint.failures   = 0
+                endpoint.down_until = 0.0
+                endpoint.latency    = (elapsed if endpoint.latency is None
+                                       else self.alpha * elapsed + (1 - self.alpha) * endpoint.latency)
+                return
+            endpoint.failures  += 1
+            pause = min(self.max_cooldown, self.cooldown * 2 ** (endpoint.failures - 1))
+            endpoint.down_until = time.monotonic() + pause
+        logging.warning(f"[rpc_pool] {endpoint.url} failed ({endpoint.failures}x), "
+                        f"skipping it for {pause:.0f}s: {error}")
+
+    def _call(self, endpoint: _Endpoint, fn, *args):
+        start = time.monotonic()
+        try:
+            result = fn(endpoint.provider, *args)
+        except Exception as e:
+            self._record(endpoint, None, e)
+            raise
+        self._record(endpoint, time.monotonic() - start, None)
+        return result
+
+    def _hedge_delay(self, endpoint: _Endpoint) -> float:
+        if endpoint.latency is None:
+            return max(self.min_hedge, self.timeout / 2)
+        return max(self.min_hedge, self.hedge_factor * endpoint.latency)
+
+    def _failover(self, fn, *args, unsent_only: bool = False):
+        last_error = None
+        for endpoint in self._candidates():
+            try:
+                return self._call(endpoint, fn, *args)
+            except Exception as e:
+                if unsent_only and not _never_sent(e):
+                    raise
+                last_error = e
+        raise last_error
+
+    def _hedged(self, fn, *args):
+        candidates = self._candidates()
+        pending, hedges, last_error = {}, 0, None
+
+        def launch():
+            endpoint = candidates.pop(0)
+            pending[self._executor.submit(self._call, endpoint, fn, *args)] = endpoint
+
+        launch()
+        while pending:
+            can_hedge = candidates and hedges < self.max_hedges
+            timeout = min(self._hedge_delay(e) for e in pending.values()) if can_hedge else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedges += 1
+                launch()
+                continue
+            for future in done:
+                pending.pop(future)
+                if future.exception() is None:
+                    # slower duplicates finish in the background and still update latencies
+                    return future.result()
+                last_error = future.exception()
+            if not pending and candidates:
+                launch()
+        raise last_error
+
+    def make_request(self, method, params):
+        if self._executor is None or method in NO_HEDGE_METHODS:
+            return self._failover(HTTPProvider.make_request, method, params,
+                                  unsent_only=method in SEND_METHODS)
+        return self._hedged(HTTPProvider.make_request, method, params)
+
+    def make_batch_request(self, batch_requests):
+        return self._failover(HTTPProvider.make_batch_request, batch_requests)
+
+_pools: Dict[tuple, RpcPool] = {}
+_pools_lock = threading.Lock()
+
+def rpc_urls(network: str) -> List[str]:
+    """
+    RPC URLs configured for `network` (an x402 id such as ``base-sepolia`` or
+    a chain name such as ``base``): the comma-separated ``<NETWORK>_RPC_URLS``
+    plus the older single ``<NETWORK>_GATEWAY``, e.g. ``BASE_SEPOLIA_RPC_URLS``.
+    """
+    prefix = network.upper().replace("-", "_")
+    urls = os.getenv(f"{prefix}_RPC_URLS", "").split(",") + [os.getenv(f"{prefix}_GATEWAY", "")]
+    return list(dict.fromkeys(u.strip() for u in urls if u.strip()))
+
+def get_pool(network: str, urls: Optional[Iterable[str]] = None) -> Optional[RpcPool]:
+    """
+    The process-wide pool for `network`, shared by every caller in this
+    process. `urls` defaults to `rpc_urls(network)`; None if there are none.
+    """
+    urls = tuple(rpc_urls(network) if urls is None else [u for u in urls if u])
+    if not urls:
+        return None
+    with _pools_lock:
+        pool = _pools.get((network, urls))
+        if pool is None:
+            pool = _pools[(network, urls)] = RpcPool(urls)
+        return pool
+
+def get_web3(network: str, urls: Optional[Iterable[str]] = None) -> Optional[Web3]:
+    """`Web3` on the shared pool for `network`, or None if it has no RPC URLs configured."""
+    pool = get_pool(network, urls)
+    return Web3(pool) if pool is not None else None
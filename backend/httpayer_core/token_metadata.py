@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from web3 import Web3
+
+from .rpc_pool import get_web3
+
+EIP712_METADATA_ABI = [
+    {"constant": True, "inputs": [], "name": "name", "outputs": [{"name": "", "type": "string"}],
+     "stateMutability": "view", "type": "function"},
+    {"constant": True, "inputs": [], "name": "version", "outputs": [{"name": "", "type": "string"}],
+     "stateMutability": "view", "type": "function"},
+]
+
+# EIP-712 domain name/version of the USDC deployments x402 uses
+DEFAULT_TOKENS = {
+    ("base", "0x833589fcd6edb6e08f4c7c32d4f71b54bda02913"): {"name": "USD Coin", "version": "2"},
+    ("base-sepolia", "0x036cbd53842c5426634e7929541ec2318f3dcf7e"): {"name": "USDC", "version": "2"},
+    ("avalanche", "0xb97ef9ef8734c71904d8002f8b6bc66dd9c48a6e"): {"name": "USD Coin", "version": "2"},
+    ("avalanche-fuji", "0x5425890298aed601595a70ab815c96711a31bc65"): {"name": "USD Coin", "version": "2"},
+}
+
+def fetch_token_metadata(network: str, asset: str) -> Dict[str, str]:
+    """Read a token's EIP-712 ``name()`` and ``version()`` from chain through the shared RPC pool."""
+    w3 = get_web3(network)
+    if w3 is None:
+        raise RuntimeError(f"No RPC URL configured for network: {network}")
+    token = w3.eth.contract(address=Web3.to_checksum_address(asset), abi=EIP712_METADATA_ABI)
+    return {"name": token.functions.name().call(), "version": token.functions.version().call()}
+
+class TokenMetadataRegistry:
+    """
+    EIP-712 ``name``/``version`` per (network, asset), kept on disk.
+
+    Answers come from memory: the bundled `DEFAULT_TOKENS`, overlaid with
+    whatever the JSON file at `path` recorded on earlier runs, so building an
+    `X402Gate` needs no RPC call. Unknown tokens are read from chain on first
+    use and persisted. A background thread re-reads entries older than
+    `refresh_secs` (bundled defaults count as never checked) and saves them.
+    """
+
+    def __init__(self, path: Optional[str] = None, *, refresh_secs: float = 24 * 3600,
+                 defaults: Optional[dict] = None,
+                 fetch: Callable[[str, str], Dict[str, str]] = fetch_token_metadata):
+        """
+        :param path: JSON file persisting entries between runs (None = memory only).
+        :param refresh_secs: Age after which an entry is re-read from chain in the background (0 disables).
+        :param defaults: (network, asset) -> {"name", "version"}; `DEFAULT_TOKENS` if omitted.
+        :param fetch: Reads one token's metadata from chain.
+        """
+        self.path         = os.path.expanduser(path) if path else None
+        self.refresh_secs = refresh_secs
+        self._fetch       = fetch
+        self._lock        = threading.Lock()
+        self._entries: Dict[str, dict] = {
+            self._key(net, asset): dict(meta, checked_at=0)
+            for (net, asset), meta in (DEFAULT_TOKENS if defaults is None else defaults).items()
+        }
+        self._load()
+        self._stop = threading.Event()
+        if refresh_secs:
+            threading.Thread(target=self._run, name="token-metadata", daemon=True).start()
+
+    @staticmethod
+    def _key(network: str, asset: str) -> str:
+        return f"{network}:{asset.lower()}"
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, entry in stored.items():
+            if isinstance(entry, dict) and "name" in entry and "version" in entry:
+                self._entries[key] = entry
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = dict(self._entries)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp, self.path)
+
+    def get(self, network: str, asset: str) -> Dict[str, str]:
+        """
+        ``{"name", "version"}`` for the token, reading it from chain only if
+        it was never seen before.
+
+        :raises RuntimeError: if the token is unknown and cannot be read from chain
+        """
+        key = self._key(network, asset)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._refresh_one(network, asset)
+        return {"name": entry["name"], "version": entry["version"]}
+
+    def put(self, network: str, asset: str, name: str, version: str):
+        """Record metadata known out of band (e.g. from configuration)."""
+        with self._lock:
+            self._entries[self._key(network, asset)] = {"name": name, "version": version,
+                                                         "checked_at": time.time()}
+        self._save()
+
+    def _refresh_one(self, network: str, asset: str) -> dict:
+        try:
+            meta = self._fetch(network, asset)
+        except Exception as e:
+            raise RuntimeError(f"Could not read token metadata for {asset} on {network}: {e}")
+        entry = {"name": meta["name"], "version": meta["version"], "checked_at": time.time()}
+        with self._lock:
+            self._entries[self._key(network, asset)] = entry
+        self._save()
+        return entry
+
+    def refresh(self, max_age: Optional[float] = None):
+        """Re-read every entry older than `max_age` seconds (default `refresh_secs`) from chain."""
+        cutoff = time.time() - (self.refresh_secs if max_age is None else max_age)
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e.get("checked_at", 0) <= cutoff]
+        for key in stale:
+            network, asset = key.rsplit(":", 1)
+            try:
+                self._refresh_one(network, asset)
+            except RuntimeError as e:
+                # keep serving the known value; it is retried on the next pass
+                logging.info(f"[token_metadata] {e}")
+
+    def _run(self):
+        self.refresh()
+        while not self._stop.wait(self.refresh_secs):
+            self.refresh()
+
+    def close(self):
+        self._stop.set()
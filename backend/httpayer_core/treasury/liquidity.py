@@ -16,6 +16,7 @@ from httpayer_core.treasury.burn_rate import (
     runway_metrics,
 )
 from ccip_terminal import send_ccip_transfer, USDC_MAP, network_func
+from httpayer_core.rpc_pool import get_web3
 
 ################################################################################
 # Config
@@ -53,7 +54,7 @@ def chain_stats(chain: str, window_days: int = 7) -> dict:
     df = fetch_authorized_burns(ACCOUNT_ADDRESS, chain)
 
     burn_per_day, _ = rolling_burn(df, window_days=window_days)
-    w3 = network_func(chain)
+    w3 = get_web3(chain) or network_func(chain)
     bal = current_usdc_balance(w3, USDC_MAP[chain], ACCOUNT_ADDRESS)
     runway = runway_metrics(bal, burn_per_day)
 
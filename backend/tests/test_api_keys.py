@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+
+from httpayer_core.api_keys import ApiKeyStore, KeyBusy, _FairSlots
+
+def test_slots_are_handed_out_in_arrival_order():
+    slots = _FairSlots(1)
+    assert slots.acquire(timeout=0)
+    order = []
+
+    def waiter(name):
+        assert slots.acquire(timeout=5)
+        order.append(name)
+        slots.release()
+
+    threads = []
+    for name in ("first", "second", "third"):
+        t = threading.Thread(target=waiter, args=(name,))
+        t.start()
+        threads.append(t)
+        while len(slots.waiters) < len(threads):
+            time.sleep(0.001)
+    slots.release()
+    for t in threads:
+        t.join(5)
+    assert order == ["first", "second", "third"]
+    assert slots.active == 0
+
+def test_released_slot_goes_to_the_waiter_not_a_newcomer():
+    slots = _FairSlots(1)
+    assert slots.acquire(timeout=0)
+    got = []
+    t = threading.Thread(target=lambda: got.append(slots.acquire(timeout=5)))
+    t.start()
+    while not slots.waiters:
+        time.sleep(0.001)
+    slots.release()
+    assert not slots.acquire(timeout=0)
+    t.join(5)
+    assert got == [True] and slots.active == 1
+
+def test_timeout_gives_up_its_place():
+    slots = _FairSlots(1)
+    assert slots.acquire(timeout=0)
+    assert not slots.acquire(timeout=0.01)
+    assert not slots.waiters
+    slots.release()
+    assert slots.active == 0
+
+def test_slot_handed_over_as_the_waiter_times_out(monkeypatch):
+    slots = _FairSlots(1)
+    assert slots.acquire(timeout=0)
+    ticket = threading.Event()
+
+    class Racing:
+        # the slot is released between the wait timing out and the re-check
+        def wait(self, timeout):
+            slots.release()
+            return False
+
+        def is_set(self):
+            return ticket.is_set()
+
+        def set(self):
+            ticket.set()
+
+    monkeypatch.setattr(threading, "Event", Racing)
+    assert slots.acquire(timeout=0.01)
+    assert slots.active == 1 and not slots.waiters
+
+def test_store_limits_concurrency_per_key():
+    store = ApiKeyStore(max_concurrency=1, queue_timeout=0.01)
+    key = store.create("tenant")
+    tenant = store.lookup(key)
+    other = store.lookup(store.create("other"))
+    with store.slot(tenant):
+        with pytest.raises(KeyBusy):
+            store.acquire(tenant)
+        with store.slot(other):
+            pass
+    with store.slot(tenant):
+        pass
+    assert store.usage(key) == 2
+
+def test_revoked_and_unknown_keys_do_not_resolve():
+    store = ApiKeyStore()
+    key = store.create("tenant")
+    assert store.lookup(key).name == "tenant"
+    store.revoke(key)
+    assert store.lookup(key) is None
+    assert store.lookup("hp_unknown") is None
+
+def test_exclusive_add_revokes_the_tenants_other_keys(tmp_path):
+    db = str(tmp_path / "keys.db")
+    ApiKeyStore(db).add("old-env-key", "default", exclusive=True)
+    store = ApiKeyStore(db)
+    other = store.create("other")
+    assert store.lookup("old-env-key").name == "default"
+    store.add("new-env-key", "default", exclusive=True)
+    assert store.lookup("old-env-key") is None
+    assert store.lookup("new-env-key").name == "default"
+    assert store.lookup(other).name == "other"
+
+def test_full_queue_rejects_immediately():
+    slots = _FairSlots(1, max_waiters=1)
+    assert slots.acquire(timeout=0)
+    t = threading.Thread(target=lambda: slots.acquire(timeout=5))
+    t.start()
+    while not slots.waiters:
+        time.sleep(0.001)
+    started = time.monotonic()
+    assert not slots.acquire(timeout=5)
+    assert time.monotonic() - started < 1
+    assert len(slots.waiters) == 1
+    slots.release()
+    t.join(5)
+    assert slots.active == 1 and not slots.waiters
+
+def test_store_rejects_when_key_queue_is_full():
+    store = ApiKeyStore(max_concurrency=1, queue_timeout=5, max_queued=0)
+    tenant = store.lookup(store.create("tenant"))
+    with store.slot(tenant):
+        started = time.monotonic()
+        with pytest.raises(KeyBusy):
+            store.acquire(tenant)
+        assert time.monotonic() - started < 1
+
+def test_set_limit_and_revoke_tenant():
+    store = ApiKeyStore(max_concurrency=1, queue_timeout=0.01)
+    key = store.create("acme")
+    tenant = store.lookup(key)
+    with store.slot(tenant):
+        with pytest.raises(KeyBusy):
+            store.acquire(tenant)
+    assert store.set_limit("acme", 2) == 1
+    tenant = store.lookup(key)
+    with store.slot(tenant), store.slot(tenant):
+        pass
+    assert store.tenants() == [{"tenant": "acme", "keys": 1, "max_concurrency": 2, "calls": 3}]
+    store.create("acme")
+    assert store.revoke_tenant("acme") == 2
+    assert store.lookup(key) is None and store.tenants() == []
+
+def test_keys_cli(tmp_path):
+    from click.testing import CliRunner
+    from x402_servers.keys import cli
+
+    db = str(tmp_path / "keys.db")
+    run = lambda *args: CliRunner().invoke(cli, ["--db", db, *args])
+    created = run("create", "acme", "--max-concurrency", "2")
+    assert created.exit_code == 0
+    key = created.output.strip()
+    assert ApiKeyStore(db).lookup(key).max_concurrency == 2
+
+    assert run("limit", "acme", "5").exit_code == 0
+    assert ApiKeyStore(db).lookup(key).max_concurrency == 5
+    assert "acme\tkeys=1\tmax_concurrency=5" in run("list").output
+    assert run("limit", "nobody", "5").exit_code != 0
+    assert run("revoke").exit_code != 0
+
+    assert run("revoke", key).exit_code == 0
+    assert ApiKeyStore(db).lookup(key) is None
+    other = run("create", "other").output.strip()
+    assert "revoked 1 key(s) of other" in run("revoke", "--tenant", "other").output
+    assert ApiKeyStore(db).lookup(other) is None
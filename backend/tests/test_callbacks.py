@@ -0,0 +1,52 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from httpayer_core.callbacks import CallbackDispatcher
+
+@pytest.fixture
+def receiver():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/cb", received
+    server.shutdown()
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_callbacks_are_delivered(receiver):
+    url, received = receiver
+    dispatcher = CallbackDispatcher(workers=1)
+    assert dispatcher.submit(url, {"n": 1})
+    wait_for(lambda: received == [{"n": 1}] and dispatcher.pending() == 0)
+    dispatcher.close()
+
+def test_malformed_url_is_dead_lettered_and_workers_survive(receiver):
+    url, received = receiver
+    dispatcher = CallbackDispatcher(workers=1)
+    dispatcher.submit("http://[bad/cb", {"n": 1})
+    dispatcher.submit("http://[worse/cb", {"n": 2})
+    dispatcher.submit(url, {"n": 3})
+    wait_for(lambda: received == [{"n": 3}] and dispatcher.pending() == 0)
+    dead = dispatcher.dead_letters()
+    assert [d["body"] for d in dead] == [{"n": 2}, {"n": 1}]
+    assert all(d["attempts"] == 1 and "ValueError" in d["last_error"] for d in dead)
+    assert all(t.is_alive() for t in dispatcher._threads)
+    dispatcher.close()
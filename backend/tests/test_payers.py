@@ -0,0 +1,86 @@
+import time
+
+import pytest
+from eth_account import Account
+
+from httpayer_core.payers import BalanceTracker, PayerPool
+
+KEYS = ["0x" + "11" * 32, "0x" + "22" * 32, "0x" + "33" * 32]
+A, B, C = (Account.from_key(k).address for k in KEYS)
+USDC = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+REQ = {"network": "base-sepolia", "asset": USDC, "maxAmountRequired": "100"}
+
+class FakeBalances:
+    """Fixed balances per address (None = unknown); debits are recorded."""
+
+    def __init__(self, values):
+        self.values, self.debits = values, []
+
+    def get(self, address, network, asset):
+        return self.values.get(address)
+
+    def debit(self, address, network, asset, amount):
+        self.debits.append((address, amount))
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def pool():
+    pool = PayerPool(KEYS, pool_size=1)
+    pool.balances.close()
+    yield pool
+    pool.close()
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_prefers_idle_accounts_then_larger_balances(pool):
+    pool.balances = FakeBalances({A: 500, B: 1000, C: 800})
+    with pool.acquire(REQ) as first, pool.acquire(REQ) as second, pool.acquire(REQ) as third:
+        assert [first.signer.address, second.signer.address, third.signer.address] == [B, C, A]
+        with pool.acquire(REQ) as fourth:
+            assert fourth.signer.address == B
+
+def test_reserved_amounts_exclude_accounts_that_cannot_cover(pool):
+    pool.balances = FakeBalances({A: 150, B: 50, C: 0})
+    with pool.acquire(REQ) as first:
+        assert first.signer.address == A
+        with pytest.raises(RuntimeError, match="No payer account can cover 100"):
+            with pool.acquire(REQ):
+                pass
+    with pool.acquire(REQ) as again:
+        assert again.signer.address == A
+
+def test_unknown_balance_does_not_exclude(pool):
+    pool.balances = FakeBalances({A: 0, B: None, C: 0})
+    with pool.acquire(REQ) as payer:
+        assert payer.signer.address == B
+
+def test_only_paid_payments_are_debited(pool):
+    pool.balances = FakeBalances({A: 1000})
+    with pool.acquire(REQ) as payer:
+        payer.paid = True
+    with pool.acquire(REQ):
+        pass
+    assert pool.balances.debits == [(A, 100)]
+    assert pool._reserved[(A, "base-sepolia", USDC.lower())] == 0
+
+def test_tracker_reads_in_background_and_keeps_last_known_value():
+    tracker = BalanceTracker({"base-sepolia": "http://127.0.0.1:1"}, refresh_secs=3600)
+    chain = {"balance": 700}
+    tracker._fetch = lambda key: chain["balance"]
+    try:
+        assert tracker.get(A, "base-sepolia", USDC) is None
+        wait_for(lambda: tracker.get(A, "base-sepolia", USDC) == 700)
+        tracker.debit(A, "base-sepolia", USDC, 100)
+        assert tracker.get(A, "base-sepolia", USDC) == 600
+        chain["balance"] = None          # failed read
+        tracker.refresh()
+        assert tracker.get(A, "base-sepolia", USDC) == 600
+        assert tracker.get(A, "base", USDC) is None and not tracker.tracks("base")
+    finally:
+        tracker.close()
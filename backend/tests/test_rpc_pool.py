@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from web3.exceptions import ProviderConnectionError
+
+from httpayer_core.rpc_pool import RpcPool, rpc_urls
+
+class FakeRpc:
+    """Local JSON-RPC endpoint answering every call after `delay`, or with HTTP 503."""
+
+    def __init__(self, delay=0.0, fail=False, result="0x1"):
+        self.delay, self.fail, self.result = delay, fail, result
+        self.calls = []
+        rpc = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                rpc.calls.append(body["method"])
+                time.sleep(rpc.delay)
+                if rpc.fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                out = json.dumps({"jsonrpc": "2.0", "id": body["id"], "result": rpc.result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+@pytest.fixture
+def rpcs():
+    started = []
+
+    def start(**kw):
+        rpc = FakeRpc(**kw)
+        started.append(rpc)
+        return rpc
+
+    yield start
+    for rpc in started:
+        rpc.close()
+
+def call(pool, method="eth_blockNumber"):
+    return pool.make_request(method, [])["result"]
+
+def test_fails_over_and_skips_endpoints_in_cooldown(rpcs):
+    bad, good = rpcs(fail=True), rpcs(result="0x2")
+    pool = RpcPool([bad.url, good.url], cooldown=60)
+    assert call(pool) == "0x2"
+    assert call(pool) == "0x2"
+    assert call(pool) == "0x2"
+    assert len(bad.calls) == 1
+    assert [s["healthy"] for s in pool.stats()] == [False, True]
+
+def test_prefers_the_fastest_endpoint(rpcs):
+    slow, fast = rpcs(result="0xs"), rpcs(result="0xf")
+    pool = RpcPool([slow.url, fast.url], min_hedge=5)
+    pool.endpoints[0].latency, pool.endpoints[1].latency = 0.05, 0.001
+    assert call(pool) == "0xf"
+    assert slow.calls == []
+    # measured latencies feed the moving average
+    assert 0.001 * 0.8 <= pool.endpoints[1].latency < 0.05
+
+def test_slow_reads_are_hedged(rpcs):
+    slow, fast = rpcs(delay=0.5, result="0xs"), rpcs(result="0xf")
+    pool = RpcPool([slow.url, fast.url], min_hedge=0.05)
+    pool.endpoints[0].latency, pool.endpoints[1].latency = 0.001, 0.002
+    start = time.monotonic()
+    assert call(pool) == "0xf"
+    assert time.monotonic() - start < 0.4
+
+def test_writes_are_not_hedged(rpcs):
+    slow, fast = rpcs(delay=0.3, result="0xs"), rpcs(result="0xf")
+    pool = RpcPool([slow.url, fast.url], min_hedge=0.05)
+    pool.endpoints[0].latency, pool.endpoints[1].latency = 0.001, 0.002
+    assert call(pool, "eth_sendRawTransaction") == "0xs"
+    assert fast.calls == []
+
+def test_sends_fail_over_only_if_never_delivered(rpcs):
+    good = rpcs(result="0xhash")
+    refused = FakeRpc()
+    refused.close()
+    refused.server.server_close()
+    pool = RpcPool([refused.url, good.url])
+    assert call(pool, "eth_sendRawTransaction") == "0xhash"
+
+    slow, other = rpcs(delay=0.3), rpcs(result="0xdup")
+    pool = RpcPool([slow.url, other.url], timeout=0.1)
+    pool.endpoints[0].latency, pool.endpoints[1].latency = 0.001, 0.002
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        call(pool, "eth_sendRawTransaction")
+    assert other.calls == []
+    # the endpoint that timed out is still put in cooldown
+    assert call(pool) == "0xdup"
+
+def test_fails_fast_while_every_endpoint_cools_down(rpcs):
+    bad = rpcs(fail=True)
+    pool = RpcPool([bad.url], cooldown=60)
+    with pytest.raises(Exception):
+        call(pool)
+    start = time.monotonic()
+    with pytest.raises(ProviderConnectionError):
+        call(pool)
+    assert time.monotonic() - start < 0.05
+    assert len(bad.calls) == 1
+
+def test_endpoint_is_retried_after_its_cooldown(rpcs):
+    flaky = rpcs(fail=True)
+    pool = RpcPool([flaky.url], cooldown=0.05)
+    with pytest.raises(Exception):
+        call(pool)
+    flaky.fail = False
+    time.sleep(0.06)
+    assert call(pool) == "0x1"
+    assert pool.endpoints[0].failures == 0
+
+def test_rpc_urls_reads_list_and_gateway(monkeypatch):
+    monkeypatch.setenv("BASE_SEPOLIA_RPC_URLS", "https://a, https://b,")
+    monkeypatch.setenv("BASE_SEPOLIA_GATEWAY", "https://a")
+    assert rpc_urls("base-sepolia") == ["https://a", "https://b"]
+    monkeypatch.delenv("BASE_SEPOLIA_RPC_URLS")
+    assert rpc_urls("base-sepolia") == ["https://a"]
+    with pytest.raises(ValueError):
+        RpcPool([])
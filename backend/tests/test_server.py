@@ -0,0 +1,159 @@
+import importlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from httpayer.codec import decode_header
+
+API_KEY = "test-key"
+
+EXACT = {
+    "scheme": "exact",
+    "network": "base-sepolia",
+    "maxAmountRequired": "100",
+    "resource": "",
+    "payTo": "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0",
+    "asset": "0x036CbD53842c5426634e7929541eC2318f3dCF7e",
+    "maxTimeoutSeconds": 60,
+    "extra": {"name": "USDC", "version": "2"},
+}
+
+class FakeUpstream:
+    """Paywalled API: 402 without X-PAYMENT, `body` for a payment of `price`."""
+
+    def __init__(self):
+        self.price, self.body, self.reject_paid = 100, b'{"weather":"sunny"}', False
+        self.calls = []      # (path, paid amount or None)
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.handle_call()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self.handle_call()
+
+            def handle_call(self):
+                header = self.headers.get("X-PAYMENT")
+                paid = decode_header(header)["payload"]["authorization"]["value"] if header else None
+                upstream.calls.append((self.path, paid))
+                if paid is None or upstream.reject_paid or int(paid) != upstream.price:
+                    out = json.dumps({"error": "payment required", "accepts": [
+                        dict(EXACT, maxAmountRequired=str(upstream.price))]}).encode()
+                    self.send_response(402)
+                else:
+                    out = upstream.body
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+@pytest.fixture(scope="module")
+def server():
+    mp = pytest.MonkeyPatch()
+    mp.setenv("PRIVATE_KEYS", "0x" + "11" * 32)
+    mp.setenv("HTTPAYER_API_KEY", API_KEY)
+    mp.setenv("API_KEYS_DB", ":memory:")
+    mp.setenv("CALLBACK_DB", ":memory:")
+    mp.setenv("BATCH_MAX_ITEMS", "3")
+    mp.delenv("REQUIREMENTS_PATH", raising=False)
+    module = importlib.import_module("x402_servers.server")
+    yield module
+    module.payers.close()
+    module.callbacks.close()
+    mp.undo()
+
+@pytest.fixture
+def upstream(server):
+    server.requirements._mem.clear()
+    fake = FakeUpstream()
+    yield fake
+    fake.server.shutdown()
+
+def proxy(server, url, **call):
+    resp = server.app.test_client().post("/httpayer", headers={"x-api-key": API_KEY},
+                                         json=dict(call, api_url=url))
+    resp.get_data()   # drain the stream, then close it as a WSGI server would
+    resp.close()      # (which releases the tenant slot)
+    return resp
+
+def test_rejected_payment_is_returned_without_retrying(server, upstream):
+    upstream.reject_paid = True
+    resp = proxy(server, upstream.url + "/weather")
+    assert resp.status_code == 402
+    assert upstream.calls == [("/weather", None), ("/weather", "100")]
+
+def test_tenant_slot_is_held_until_the_body_is_closed(server, upstream):
+    slots = server.api_keys._slots_for(server.api_keys.lookup(API_KEY))
+    idle = slots.active
+    resp = server.app.test_client().post("/httpayer", headers={"x-api-key": API_KEY},
+                                         json={"api_url": upstream.url + "/weather"},
+                                         buffered=False)
+    assert resp.status_code == 200
+    assert slots.active == idle + 1
+    assert b"".join(resp.response) == upstream.body
+    assert slots.active == idle + 1
+    resp.close()
+    assert slots.active == idle
+
+def test_known_paywall_is_paid_without_probe(server, upstream):
+    for _ in range(2):
+        assert proxy(server, upstream.url + "/weather").status_code == 200
+    assert upstream.calls == [("/weather", None), ("/weather", "100"), ("/weather", "100")]
+    assert server.requirements.get("GET", upstream.url + "/weather")[0]["maxAmountRequired"] == "100"
+
+def test_changed_price_invalidates_and_repays(server, upstream):
+    proxy(server, upstream.url + "/weather")
+    upstream.price = 250
+    upstream.calls.clear()
+    assert proxy(server, upstream.url + "/weather").status_code == 200
+    assert upstream.calls == [("/weather", "100"), ("/weather", "250")]
+    assert server.requirements.get("GET", upstream.url + "/weather")[0]["maxAmountRequired"] == "250"
+
+def test_rejected_payment_forgets_requirements(server, upstream):
+    proxy(server, upstream.url + "/weather")
+    upstream.reject_paid = True
+    assert proxy(server, upstream.url + "/weather").status_code == 402
+    assert server.requirements.get("GET", upstream.url + "/weather") is None
+
+def test_requirements_are_keyed_by_body(server, upstream):
+    proxy(server, upstream.url + "/report", method="POST", payload={"city": "paris"})
+    proxy(server, upstream.url + "/report", method="POST", payload={"city": "rome"})
+    assert [paid for _, paid in upstream.calls] == [None, "100", None, "100"]
+
+def batch(server, calls):
+    resp = server.app.test_client().post("/httpayer/batch", headers={"x-api-key": API_KEY},
+                                         json={"calls": calls})
+    resp.get_data()
+    resp.close()
+    return resp
+
+def test_batch_streams_one_ndjson_line_per_call(server, upstream):
+    resp = batch(server, [{"api_url": upstream.url + "/a"},
+                          {"api_url": upstream.url + "/b", "method": "post", "payload": {"x": 1}},
+                          {"api_url": "http://127.0.0.1:1/down"}])
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    lines = sorted((json.loads(line) for line in resp.get_data(as_text=True).splitlines()),
+                   key=lambda line: line["index"])
+    assert lines[0] == {"index": 0, "status": 200, "body": {"weather": "sunny"}}
+    assert lines[1] == {"index": 1, "status": 200, "body": {"weather": "sunny"}}
+    assert lines[2]["index"] == 2 and "error" in lines[2]
+
+def test_batch_rejects_more_than_batch_max_items(server, upstream):
+    resp = batch(server, [{"api_url": upstream.url + "/a"}] * 4)
+    assert resp.status_code == 400
+    assert "exceeds 3 calls" in resp.get_json()["error"]
+    assert upstream.calls == []
+    assert batch(server, [{"method": "GET"}]).status_code == 400
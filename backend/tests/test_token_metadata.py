@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from httpayer_core.token_metadata import TokenMetadataRegistry
+
+USDC = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+OTHER = "0x1111111111111111111111111111111111111111"
+
+class FakeChain:
+    def __init__(self, meta=None):
+        self.meta = meta or {"name": "Other Coin", "version": "1"}
+        self.reads = []
+
+    def __call__(self, network, asset):
+        self.reads.append((network, asset))
+        if isinstance(self.meta, Exception):
+            raise self.meta
+        return dict(self.meta)
+
+def test_defaults_are_served_without_chain_reads():
+    chain = FakeChain()
+    registry = TokenMetadataRegistry(refresh_secs=0, fetch=chain)
+    assert registry.get("base-sepolia", USDC) == {"name": "USDC", "version": "2"}
+    assert chain.reads == []
+
+def test_unknown_token_is_read_once_and_persisted(tmp_path):
+    path = str(tmp_path / "meta" / "tokens.json")
+    chain = FakeChain()
+    registry = TokenMetadataRegistry(path, refresh_secs=0, fetch=chain)
+    assert registry.get("base", OTHER) == {"name": "Other Coin", "version": "1"}
+    assert registry.get("base", OTHER.lower())["name"] == "Other Coin"
+    assert chain.reads == [("base", OTHER)]
+    with open(path) as f:
+        stored = json.load(f)
+    assert stored[f"base:{OTHER.lower()}"]["name"] == "Other Coin"
+
+    reloaded = TokenMetadataRegistry(path, refresh_secs=0, fetch=FakeChain(RuntimeError("offline")))
+    assert reloaded.get("base", OTHER) == {"name": "Other Coin", "version": "1"}
+
+def test_put_overrides_defaults_across_runs(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    TokenMetadataRegistry(path, refresh_secs=0).put("base-sepolia", USDC, "USD Coin", "3")
+    assert TokenMetadataRegistry(path, refresh_secs=0).get("base-sepolia", USDC) == \
+        {"name": "USD Coin", "version": "3"}
+
+def test_corrupt_file_falls_back_to_defaults(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text("{not json")
+    registry = TokenMetadataRegistry(str(path), refresh_secs=0)
+    assert registry.get("base-sepolia", USDC)["name"] == "USDC"
+
+def test_unreadable_unknown_token_raises():
+    registry = TokenMetadataRegistry(refresh_secs=0, fetch=FakeChain(ValueError("no such contract")))
+    with pytest.raises(RuntimeError, match="no such contract"):
+        registry.get("base", OTHER)
+
+def test_refresh_rereads_stale_entries_and_keeps_them_on_failure():
+    chain = FakeChain({"name": "USDC", "version": "3"})
+    registry = TokenMetadataRegistry(refresh_secs=0, fetch=chain,
+                                     defaults={("base-sepolia", USDC): {"name": "USDC", "version": "2"}})
+    registry.refresh(max_age=3600)
+    assert registry.get("base-sepolia", USDC)["version"] == "3"
+    registry.refresh(max_age=3600)          # just checked: not stale
+    assert len(chain.reads) == 1
+
+    chain.meta = RuntimeError("rpc down")
+    registry.refresh(max_age=0)
+    assert registry.get("base-sepolia", USDC)["version"] == "3"
@@ -35,6 +35,7 @@ from httpayer_core.treasury.burn_rate import (
 )
 
 from httpayer_core.treasury.liquidity import rebalance_once
+from httpayer_core.rpc_pool import get_web3
 
 # Load environment variables
 load_dotenv()
@@ -52,9 +53,10 @@ def load_abi():
 scheduler = BackgroundScheduler()
 job_lock = Lock()
 
-base_w3 = network_func("base")
-avalanche_w3 = network_func("avalanche")
-ethereum_w3 = network_func("ethereum")
+# pooled <CHAIN>_RPC_URLS when configured, else ccip-terminal's gateway
+base_w3 = get_web3("base") or network_func("base")
+avalanche_w3 = get_web3("avalanche") or network_func("avalanche")
+ethereum_w3 = get_web3("ethereum") or network_func("ethereum")
 
 global ccip_messages
 
@@ -0,0 +1,69 @@
+"""
+Manage the proxy's API keys.
+
+    python -m x402_servers.keys create acme --max-concurrency 2
+    python -m x402_servers.keys list
+
+Works on the same SQLite file as the server (`API_KEYS_DB`). A running
+server picks up changes once its lookup cache expires (60 seconds).
+"""
+import os
+
+import click
+
+from httpayer_core.api_keys import ApiKeyStore
+
+def _store(db: str) -> ApiKeyStore:
+    return ApiKeyStore(db, max_concurrency=int(os.getenv("KEY_CONCURRENCY", 4)))
+
+@click.group()
+@click.option("--db", envvar="API_KEYS_DB", default="api_keys.db", show_default=True,
+              help="SQLite file holding the keys.")
+@click.pass_context
+def cli(ctx, db):
+    """HTTPayer proxy API keys"""
+    ctx.obj = _store(db)
+
+@cli.command()
+@click.argument("tenant")
+@click.option("--max-concurrency", type=click.IntRange(min=1), default=None,
+              help="Concurrent calls allowed for the key (default: KEY_CONCURRENCY).")
+@click.pass_obj
+def create(store, tenant, max_concurrency):
+    """Issue a new key for TENANT and print it (it is not shown again)."""
+    click.echo(store.create(tenant, max_concurrency))
+
+@cli.command()
+@click.argument("api_key", required=False)
+@click.option("--tenant", default=None, help="Revoke every key of this tenant instead.")
+@click.pass_obj
+def revoke(store, api_key, tenant):
+    """Revoke API_KEY, or all keys of --tenant."""
+    if (api_key is None) == (tenant is None):
+        raise click.UsageError("pass either API_KEY or --tenant")
+    if tenant is not None:
+        click.echo(f"revoked {store.revoke_tenant(tenant)} key(s) of {tenant}")
+    else:
+        store.revoke(api_key)
+        click.echo("revoked")
+
+@cli.command()
+@click.argument("tenant")
+@click.argument("max_concurrency", type=click.IntRange(min=1))
+@click.pass_obj
+def limit(store, tenant, max_concurrency):
+    """Set the concurrent-call limit of TENANT's keys."""
+    updated = store.set_limit(tenant, max_concurrency)
+    if not updated:
+        raise click.ClickException(f"no active keys for tenant {tenant!r}")
+    click.echo(f"{tenant}: {updated} key(s) limited to {max_concurrency}")
+
+@cli.command("list")
+@click.pass_obj
+def list_tenants(store):
+    """Show active tenants, their key count, limit and calls."""
+    for t in store.tenants():
+        click.echo(f"{t['tenant']}\tkeys={t['keys']}\tmax_concurrency={t['max_concurrency']}\tcalls={t['calls']}")
+
+if __name__ == "__main__":
+    cli()
@@ -1,13 +1,18 @@
 import os
 import json
 import logging
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context
 from dotenv import load_dotenv
 import requests
-from eth_account import Account
-from x402.clients.requests import x402_requests
-import base64
-import time
+from requests.adapters import HTTPAdapter
+from httpayer import tracing
+from httpayer.cache import RequirementsCache
+from httpayer.codec import decode_x_payment
+from httpayer_core.api_keys import ApiKeyStore, KeyBusy
+from httpayer_core.callbacks import CallbackDispatcher
+from httpayer_core.payers import PayerPool
+from httpayer_core.rpc_pool import rpc_urls
+from concurrent.futures import ThreadPoolExecutor, as_completed
 # ---------------------------------------------------------------------------
 # env + bootstrap
 # ---------------------------------------------------------------------------
@@ -18,42 +23,113 @@ PORT = int(os.getenv("MAIN_PORT", 3003))
 raw_keys = os.getenv("PRIVATE_KEYS")
 if not raw_keys:
     raise ValueError("Missing PRIVATE_KEYS in .env")
-pk = raw_keys.split(",")[0].strip()
-if not pk.startswith("0x"):
-    pk = "0x" + pk
-PRIVATE_KEY = pk
+PRIVATE_KEYS = [pk if pk.startswith("0x") else "0x" + pk
+                for pk in (k.strip() for k in raw_keys.split(",")) if pk]
+
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 64 * 1024))
+
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", 50))     # keep-alive connections per host
+UPSTREAM_TIMEOUT   = (float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 5)),
+                      float(os.getenv("UPSTREAM_READ_TIMEOUT", 60)))
+REQUIREMENTS_TTL   = int(os.getenv("REQUIREMENTS_TTL", 300))      # seconds; 0 disables
+REQUIREMENTS_PATH  = os.getenv("REQUIREMENTS_PATH")               # optional JSON file
+CALLBACK_DB        = os.getenv("CALLBACK_DB", "callbacks.db")     # durable callback queue
+CALLBACK_WORKERS   = int(os.getenv("CALLBACK_WORKERS", 4))
+BALANCE_REFRESH    = float(os.getenv("BALANCE_REFRESH", 30))      # seconds between payer balance reads
+
+# RPC endpoints used to track payer balances per x402 network
+# (<NETWORK>_RPC_URLS, comma-separated, and/or <NETWORK>_GATEWAY)
+RPC_URLS = {net: rpc_urls(net) for net in ("base-sepolia", "avalanche-fuji")}
+
+BATCH_MAX_ITEMS    = int(os.getenv("BATCH_MAX_ITEMS", 100))
+BATCH_CONCURRENCY  = int(os.getenv("BATCH_CONCURRENCY", 8))       # items in flight per batch
+API_KEYS_DB        = os.getenv("API_KEYS_DB", "api_keys.db")
+KEY_CONCURRENCY    = int(os.getenv("KEY_CONCURRENCY", 4))         # concurrent calls per API key
+KEY_QUEUE_TIMEOUT  = float(os.getenv("KEY_QUEUE_TIMEOUT", 5))     # seconds waiting for a slot
+KEY_QUEUE_DEPTH    = int(os.getenv("KEY_QUEUE_DEPTH", 8))         # calls per API key allowed to wait
+
+# hashed per-tenant keys; HTTPAYER_API_KEY is the default tenant's only key,
+# so rotating the env var revokes the previous one
+api_keys = ApiKeyStore(API_KEYS_DB, max_concurrency=KEY_CONCURRENCY, queue_timeout=KEY_QUEUE_TIMEOUT,
+                       max_queued=KEY_QUEUE_DEPTH)
+if os.getenv("HTTPAYER_API_KEY"):
+    api_keys.add(os.getenv("HTTPAYER_API_KEY"), "default", exclusive=True)
+
+# every funded account pays; each call goes to the least loaded one that can cover it
+payers = PayerPool(PRIVATE_KEYS, rpc_urls=RPC_URLS, refresh_secs=BALANCE_REFRESH)
+
+# one pooled keep-alive session shared by every proxied call
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=UPSTREAM_POOL_SIZE, pool_maxsize=UPSTREAM_POOL_SIZE)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+# upstream 402 requirements per method + URL (+ body), so known-paywalled APIs
+# are paid on the first request instead of probed first
+requirements = (RequirementsCache(ttl=REQUIREMENTS_TTL, path=REQUIREMENTS_PATH, maxsize=4096)
+                if REQUIREMENTS_TTL else None)
+
+# payment callbacks are delivered in the background, never inline
+callbacks = CallbackDispatcher(CALLBACK_DB, workers=CALLBACK_WORKERS)
 
-api_key = os.getenv("HTTPAYER_API_KEY")
-if not api_key:
-    raise ValueError("Missing HTTPAYER_API_KEY in .env")
-
-account = Account.from_key(PRIVATE_KEY)
-session = x402_requests(account)
-
-print(f'account: {account.address}')
+logging.basicConfig(level=logging.INFO)
+logging.info(f"[httpayer] payer accounts: {[s.address for s in payers.signers]}")
 
 # ---------------------------------------------------------------------------
 # flask app setup
 # ---------------------------------------------------------------------------
 
-def decode_x_payment(header: str) -> dict:
-    """
-    Decode a base64-encoded X-PAYMENT header back into its structured JSON form.
+# upstream headers the caller needs to cache or audit a paid response
+PASSTHROUGH_HEADERS = ("Cache-Control", "ETag", "Last-Modified", "Expires", "Vary",
+                       "X-PAYMENT-RESPONSE")
 
-    :param header: Base64-encoded X-PAYMENT string
-    :return: Parsed Python dictionary of the payment payload
+def passthrough(upstream: requests.Response) -> Response:
+    """
+    Stream an upstream response (opened with stream=True) back to the caller
+    chunk by chunk, so large paid payloads are never held in memory. Caching
+    and payment headers are forwarded along with the Content-Type.
     """
+    def body():
+        try:
+            yield from upstream.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        finally:
+            upstream.close()
+
+    headers = {h: upstream.headers[h] for h in PASSTHROUGH_HEADERS if h in upstream.headers}
+    return Response(stream_with_context(body()), status=upstream.status_code,
+                    content_type=upstream.headers.get("Content-Type"), headers=headers)
+
+def exact_requirement(resp: requests.Response):
+    """The `exact` requirement advertised by a 402 response, if any."""
     try:
-        decoded_bytes = base64.b64decode(header)
-        decoded_json = json.loads(decoded_bytes)
-        if not isinstance(decoded_json, dict):
-            raise ValueError("Decoded X-PAYMENT is not a JSON object")
-        return decoded_json
-    except (ValueError, json.JSONDecodeError, base64.binascii.Error) as e:
-        raise ValueError(f"Invalid X-PAYMENT header: {e}")
+        accepts = resp.json().get("accepts") or []
+    except ValueError:
+        return None
+    exact = next((x for x in accepts if x.get("scheme") == "exact"), None)
+    return exact if exact and "network" in exact else None
+
+def send_paid(method: str, api_url: str, payload, exact: dict) -> requests.Response:
+    """
+    Pay `exact` from the pool's best account and send the request. A paid
+    402 is returned as is rather than retried: it may follow a settlement
+    attempt, and waiting here would hold a worker and the tenant's slot.
+    """
+    with tracing.span("proxy.pay", network=exact["network"]) as span, \
+            payers.acquire(exact) as payer:
+        span.set("payer", payer.signer.address)
+        paid_resp = _send_paid(method, api_url, payload, exact, payer.signer)
+        payer.paid = paid_resp.status_code < 400
+        span.set("status", paid_resp.status_code)
+    return paid_resp
+
+def _send_paid(method, api_url, payload, exact, signer) -> requests.Response:
+    headers = tracing.inject({"Content-Type": "application/json"} if method != "GET" else {})
+    with tracing.span("proxy.sign"):
+        headers["X-PAYMENT"] = signer.payment_header(exact)
+    return session.request(method, api_url, json=payload if method != "GET" else None,
+                           headers=headers, stream=True, timeout=UPSTREAM_TIMEOUT)
 
 app = Flask(__name__)
-logging.basicConfig(level=logging.INFO)
 
 @app.route("/health", methods=["GET"])
 def health():
@@ -61,85 +137,169 @@ def health():
 
 @app.route("/httpayer", methods=["POST"])
 def httpayer_proxy():
-    if request.headers.get("x-api-key") != api_key:
+    tenant = api_keys.lookup(request.headers.get("x-api-key"))
+    if tenant is None:
         return jsonify({"error": "Unauthorized: invalid API key"}), 401
 
+    with tracing.span("proxy.request", parent=tracing.extract(request.headers),
+                      tenant=tenant.name) as span:
+        try:
+            api_keys.acquire(tenant)
+        except KeyBusy as e:
+            return jsonify({"error": str(e)}), 429
+
+        try:
+            resp = proxy_call()
+        except BaseException:
+            api_keys.release(tenant)
+            raise
+        span.set("status", resp.status_code)
+    # the slot is held until the (possibly streamed) body has been sent
+    resp.call_on_close(lambda: api_keys.release(tenant))
+    return resp
+
+class MissingRequirement(ValueError):
+    """The upstream answered 402 without an `exact` requirement we can pay."""
+
+def proxy_call() -> Response:
     try:
         data = request.get_json(force=True)
-        api_url = data.get("api_url")
-        method = data.get("method", "GET").upper()
-        payload = data.get("payload")
-
-        logging.info(f"[httpayer] → {method} {api_url}")
+        return passthrough(forward(data.get("api_url"), data.get("method", "GET").upper(),
+                                   data.get("payload")))
+    except MissingRequirement as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+    except Exception as e:
+        logging.error(f"[httpayer] error: {e}")
+        return make_response(jsonify({"error": str(e)}), 500)
 
+def forward(api_url: str, method: str, payload) -> requests.Response:
+    """
+    Call `api_url`, paying its 402 if needed, and return the upstream
+    response opened with stream=True.
+    """
+    logging.info(f"[httpayer] → {method} {api_url}")
+
+    # a price may depend on the body (e.g. a batch), so it is part of the key
+    vary = payload if method != "GET" else None
+    cached = requirements.get(method, api_url, vary) if requirements is not None else None
+    if cached:
+        exact = cached[0]
+        logging.info("[httpayer] known paywall, paying without probe")
+    else:
         # First request (to trigger 402)
-        if method == "GET":
-            initial_resp = requests.get(api_url)
-        else:
-            initial_resp = requests.request(method, api_url, json=payload)
+        with tracing.span("proxy.probe", url=api_url):
+            initial_resp = session.request(method, api_url, json=payload if method != "GET" else None,
+                                           headers=tracing.inject(), stream=True,
+                                           timeout=UPSTREAM_TIMEOUT)
 
         logging.info(f"[httpayer] first status {initial_resp.status_code}")
 
         if initial_resp.status_code != 402:
-            return Response(initial_resp.content, status=initial_resp.status_code)
+            return initial_resp
 
-        resp_json = initial_resp.json()
-        accepts = resp_json.get("accepts", [])
-        exact = next((x for x in accepts if x.get("scheme") == "exact"), None)
+        exact = exact_requirement(initial_resp)
+        initial_resp.close()
 
-        if not exact or "network" not in exact:
-            return jsonify({"error": "Missing exact scheme or network"}), 400
+        if not exact:
+            raise MissingRequirement("Missing exact scheme or network")
 
-        logging.info(f"[httpayer] paying… {{chain: {exact['network']}  to: {exact['payTo']}  amount: {exact['maxAmountRequired']}}}")
+    logging.info(f"[httpayer] paying… {{chain: {exact['network']}  to: {exact['payTo']}  amount: {exact['maxAmountRequired']}}}")
 
-        # Send paid request
-        headers = {"Connection": "close"}
-        if method != "GET":
-            headers["Content-Type"] = "application/json"
+    paid_resp = send_paid(method, api_url, payload, exact)
 
-        paid_resp = session.request(method, api_url, json=payload if method != "GET" else None, headers=headers)
+    if paid_resp.status_code == 402 and requirements is not None:
+        # upstream rejected the payment: forget what we knew about it
+        requirements.invalidate(method, api_url, vary)
+        fresh = exact_requirement(paid_resp) if cached else None
+        if fresh and fresh != exact:
+            logging.info("[httpayer] upstream requirements changed, paying again")
+            paid_resp.close()
+            exact, cached = fresh, None
+            paid_resp = send_paid(method, api_url, payload, exact)
+    if not cached and paid_resp.status_code < 400 and requirements is not None:
+        requirements.put(method, api_url, [exact], vary)
 
-        if paid_resp.status_code == 402:
-            logging.warning("[httpayer] first retry failed with 402, retrying once after delay")
-            time.sleep(2)
-            paid_resp = session.request(method, api_url, json=payload if method != "GET" else None, headers=headers)
+    status = paid_resp.status_code
 
-        text = paid_resp.text
+    logging.info(f"[httpayer] paid status {status}")
 
-        logging.info(f"[httpayer] paid response: {text}")
+    # Optional callback
+    pay_hdr = paid_resp.headers.get("X-PAYMENT-RESPONSE")
+    if pay_hdr:
+        decoded = decode_x_payment(pay_hdr)
+        tracing.log_event(logging.getLogger(__name__), "payment_response",
+                          network=decoded.get("network"), payer=decoded.get("payer"),
+                          transaction=decoded.get("transaction"), success=decoded.get("success"))
+        callback_url = decoded.get("callbackUrl") 
+        tx_hash = decoded.get("transaction")
 
-        status = paid_resp.status_code
+        if callback_url:
+            callbacks.submit(callback_url, {"tx_hash": tx_hash})
 
-        logging.info(f"[httpayer] paid status {status}")
+    return paid_resp
 
-        # Optional callback
-        pay_hdr = paid_resp.headers.get("X-PAYMENT-RESPONSE")
-        if pay_hdr:
-            decoded = decode_x_payment(pay_hdr)
-            logging.info(f"[httpayer] decoded payment response: {json.dumps(decoded, indent=2)}")
-            callback_url = decoded.get("callbackUrl") 
-            tx_hash = decoded.get("transaction")
+def batch_item(tenant, index: int, item: dict, parent=None) -> dict:
+    """Run one batch entry under the tenant's concurrency limit."""
+    try:
+        with tracing.span("proxy.batch_item", parent=parent, index=index), api_keys.slot(tenant):
+            upstream = forward(item["api_url"], str(item.get("method", "GET")).upper(),
+                               item.get("payload"))
+            with upstream:
+                body = upstream.content
+        try:
+            body = json.loads(body)
+        except ValueError:
+            body = body.decode("utf-8", errors="replace")
+        return {"index": index, "status": upstream.status_code, "body": body}
+    except Exception as e:
+        logging.warning(f"[httpayer] batch item {index} failed: {e}")
+        return {"index": index, "error": str(e)}
 
-            if callback_url:
-                try:
-                    requests.post(
-                        callback_url,
-                        headers={"Content-Type": "application/json"},
-                        json={"tx_hash": tx_hash}
-                    )
-                except Exception as e:
-                    logging.warning(f"callback failed: {e}")
+@app.route("/httpayer/batch", methods=["POST"])
+def httpayer_batch():
+    """
+    Proxy many paid calls in one request.
 
-        return Response(text, status=status)
+    Takes ``{"calls": [{api_url, method, payload}, ...]}`` (or the bare list)
+    and runs the calls concurrently, at most BATCH_CONCURRENCY at a time and
+    never more than the API key's own limit. One NDJSON line
+    ``{"index", "status", "body"}`` (or ``{"index", "error"}``) is streamed
+    back per call as soon as it finishes.
+    """
+    tenant = api_keys.lookup(request.headers.get("x-api-key"))
+    if tenant is None:
+        return jsonify({"error": "Unauthorized: invalid API key"}), 401
 
-    except Exception as e:
-        logging.error(f"[httpayer] error: {e}")
-        return jsonify({"error": str(e)}), 500
+    data = request.get_json(force=True, silent=True)
+    calls = data.get("calls") if isinstance(data, dict) else data
+    if not isinstance(calls, list) or not calls:
+        return jsonify({"error": "expected a non-empty list of calls"}), 400
+    if len(calls) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"batch exceeds {BATCH_MAX_ITEMS} calls"}), 400
+    if not all(isinstance(c, dict) and c.get("api_url") for c in calls):
+        return jsonify({"error": "every call needs an api_url"}), 400
+
+    # worker threads don't inherit the request's trace context; pass it along
+    parent = tracing.extract(request.headers)
+
+    def lines():
+        workers = max(1, min(BATCH_CONCURRENCY, tenant.max_concurrency, len(calls)))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="httpayer-batch")
+        try:
+            futures = [pool.submit(batch_item, tenant, i, c, parent) for i, c in enumerate(calls)]
+            for future in as_completed(futures):
+                yield json.dumps(future.result(), separators=(",", ":")) + "\n"
+        finally:
+            # every call is done unless the client disconnected (GeneratorExit);
+            # then drop the ones not started yet instead of paying for them
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return Response(lines(), mimetype="application/x-ndjson")
 
 # ---------------------------------------------------------------------------
 # serve
 # ---------------------------------------------------------------------------
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=PORT)
+    app.run(host="0.0.0.0", port=PORT, threaded=True)
     logging.info(f"Server running on port {PORT}")
\ No newline at end of file
@@ -4,7 +4,7 @@ from flask_cors import CORS
 from httpayer import X402Gate
 import os
 from dotenv import load_dotenv
-from web3 import Web3
+from httpayer_core.token_metadata import TokenMetadataRegistry
 
 load_dotenv()
 
@@ -14,42 +14,22 @@ USDC_MAP = {
     # Add more networks as desired
 }
 
-current_dir = os.path.dirname(os.path.abspath(__file__))
-
-ERC20_ABI_PATH = os.path.join(current_dir, "../abi/erc20.json")
-print(f'ERC20_ABI_PATH: {ERC20_ABI_PATH}')
-
-with open(ERC20_ABI_PATH, 'r') as f:
-    ERC20_ABI = f.read()
-
-load_dotenv()
-
-BASE_SEPOLIA_GATEWAY = os.getenv("BASE_SEPOLIA_GATEWAY")
-AVALANCHE_FUJI_GATEWAY = os.getenv("AVALANCHE_FUJI_GATEWAY")
-
 FACILITATOR_URL = os.getenv("FACILITATOR_URL", "https://x402.org")
 PAY_TO_ADDRESS = os.getenv("PAY_TO_ADDRESS", "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 30))  # seconds; 0 disables
+TOKEN_METADATA_PATH = os.getenv("TOKEN_METADATA_PATH", "token_metadata.json")
+
+# token name/version come from disk (or the bundled USDC set); no RPC call at startup
+token_metadata = TokenMetadataRegistry(TOKEN_METADATA_PATH)
 
 print(f'FACILITATOR_URL: {FACILITATOR_URL}')
 
 def get_network_details(network):
 
-    if network == 'avalanche-fuji':
-        RPC_GATEWAY = AVALANCHE_FUJI_GATEWAY
-    elif network == 'base-sepolia':
-        RPC_GATEWAY = BASE_SEPOLIA_GATEWAY
-
-    w3 = Web3(Web3.HTTPProvider(RPC_GATEWAY))
-
     token_address = USDC_MAP.get(network)
     if not token_address:
         raise ValueError(f"No USDC address found for network: {network}")
-    token_contract = w3.to_checksum_address(token_address)
-    token = w3.eth.contract(address=token_contract, abi=ERC20_ABI)
-    name_onchain    = token.functions.name().call()
-    version_onchain = token.functions.version().call() 
-
-    extra = {"name": name_onchain, "version": version_onchain}
+    extra = token_metadata.get(network, token_address)
 
     print(f'Network: {network}, extra: {extra}')
 
@@ -92,13 +72,13 @@ def create_app():
         return "<h1>x402 Demo Server</h1><p>Welcome to the x402 Demo Server!</p>"
 
     @app.route("/base-weather", methods=['GET'])
-    @base_gate.gate
+    @base_gate.gate(cache_ttl=RESPONSE_CACHE_TTL)
     def base_weather():
         response = make_response(jsonify({"weather": "sunny", "temp": 75}))
         return response
 
     @app.route("/avalanche-weather", methods=['GET'])
-    @avalanche_gate.gate
+    @avalanche_gate.gate(cache_ttl=RESPONSE_CACHE_TTL)
     def avalanche_weather():
         response = make_response(jsonify({"weather": "sunny", "temp": 75}))
         return response
@@ -1,2 +1,3 @@
 from .client import (HTTPayerClient)
+from .sessions import (CreditLedger)
 # from .gate import (X402Gate)
\ No newline at end of file
@@ -0,0 +1,225 @@
+import asyncio
+import os
+from typing import Any, Iterable, List, Optional, Union
+
+import httpx
+from dotenv import load_dotenv
+
+from .cache import RequirementsCache
+from .client import RETRY_STATUSES, _price_vary
+
+load_dotenv()
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"})
+
+class BudgetExceeded(RuntimeError):
+    """Raised when paying a 402 would take a `SpendBudget` past its limit."""
+
+class SpendBudget:
+    """
+    Upper bound on the total atomic units paid across concurrent calls.
+
+    Amounts are reserved before paying and refunded if the payment fails,
+    so concurrent calls can never overshoot the limit together.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = int(limit)
+        self.spent = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return self.limit - self.spent
+
+    async def reserve(self, amount: int):
+        async with self._lock:
+            if self.spent + amount > self.limit:
+                raise BudgetExceeded(f"payment of {amount} exceeds remaining budget {self.remaining}")
+            self.spent += amount
+
+    async def refund(self, amount: int):
+        async with self._lock:
+            self.spent -= amount
+
+def _accepts(resp: httpx.Response) -> list:
+    try:
+        return resp.json().get("accepts") or []
+    except ValueError:
+        return []
+
+def _quoted_amount(accepts: list) -> int:
+    """Price of a 402: maxAmountRequired of its `exact` requirement."""
+    exact = next((x for x in accepts if x.get("scheme") == "exact"), None)
+    if not exact or "maxAmountRequired" not in exact:
+        raise ValueError("402 response has no exact payment requirement")
+    return int(exact["maxAmountRequired"])
+
+class AsyncHTTPayerClient:
+    """
+    asyncio counterpart of `HTTPayerClient`, built on a pooled httpx.AsyncClient.
+    """
+
+    def __init__(self, router_url=None, api_key=None, *, timeout=60.0,
+                 retries=3, backoff_factor=0.5, max_connections=100, client=None,
+                 requirements_ttl=300, requirements_path=None, signer=None):
+        """
+        :param router_url: URL of the hosted /HTTPayer endpoint.
+        :param timeout: Default timeout in seconds for every call.
+        :param retries: Maximum retries on transient failures (connection errors,
+                        and 429/5xx for idempotent methods).
+        :param backoff_factor: Exponential backoff base in seconds between retries.
+        :param max_connections: Size of the shared connection pool.
+        :param client: Optional pre-configured httpx.AsyncClient to use instead.
+        :param requirements_ttl: Seconds to remember that a URL is paywalled and skip its
+                                 unpaid probe (0 disables).
+        :param requirements_path: Optional JSON file persisting those requirements across runs.
+        :param signer: Optional `httpayer.signer.LocalSigner` to pay directly instead of
+                       through the router (see `HTTPayerClient`).
+        """
+        self.router_url = router_url or os.getenv("X402_ROUTER_URL", "http://app.httpayer.com/pay")
+        self.api_key = api_key or os.getenv('HTTPAYER_API_KEY')
+        self.signer = signer
+
+        if signer is None and (not self.router_url or not self.api_key):
+            raise ValueError("Router URL and API Key must be configured!")
+
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.requirements = (RequirementsCache(ttl=requirements_ttl, path=requirements_path)
+                             if requirements_ttl else None)
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            # transport-level retries only cover failed connects, which is
+            # safe even for the paying POST to the router; with a custom
+            # transport the pool limits must be set on it, not the client
+            transport=httpx.AsyncHTTPTransport(
+                retries=retries,
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections),
+            ),
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        method = method.upper()
+        attempt = 0
+        while True:
+            resp = await self.client.request(method, url, **kwargs)
+            if (resp.status_code not in RETRY_STATUSES or method not in IDEMPOTENT_METHODS
+                    or attempt >= self.retries):
+                return resp
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def pay_invoice(self, api_url=None, api_method="GET", api_payload={}):
+        """
+        Pay a 402 payment (using the router service).
+        """
+        return await self._pay_via_router(api_url, api_method, api_payload)
+
+    async def _pay_via_router(self, api_url, api_method, api_payload):
+        data = {
+            "api_url": api_url,
+            "method": api_method,
+            "payload": api_payload
+        }
+
+        header = {'x-api-key':self.api_key}
+
+        resp = await self.client.post(self.router_url, headers=header, json=data)
+        resp.raise_for_status()
+        return resp
+
+    async def request(self, method, url, *, budget: Optional[SpendBudget] = None, **kwargs):
+        """
+        Automatically handle 402 Payment Required HTTP flow. URLs already
+        known to be paywalled are paid without the unpaid probe request.
+
+        :param budget: Optional `SpendBudget` the payment is charged against;
+                       raises `BudgetExceeded` instead of paying past it.
+        """
+        vary = _price_vary(kwargs)
+        accepts = self.requirements.get(method, url, vary) if self.requirements is not None else None
+
+        if accepts:
+            try:
+                resp = await self._charge(method, url, accepts, kwargs, budget)
+            except (httpx.HTTPError, ValueError):
+                # stale knowledge or a failed payment: re-probe next time
+                self.requirements.invalidate(method, url, vary)
+                raise
+            if resp.status_code != 402:
+                return resp
+            # requirements changed upstream; treat this 402 as a fresh probe
+            self.requirements.invalidate(method, url, vary)
+        else:
+            resp = await self._send(method, url, **kwargs)
+            if resp.status_code != 402:
+                return resp
+
+        accepts = _accepts(resp)
+        if self.requirements is not None and accepts:
+            self.requirements.put(method, url, accepts, vary)
+        return await self._charge(method, url, accepts, kwargs, budget)
+
+    async def _charge(self, method, url, accepts, kwargs, budget: Optional[SpendBudget]):
+        """
+        Pay against `accepts`, holding the quoted amount in `budget` unless the
+        payment fails. A cancelled call keeps its reservation: the router may
+        already have paid.
+        """
+        amount = _quoted_amount(accepts) if budget is not None else 0
+        if budget is not None:
+            await budget.reserve(amount)
+        try:
+            resp = await self._pay(method, url, accepts, kwargs)
+        except (httpx.HTTPError, ValueError):
+            if budget is not None:
+                await budget.refund(amount)
+            raise
+        if resp.status_code == 402 and budget is not None:
+            await budget.refund(amount)
+        return resp
+
+    async def _pay(self, method, url, accepts, kwargs):
+        if self.signer is None:
+            return await self.pay_invoice(url, method, kwargs.get("json", {}))
+        headers = dict(kwargs.get("headers") or {})
+        headers["X-PAYMENT"] = self.signer.payment_header(self.signer.select(accepts))
+        return await self.client.request(method, url, **dict(kwargs, headers=headers))
+
+    async def gather(self, calls: Iterable[Union[str, tuple, dict]], *, concurrency: int = 10,
+                     budget: Optional[int] = None) -> List[Any]:
+        """
+        Run many paid calls concurrently and return their results in order.
+
+        Each call is a URL (GET), a ``(method, url)`` / ``(method, url, kwargs)``
+        tuple, or a dict with ``method``, ``url`` and any request kwargs. At
+        most `concurrency` calls are in flight at once, and the total paid is
+        capped at `budget` atomic units when given. Failed items come back as
+        their exception (e.g. `BudgetExceeded`) rather than aborting the batch.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        spend = SpendBudget(budget) if budget is not None else None
+
+        async def run(call):
+            if isinstance(call, str):
+                method, url, kwargs = "GET", call, {}
+            elif isinstance(call, dict):
+                kwargs = dict(call)
+                method, url = kwargs.pop("method", "GET"), kwargs.pop("url")
+            else:
+                method, url, kwargs = call[0], call[1], (call[2] if len(call) > 2 else {})
+            async with semaphore:
+                return await self.request(method, url, budget=spend, **kwargs)
+
+        return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
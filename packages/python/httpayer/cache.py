@@ -0,0 +1,255 @@
+import os
+import json
+import hashlib
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache with per-entry expiry.
+
+    Entries expire at an absolute unix timestamp (``expires_at``) or after the
+    cache-wide ``ttl`` when no explicit expiry is given.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        """
+        :param maxsize: Maximum number of live entries kept before evicting the least recently used.
+        :param ttl: Default lifetime in seconds for entries stored without ``expires_at`` (None = no expiry).
+        """
+        self.maxsize = int(maxsize)
+        self.ttl     = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock   = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            return default if item is _MISSING else item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> list:
+        """Snapshot of the live entries as ``(key, value, expires_at)`` tuples."""
+        now = time.time()
+        with self._lock:
+            return [(k, v, exp) for k, (v, exp) in self._data.items()
+                    if exp is None or exp > now]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+class RequirementsCache:
+    """
+    Payment requirements (the 402 ``accepts`` list) last seen per method + URL.
+
+    Lets a client skip the unpaid probe for URLs it already knows are
+    paywalled. Prices that depend on the request (e.g. a batch body) are
+    kept apart by passing that data as `vary`; it is hashed into the key.
+    Kept in memory with a TTL and optionally mirrored to a JSON file so the
+    knowledge survives restarts.
+    """
+
+    def __init__(self, ttl: float = 300, path: Optional[str] = None, maxsize: int = 1024):
+        """
+        :param ttl: Seconds a recorded requirement stays trusted.
+        :param path: Optional JSON file used to persist entries between runs.
+        :param maxsize: Maximum number of URLs remembered.
+        """
+        self.ttl   = ttl
+        self.path  = os.path.expanduser(path) if path else None
+        self._mem  = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(method: str, url: str, vary=None) -> str:
+        key = f"{method.upper()} {url}"
+        if vary is None:
+            return key
+        if isinstance(vary, str):
+            vary = vary.encode()
+        if not isinstance(vary, bytes):
+            vary = json.dumps(vary, sort_keys=True, separators=(",", ":"), default=str).encode()
+        return f"{key} #{hashlib.sha256(vary).hexdigest()[:32]}"
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in stored.items():
+            if entry.get("expires_at", 0) > now:
+                self._mem.set(key, entry["accepts"], expires_at=entry["expires_at"])
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = {k: {"accepts": v, "expires_at": exp}
+                        for k, v, exp in self._mem.items() if exp is not None}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.path)
+
+    def get(self, method: str, url: str, vary=None) -> Optional[list]:
+        return self._mem.get(self._key(method, url, vary))
+
+    def put(self, method: str, url: str, accepts: list, vary=None):
+        self._mem.set(self._key(method, url, vary), accepts)
+        self._save()
+
+    def invalidate(self, method: str, url: str, vary=None):
+        if self._mem.pop(self._key(method, url, vary)) is not None:
+            self._save()
+
+def cache_control_ttl(headers, default: float) -> Optional[float]:
+    """
+    Freshness lifetime allowed by a response's Cache-Control header.
+
+    Returns None when the response must not be reused (``no-store``,
+    ``no-cache``, ``max-age=0``), ``max-age`` when present, else `default`.
+    """
+    directives = {}
+    for part in (headers.get("Cache-Control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    if "no-store" in directives or "no-cache" in directives:
+        return None
+    if "max-age" in directives:
+        try:
+            max_age = int(directives["max-age"])
+        except ValueError:
+            return default
+        return max_age if max_age > 0 else None
+    return default
+
+class ResponseCache:
+    """
+    Two-tier cache of HTTP responses stored as ``(status, headers, body)``.
+
+    The memory tier is an entry-bounded LRU. The optional disk tier is a
+    SQLite file bounded by total body size, evicting least recently used
+    entries first. Disk hits are promoted back into memory.
+    """
+
+    def __init__(self, ttl: float = 60, maxsize: int = 256, path: Optional[str] = None,
+                 max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param ttl: Fallback lifetime in seconds when the response has no max-age.
+        :param maxsize: Entries kept in memory.
+        :param path: SQLite file for the disk tier (None = memory only).
+        :param max_bytes: Total body bytes kept on disk before evicting.
+        """
+        self.ttl       = ttl
+        self.max_bytes = max_bytes
+        self._mem      = LRUCache(maxsize=maxsize)
+        self._con      = None
+        self._lock     = threading.Lock()
+        if path:
+            path = os.path.expanduser(path)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._con = sqlite3.connect(path, check_same_thread=False)
+            self._con.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key         TEXT PRIMARY KEY,
+                    status      INTEGER,
+                    headers     TEXT,
+                    body        BLOB,
+                    size        INTEGER,
+                    expires_at  REAL,
+                    last_access REAL
+                )
+            """)
+            self._con.commit()
+
+    def get(self, key: str) -> Optional[tuple]:
+        entry = self._mem.get(key)
+        if entry is not None or self._con is None:
+            return entry
+        now = time.time()
+        with self._lock:
+            row = self._con.execute(
+                "SELECT status, headers, body, expires_at FROM responses WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[3] <= now:
+                self._con.execute("DELETE FROM responses WHERE key=?", (key,))
+                self._con.commit()
+                return None
+            self._con.execute("UPDATE responses SET last_access=? WHERE key=?", (now, key))
+            self._con.commit()
+        entry = (row[0], json.loads(row[1]), bytes(row[2]))
+        self._mem.set(key, entry, expires_at=row[3])
+        return entry
+
+    def put(self, key: str, status: int, headers: dict, body: bytes, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if not ttl or ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        entry = (status, dict(headers), body)
+        self._mem.set(key, entry, expires_at=expires_at)
+        if self._con is None or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, status, json.dumps(entry[1]), body, len(body), expires_at, time.time()),
+            )
+            self._evict_locked()
+            self._con.commit()
+
+    def _evict_locked(self):
+        self._con.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        total = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._con.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            self._con.execute("DELETE FROM responses WHERE key=?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -1,31 +1,121 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 import os
 
+from requests.structures import CaseInsensitiveDict
+
+from . import tracing
+from .cache import RequirementsCache, cache_control_ttl
+
 load_dotenv()
 
+# transient upstream/gateway failures worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def _build_session(retries, backoff_factor, pool_maxsize) -> requests.Session:
+    """
+    Session with keep-alive connection pools and bounded exponential backoff.
+
+    Status-based and read retries only apply to idempotent methods. POST is
+    deliberately left out: the router signs a fresh authorization (new
+    nonce) for every call it receives, so re-sending a POST that reached it
+    could pay twice. Such a POST is only retried when the connection could
+    not be established at all.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS - {"POST"},
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize,
+                          pool_maxsize=pool_maxsize)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _cached_response(url, entry) -> requests.Response:
+    """Rebuild a requests.Response from a ResponseCache entry."""
+    status, headers, body = entry
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers = CaseInsensitiveDict(headers)
+    resp.headers["X-HTTPAYER-CACHE"] = "HIT"
+    resp._content = body
+    resp.url = url
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    return resp
+
+def _price_vary(kwargs):
+    """Request data besides method + URL that a 402 price may depend on (query, body)."""
+    vary = {k: kwargs[k] for k in ("params", "json", "data") if kwargs.get(k) is not None}
+    return vary or None
+
 class HTTPayerClient:
     """
     Unified HTTPayer client for managing 402 payments.
     """
 
-    def __init__(self,router_url=None,api_key=None):
+    def __init__(self,router_url=None,api_key=None, *, timeout=(5, 60),
+                 retries=3, backoff_factor=0.5, pool_maxsize=10, session=None,
+                 requirements_ttl=300, requirements_path=None, signer=None,
+                 response_cache=None):
         """
         :param router_url: URL of the hosted /HTTPayer endpoint.
+        :param timeout: Default (connect, read) timeout in seconds for every call.
+        :param retries: Maximum retries on transient failures (connection errors, 429/5xx).
+        :param backoff_factor: Exponential backoff base in seconds between retries.
+        :param pool_maxsize: Keep-alive connections kept per host.
+        :param session: Optional pre-configured requests.Session to use instead.
+        :param requirements_ttl: Seconds to remember that a URL is paywalled and skip its
+                                 unpaid probe (0 disables).
+        :param requirements_path: Optional JSON file persisting those requirements across runs.
+        :param signer: Optional `httpayer.signer.LocalSigner`; when set, 402s are paid by
+                       signing X-PAYMENT locally and calling the resource directly,
+                       without the router (no API key needed).
+        :param response_cache: Optional `httpayer.cache.ResponseCache` reusing paid GET
+                               responses instead of paying again.
         """
         self.router_url = router_url or os.getenv("X402_ROUTER_URL", "http://app.httpayer.com/pay")
         self.api_key = api_key or os.getenv('HTTPAYER_API_KEY')
+        self.signer = signer
+        self.response_cache = response_cache
 
-        if not self.router_url or not self.api_key:
+        if signer is None and (not self.router_url or not self.api_key):
             raise ValueError("Router URL and API Key must be configured!")
 
-    def pay_invoice(self, api_url=None, api_method="GET", api_payload={}):
+        self.timeout = timeout
+        self.session = session or _build_session(retries, backoff_factor, pool_maxsize)
+        self.requirements = (RequirementsCache(ttl=requirements_ttl, path=requirements_path)
+                             if requirements_ttl else None)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def pay_invoice(self, api_url=None, api_method="GET", api_payload={}, stream=False):
         """
         Pay a 402 payment (using the router service).
+
+        :param stream: Return without reading the body; consume it with
+                       ``iter_content()``/``iter_lines()``.
         """
-        return self._pay_via_router(api_url, api_method, api_payload)
+        return self._pay_via_router(api_url, api_method, api_payload, stream)
 
-    def _pay_via_router(self, api_url, api_method, api_payload):
+    def _pay_via_router(self, api_url, api_method, api_payload, stream=False):
         """
         Call the hosted /HttPayer endpoint to handle payment and retry.
         """
@@ -38,20 +128,114 @@ class HTTPayerClient:
             "payload": api_payload
         }
 
-        header = {'x-api-key':self.api_key}
+        header = tracing.inject({'x-api-key':self.api_key})
 
-        resp = requests.post(self.router_url, headers=header, json=data)
+        with tracing.span("httpayer.router", url=api_url):
+            resp = self.session.post(self.router_url, headers=header, json=data,
+                                     timeout=self.timeout, stream=stream)
         resp.raise_for_status()
         return resp
 
     def request(self, method, url, **kwargs):
         """
         Automatically handle 402 Payment Required HTTP flow.
+
+        URLs already known to be paywalled (see `requirements_ttl`) are paid
+        straight away, without the unpaid probe request. Pass ``stream=True``
+        to get the paid body as an iterator (``resp.iter_content()``) instead
+        of buffering it.
+
+        With a `response_cache`, a paid ``GET`` is reused for identical calls
+        while fresh (per Cache-Control, else the cache TTL).
         """
-        resp = requests.request(method, url, **kwargs)
+        kwargs.setdefault("timeout", self.timeout)
 
-        if resp.status_code == 402:
-            api_payload = kwargs.get("json", {})
-            resp = self.pay_invoice(url, method, api_payload)
+        with tracing.span("httpayer.request", method=method.upper(), url=url) as span:
+            resp = self._cached_request(method, url, kwargs)
+            span.set("status", resp.status_code)
+            return resp
 
+    def _cached_request(self, method, url, kwargs):
+        cache_key = None
+        if self.response_cache is not None and method.upper() == "GET" and not kwargs.get("stream"):
+            cache_key = requests.Request("GET", url, params=kwargs.get("params")).prepare().url
+            hit = self.response_cache.get(cache_key)
+            if hit is not None:
+                return _cached_response(cache_key, hit)
+
+        resp, paid = self._request(method, url, kwargs)
+
+        if cache_key is not None and paid and resp.status_code == 200:
+            ttl = cache_control_ttl(resp.headers, self.response_cache.ttl)
+            if ttl:
+                self.response_cache.put(cache_key, resp.status_code, dict(resp.headers),
+                                        resp.content, ttl)
         return resp
+
+    def _request(self, method, url, kwargs):
+        """Run the probe/pay flow; returns ``(response, paid)``."""
+        vary = _price_vary(kwargs)
+        accepts = self.requirements.get(method, url, vary) if self.requirements is not None else None
+
+        if accepts:
+            try:
+                resp = self._pay(method, url, accepts, kwargs)
+            except (requests.RequestException, ValueError):
+                # stale knowledge or a failed payment: re-probe next time
+                self.requirements.invalidate(method, url, vary)
+                raise
+            if resp.status_code != 402:
+                return resp, True
+            # requirements changed upstream; treat this 402 as a fresh probe
+            self.requirements.invalidate(method, url, vary)
+        else:
+            with tracing.span("httpayer.probe"):
+                resp = self.session.request(method, url, **self._traced(kwargs))
+
+        if resp.status_code != 402:
+            return resp, False
+
+        accepts = self._remember(method, url, resp, vary)
+        resp.close()
+        return self._pay(method, url, accepts, kwargs), True
+
+    def iter_content(self, method, url, chunk_size=64 * 1024, **kwargs):
+        """
+        Pay for `url` if needed and yield its body in chunks, keeping memory
+        use constant regardless of payload size.
+        """
+        resp = self.request(method, url, stream=True, **kwargs)
+        with resp:
+            resp.raise_for_status()
+            yield from resp.iter_content(chunk_size=chunk_size)
+
+    def _pay(self, method, url, accepts, kwargs):
+        if self.signer is None:
+            return self.pay_invoice(url, method, kwargs.get("json", {}),
+                                    stream=kwargs.get("stream", False))
+        return self._pay_direct(method, url, accepts, kwargs)
+
+    def _pay_direct(self, method, url, accepts, kwargs):
+        """
+        Sign the payment locally and send the request with X-PAYMENT attached.
+        """
+        with tracing.span("httpayer.sign"):
+            header = self.signer.payment_header(self.signer.select(accepts))
+        with tracing.span("httpayer.pay"):
+            headers = tracing.inject(dict(kwargs.get("headers") or {}))
+            headers["X-PAYMENT"] = header
+            return self.session.request(method, url, **dict(kwargs, headers=headers))
+
+    @staticmethod
+    def _traced(kwargs):
+        """`kwargs` with the active trace context added to the request headers."""
+        return dict(kwargs, headers=tracing.inject(dict(kwargs.get("headers") or {})))
+
+    def _remember(self, method, url, resp, vary=None):
+        try:
+            accepts = resp.json().get("accepts") or []
+        except ValueError:
+            return []
+        if self.requirements is not None and accepts:
+            self.requirements.put(method, url, accepts, vary)
+        return accepts
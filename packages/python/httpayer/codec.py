@@ -0,0 +1,127 @@
+import base64
+import binascii
+import hashlib
+from typing import Optional, Union
+
+try:
+    import orjson
+except ImportError:          # optional: pip install httpayer[fast]
+    orjson = None
+    import json
+
+# an exact-scheme X-PAYMENT header is ~600 bytes; anything far larger is junk
+MAX_HEADER_BYTES = 8 * 1024
+
+if orjson is not None:
+    def dumps(obj, sort_keys: bool = False) -> bytes:
+        """Compact JSON bytes (no whitespace), optionally with sorted keys."""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+
+    loads = orjson.loads
+else:
+    def dumps(obj, sort_keys: bool = False) -> bytes:
+        """Compact JSON bytes (no whitespace), optionally with sorted keys."""
+        # raw UTF-8 like orjson, so both backends produce the same bytes
+        return json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys,
+                          ensure_ascii=False).encode()
+
+    loads = json.loads
+
+def encode_header(obj: dict) -> str:
+    """
+    Encode an x402 header value (X-PAYMENT, X-PAYMENT-RESPONSE): compact
+    JSON in standard, padded base64, as the x402 reference SDKs do.
+    """
+    return base64.b64encode(dumps(obj)).decode()
+
+def decode_header(header: Union[str, bytes], max_bytes: int = MAX_HEADER_BYTES) -> dict:
+    """
+    Decode an x402 header value back into its JSON object.
+
+    Accepts standard or URL-safe base64, with or without padding.
+
+    :param header: Base64-encoded header string
+    :param max_bytes: Reject longer headers before decoding anything
+    :raises ValueError: if the header is too large, not base64 or not a JSON object
+    """
+    if isinstance(header, str):
+        header = header.encode("ascii", errors="replace")
+    header = header.strip()
+    if len(header) > max_bytes:
+        raise ValueError(f"Invalid X-PAYMENT header: larger than {max_bytes} bytes")
+    try:
+        raw = base64.b64decode(header.replace(b"-", b"+").replace(b"_", b"/")
+                               + b"=" * (-len(header) % 4), validate=True)
+        decoded = loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid X-PAYMENT header: {e}")
+    if not isinstance(decoded, dict):
+        raise ValueError("Invalid X-PAYMENT header: Decoded X-PAYMENT is not a JSON object")
+    return decoded
+
+def decode_x_payment(header: str) -> dict:
+    """
+    Decode a base64-encoded X-PAYMENT header back into its structured JSON form.
+
+    :param header: Base64-encoded X-PAYMENT string
+    :return: Parsed Python dictionary of the payment payload
+    """
+    return decode_header(header)
+
+def payment_digest(payload: dict, reqs: dict) -> str:
+    """
+    Stable digest of a decoded payment payload and the requirements it is
+    checked against (a verify result is only valid for that pair).
+    """
+    return hashlib.sha256(dumps([payload, reqs], sort_keys=True)).hexdigest()
+
+class PaymentContext:
+    """
+    A payment decoded once per request and handed from verify to settle.
+
+    Carries the decoded payload and memoizes what both phases derive from
+    it (the verify-cache digest, the authorization fields), so the header
+    is parsed and hashed only once.
+    """
+
+    __slots__ = ("header", "payload", "_digest_reqs", "_digest")
+
+    def __init__(self, payload: dict, header: Optional[str] = None):
+        self.header       = header
+        self.payload      = payload
+        self._digest_reqs = None
+        self._digest      = None
+
+    @classmethod
+    def from_header(cls, header: str) -> "PaymentContext":
+        return cls(decode_header(header), header)
+
+    @classmethod
+    def wrap(cls, payment) -> "PaymentContext":
+        """Accept either a PaymentContext or an already decoded payload dict."""
+        return payment if isinstance(payment, cls) else cls(payment)
+
+    @property
+    def authorization(self) -> dict:
+        inner = self.payload.get("payload")
+        auth = inner.get("authorization") if isinstance(inner, dict) else None
+        return auth if isinstance(auth, dict) else {}
+
+    @property
+    def payer(self) -> Optional[str]:
+        return self.authorization.get("from")
+
+    @property
+    def valid_before(self) -> Optional[int]:
+        """The authorization's ``validBefore`` as an int, or None if absent/malformed."""
+        try:
+            return int(self.authorization["validBefore"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def digest(self, reqs: dict) -> str:
+        """`payment_digest` for `reqs`, computed once per requirements object."""
+        if self._digest_reqs is not reqs:
+            self._digest = payment_digest(self.payload, reqs)
+            self._digest_reqs = reqs
+        return self._digest
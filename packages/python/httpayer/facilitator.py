@@ -0,0 +1,143 @@
+import time
+import requests
+
+from . import tracing
+from .cache import LRUCache
+from .codec import PaymentContext, encode_header
+
+# kept for callers importing the old names
+_encode_settle_header = encode_header
+
+_AUTH_FIELDS = ("from", "to", "value", "validAfter", "validBefore", "nonce")
+
+class FacilitatorClient:
+    """
+    Client for an x402 facilitator's ``/verify`` and ``/settle`` endpoints.
+
+    Holds a pooled HTTP session and the verify-result cache, so it can be
+    shared by every gate (or middleware route) that uses the same facilitator.
+    """
+
+    def __init__(self, facilitator_url, *, verify_cache_size=1024,
+                 verify_cache_ttl=60, timeout=15):
+        base                 = facilitator_url.rstrip('/')
+        self.verify_url      = f"{base}/facilitator/verify"
+        self.settle_url      = f"{base}/facilitator/settle"
+        self.timeout         = timeout
+        self._http           = requests.Session()
+        # verify results (positive and negative) keyed by payment digest;
+        # entries live until the authorization's validBefore
+        self._verify_cache   = LRUCache(maxsize=verify_cache_size, ttl=verify_cache_ttl)
+
+    def _cache_verdict(self, key: str, verdict: tuple, payment: PaymentContext = None):
+        expires_at = payment.valid_before if payment is not None else None
+        if expires_at is not None and expires_at <= time.time():
+            return
+        self._verify_cache.set(key, verdict, expires_at=expires_at)
+
+    @staticmethod
+    def prevalidate(payload: dict, reqs: dict):
+        """
+        Cheap local checks run before any facilitator call: structure,
+        scheme/network, payee, amount and the validity window. Raises
+        ``ValueError`` with an x402-style reason on the first failure.
+        """
+        inner = payload.get("payload")
+        auth = inner.get("authorization") if isinstance(inner, dict) else None
+        if not isinstance(auth, dict) or not inner.get("signature"):
+            raise ValueError("invalid_payload")
+        missing = [f for f in _AUTH_FIELDS if f not in auth]
+        if missing:
+            raise ValueError(f"invalid_payload: missing {', '.join(missing)}")
+
+        if payload.get("scheme") != reqs["scheme"]:
+            raise ValueError("unsupported_scheme")
+        if payload.get("network") != reqs["network"]:
+            raise ValueError("invalid_network")
+        if str(auth["to"]).lower() != reqs["payTo"].lower():
+            raise ValueError("wrong_payee")
+
+        try:
+            value        = int(auth["value"])
+            valid_after  = int(auth["validAfter"])
+            valid_before = int(auth["validBefore"])
+        except (TypeError, ValueError):
+            raise ValueError("invalid_payload: non-integer authorization field")
+
+        if value <= 0:
+            raise ValueError("invalid_amount")
+        if value > int(reqs["maxAmountRequired"]):
+            raise ValueError("amount_too_high")
+        if value < int(reqs["maxAmountRequired"]):
+            raise ValueError("insufficient_amount")
+
+        now = int(time.time())
+        if now < valid_after:
+            raise ValueError("not_yet_valid")
+        if now > valid_before:
+            raise ValueError("authorization_expired")
+
+    def verify(self, payment, reqs: dict):
+        """
+        :param payment: A `PaymentContext`, or the decoded payload dict
+        :raises ValueError: with the reason when the payment is invalid
+        """
+        payment = PaymentContext.wrap(payment)
+        key = payment.digest(reqs)
+        verdict = self._verify_cache.get(key)
+        if verdict is None:
+            try:
+                self.prevalidate(payment.payload, reqs)
+            except ValueError as exc:
+                verdict = (False, str(exc))
+            else:
+                verdict = self._verify_remote(payment.payload, reqs)
+            # a payment that is not valid *yet* may be by the next request
+            if verdict != (False, "not_yet_valid"):
+                self._cache_verdict(key, verdict, payment)
+
+        is_valid, result = verdict
+        if not is_valid:
+            raise ValueError(result)
+        return result
+
+    def _verify_remote(self, payload: dict, reqs: dict) -> tuple:
+        """
+        Ask the facilitator to verify. Transport/HTTP errors propagate (and are
+        not cached); a definitive answer is returned as ``(is_valid, result)``.
+        """
+        r = self._http.post(
+            self.verify_url,
+            json={
+                "x402Version": 1,
+                "paymentPayload": payload,
+                "paymentRequirements": reqs,
+            },
+            headers=tracing.inject(),
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        result = r.json()
+        if result.get("isValid") is False:
+            return (False, result.get("invalidReason") or "invalid payment")
+        return (True, result)
+
+    def settle(self, payment, reqs: dict):
+        payment = PaymentContext.wrap(payment)
+        r = self._http.post(
+            self.settle_url,
+            json={
+                "x402Version": 1,
+                "paymentPayload": payment.payload,
+                "paymentRequirements": reqs,
+            },
+            headers=tracing.inject(),
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        settle_json = r.json()    # ← no “header” key here
+        if settle_json.get("success") is not False:
+            # a settled authorization can never verify again; short-circuit replays
+            self._cache_verdict(payment.digest(reqs),
+                                (False, "authorization_already_settled"), payment)
+        return settle_json
@@ -1,127 +1,373 @@
 from functools import wraps
-from flask import request, jsonify, make_response
-import requests
+from flask import request, jsonify, make_response, Response, stream_with_context
 from typing import Callable
 from web3 import Web3
-import base64, json
-
-def decode_x_payment(header: str) -> dict:
-    """
-    Decode a base64-encoded X-PAYMENT header back into its structured JSON form.
-
-    :param header: Base64-encoded X-PAYMENT string
-    :return: Parsed Python dictionary of the payment payload
-    """
-    try:
-        decoded_bytes = base64.b64decode(header)
-        decoded_json = json.loads(decoded_bytes)
-        if not isinstance(decoded_json, dict):
-            raise ValueError("Decoded X-PAYMENT is not a JSON object")
-        return decoded_json
-    except (ValueError, json.JSONDecodeError, base64.binascii.Error) as e:
-        raise ValueError(f"Invalid X-PAYMENT header: {e}")
-
-def _encode_settle_header(settle_json: dict) -> str:
-    """
-    Deterministically compact-encode the settle JSON and base64-encode it,
-    matching x402-js `settleResponseHeader(...)`.
-    """
-    # separators=(',',':') = no whitespace → identical digest as JS
-    compact = json.dumps(settle_json, separators=(",", ":"))
-    return base64.b64encode(compact.encode()).decode()
+import json, hashlib, secrets, time
+
+from . import tracing
+from .cache import LRUCache
+from .codec import PaymentContext, encode_header
+from .facilitator import FacilitatorClient
+# kept for callers importing the old names from here
+from .codec import decode_x_payment
+from .facilitator import _encode_settle_header
+from .tokens import sign_token, verify_token
 
 class X402Gate:
     def __init__(self, *, pay_to, network, asset_address,
                  max_amount, asset_name, asset_version,
-                 facilitator_url):
+                 facilitator_url=None, facilitator=None, verify_cache_size=1024,
+                 verify_cache_ttl=60, session_ledger=None,
+                 session_secret=None, session_ttl=3600,
+                 response_cache_size=256):
         self.pay_to          = Web3.to_checksum_address(pay_to)
         self.network         = network            
         self.asset_address   = Web3.to_checksum_address(asset_address)
         self.max_amount      = int(max_amount)              # keep atomic units
-        base                 = facilitator_url.rstrip('/')
-        self.verify_url      = f"{base}/facilitator/verify"
-        self.settle_url      = f"{base}/facilitator/settle"
+        if facilitator is None and not facilitator_url:
+            raise ValueError("X402Gate needs facilitator_url or a FacilitatorClient")
         self.asset_name      = asset_name
         self.asset_version   = asset_version
+        # pass a shared FacilitatorClient to pool connections and verify
+        # results across gates
+        self.facilitator     = facilitator or FacilitatorClient(
+            facilitator_url,
+            verify_cache_size=verify_cache_size,
+            verify_cache_ttl=verify_cache_ttl,
+        )
+        self.verify_url      = self.facilitator.verify_url
+        self.settle_url      = self.facilitator.settle_url
+        # prepaid sessions (see sell_credits) and revalidation receipts; pass a
+        # fixed secret so tokens survive restarts of a persistent ledger
+        self.session_ledger  = session_ledger
+        self.session_secret  = (session_secret.encode() if isinstance(session_secret, str)
+                                else session_secret) or secrets.token_bytes(32)
+        self.session_ttl     = int(session_ttl)
+        # paid responses reused by views gated with cache_ttl
+        self._response_cache = LRUCache(maxsize=response_cache_size)
+
+    def _verify(self, payment: PaymentContext, reqs: dict):
+        return self.facilitator.verify(payment, reqs)
+
+    def _settle(self, payment: PaymentContext, reqs: dict):
+        return self.facilitator.settle(payment, reqs)
+
+    def _requirements(self, amount=None) -> dict:
+        return {
+            "scheme": "exact",
+            "network": self.network,  # always lower-case
+            "maxAmountRequired": str(self.max_amount if amount is None else amount),
+            "resource":  request.base_url,    # same string both times
+            "description": "",
+            "mimeType":  "",
+            "payTo":      self.pay_to,
+            "maxTimeoutSeconds": 60,
+            "asset":      self.asset_address,
+            "extra": { "name": self.asset_name, "version": self.asset_version }
+        }
+
+    @staticmethod
+    def _payment_required(req_json: dict, error: str):
+        return make_response(jsonify({
+            "x402Version": 1,
+            "error": error,
+            "accepts": [req_json],
+        }), 402)
+
+    def _paid(self, req_json: dict, respond: Callable, settle_first: bool = False):
+        """
+        Run the x402 flow for the current request: require X-PAYMENT, verify,
+        call `respond(payload)` and settle. With `settle_first` the payment is
+        settled before `respond` runs (for responses that cannot be withdrawn,
+        e.g. issued credentials).
+        """
+        # 1. 402 if header missing
+        pay_header = request.headers.get("X-Payment")
+        if not pay_header:
+            return self._payment_required(req_json, "X-PAYMENT header is required")
+
+        # 2. decode once, pre-validate locally, then verify
+        try:
+            with tracing.span("x402.decode"):
+                payment = PaymentContext.from_header(pay_header)
+            with tracing.span("x402.verify"):
+                self._verify(payment, req_json)
+        except Exception as exc:
+            return self._payment_required(req_json, f"verification failed: {exc}")
+
+        # 3. run protected view
+        if not settle_first:
+            with tracing.span("x402.view"):
+                resp = make_response(respond(payment.payload))
+
+        # 4. settle  (stop the response if settlement fails)
+        try:
+            with tracing.span("x402.settle"):
+                settle_json = self._settle(payment, req_json)
+            # facilitators report a failed settlement as a 200 with success: false
+            if settle_json.get("success") is False:
+                raise ValueError(settle_json.get("errorReason") or "settlement rejected")
+            hdr = encode_header(settle_json)
+        except Exception as exc:
+            return self._payment_required(req_json, f"settlement failed: {exc}")
 
-    def _verify(self, hdr: str, reqs: dict):
-        payload = decode_x_payment(hdr)
-        r = requests.post(
-            self.verify_url,
-            json={
-                "x402Version": 1,
-                "paymentPayload": payload,
-                "paymentRequirements": reqs,
-            },
-            timeout=15,
+        if settle_first:
+            with tracing.span("x402.view"):
+                resp = make_response(respond(payment.payload))
+        resp.headers["X-PAYMENT-RESPONSE"] = hdr
+        return resp
+
+    def _spend_session(self, token: str) -> int:
+        claims = verify_token(token, self.session_secret)
+        return self.session_ledger.spend(claims["sid"])
+
+    def _response_key(self, view_fn, vary_headers=()) -> tuple:
+        """
+        Cache key for the current request: view, method, path, query and body,
+        plus the values of any `vary_headers` the response depends on.
+        """
+        body = b"" if request.method in ("GET", "HEAD") else request.get_data()
+        return (
+            view_fn.__module__, view_fn.__qualname__,
+            request.method, request.path,
+            tuple(sorted(request.args.items(multi=True))),
+            hashlib.sha256(body).hexdigest() if body else "",
+            tuple(request.headers.get(h, "") for h in vary_headers),
         )
-        r.raise_for_status()
-        return r.json()
-
-    def _settle(self, hdr: str, reqs: dict):
-        payload = decode_x_payment(hdr)
-        r = requests.post(
-            self.settle_url,
-            json={
-                "x402Version": 1,
-                "paymentPayload": payload,
-                "paymentRequirements": reqs,
-            },
-            timeout=15,
+
+    def _cache_hit(self, key):
+        """The cached response stored under `key`, or None."""
+        hit = self._response_cache.get(key)
+        if hit is None:
+            return None
+        data, status, headers = hit
+        return Response(data, status=status, headers=headers)
+
+    def _cached_view(self, view_fn, cache_ttl, args, kwargs, vary_headers=()):
+        """
+        Run `view_fn`, or replay a cached copy of its last successful response
+        for the same request when `cache_ttl` is set.
+        """
+        if not cache_ttl:
+            return make_response(view_fn(*args, **kwargs))
+
+        key = self._response_key(view_fn, vary_headers)
+        hit = self._cache_hit(key)
+        if hit is not None:
+            return hit
+
+        resp = make_response(view_fn(*args, **kwargs))
+        resp.vary.update(vary_headers)
+        if resp.status_code == 200 and not resp.is_streamed:
+            headers = [(k, v) for k, v in resp.headers.items()
+                       if k.lower() not in ("x-payment-response", "set-cookie")]
+            self._response_cache.set(key, (resp.get_data(), resp.status_code, headers),
+                                     expires_at=time.time() + cache_ttl)
+        return resp
+
+    @staticmethod
+    def _body_etag(resp):
+        if resp.status_code != 200 or resp.is_streamed:
+            return None
+        return hashlib.sha256(resp.get_data()).hexdigest()[:32]
+
+    def _issue_receipt(self, resp, resource: str, revalidate_ttl: int, etag=None):
+        """Tag a paid 200 response with an ETag and a signed receipt for free revalidation."""
+        if resp.status_code != 200:
+            return resp
+        etag = etag or self._body_etag(resp)
+        if etag is None:
+            return resp
+        resp.set_etag(etag)
+        resp.headers["X-PAYMENT-RECEIPT"] = sign_token(
+            {"res": resource, "etag": etag, "exp": int(time.time()) + revalidate_ttl},
+            self.session_secret,
         )
-        r.raise_for_status()
-        return r.json()           # ← no “header” key here
+        return resp
+
+    def _revalidate(self, resource: str, current_etag: Callable[[], str]):
+        """
+        Return a 304 if the request carries If-None-Match plus a valid receipt
+        for this resource and `current_etag()` (the content as it is now)
+        still matches the receipt; else None.
+        """
+        receipt = request.headers.get("X-Payment-Receipt")
+        if not receipt or not request.if_none_match:
+            return None
+        try:
+            claims = verify_token(receipt, self.session_secret)
+        except ValueError:
+            return None
+        if claims.get("res") != resource or not request.if_none_match.contains(claims.get("etag", "")):
+            return None
+        current = current_etag()
+        if current is None or current != claims["etag"]:
+            return None
+        resp = make_response("", 304)
+        resp.set_etag(current)
+        return resp
+
+    def gate(self, view_fn=None, *, cache_ttl=None, revalidate_ttl=None, etag_fn=None,
+             vary_headers=()):
+        """
+        Protect a Flask view with x402 payment. Use as ``@gate.gate`` or
+        ``@gate.gate(cache_ttl=30)``; with `cache_ttl` the view's successful
+        responses are reused for identical requests for that many seconds.
+        Every request is still paid for, only the backend work is skipped.
+        Requests are identical when view, method, path, query and body match;
+        list request headers the view reads (e.g. ``Accept-Language``) in
+        `vary_headers` so they are part of that match too.
+
+        With `revalidate_ttl`, paid responses carry an ``ETag`` and a signed
+        ``X-PAYMENT-RECEIPT``. For that many seconds a client sending the
+        receipt with ``If-None-Match`` gets a free ``304`` while the content
+        is unchanged. The current content is checked on every revalidation:
+        by calling `etag_fn` with the view's arguments when given (a cheap
+        version tag), else by hashing the response cached under `cache_ttl`
+        (a cache miss means the client pays again). The view itself never
+        runs for an unpaid revalidation, so `revalidate_ttl` needs one of
+        `etag_fn` or `cache_ttl`.
+        """
+        if revalidate_ttl and etag_fn is None and not cache_ttl:
+            raise ValueError("revalidate_ttl requires etag_fn or cache_ttl")
+        if view_fn is None:
+            return lambda fn: self.gate(fn, cache_ttl=cache_ttl, revalidate_ttl=revalidate_ttl,
+                                        etag_fn=etag_fn, vary_headers=vary_headers)
+        vary_headers = tuple(vary_headers)
 
-    def gate(self, view_fn):
         @wraps(view_fn)
         def wrapper(*args, **kwargs):
+            with tracing.span("x402.gate", parent=tracing.extract(request.headers),
+                              path=request.path, method=request.method) as span:
+                resp = make_response(gated(*args, **kwargs))
+                span.set("status", resp.status_code)
+                return resp
+
+        def gated(*args, **kwargs):
             # 0. Build once, then RE-USE
-            req_json = {
-                "scheme": "exact",
-                "network": self.network,  # always lower-case
-                "maxAmountRequired": str(self.max_amount),
-                "resource":  request.base_url,    # same string both times
-                "description": "",
-                "mimeType":  "",
-                "payTo":      self.pay_to,
-                "maxTimeoutSeconds": 60,
-                "asset":      self.asset_address,
-                "extra": { "name": self.asset_name, "version": self.asset_version }
-            }
-
-            # 1. 402 if header missing
-            pay_header = request.headers.get("X-Payment")
-            if not pay_header:
-                return make_response(jsonify({
-                    "x402Version": 1,
-                    "error": "X-PAYMENT header is required",
-                    "accepts": [req_json],
-                }), 402)
-
-            # 2. verify
-            try:
-                self._verify(pay_header, req_json)
-            except Exception as exc:
-                return make_response(jsonify({
-                    "x402Version": 1,
-                    "error": f"verification failed: {exc}",
-                    "accepts": [req_json],
-                }), 402)
-
-            # 3. run protected view
-            resp = view_fn(*args, **kwargs)
-
-            # 4. settle  (stop the response if settlement fails)
-            try:
-                settle_json = self._settle(pay_header, req_json)
-                hdr = _encode_settle_header(settle_json)
-                resp.headers["X-PAYMENT-RESPONSE"] = hdr
-            except Exception as exc:
-                return make_response(jsonify({
-                    "x402Version": 1,
-                    "error": f"settlement failed: {exc}",
-                    "accepts": [req_json]
-                }), 402)
+            req_json = self._requirements()
+
+            resource, fresh, etag = None, None, None
+            if revalidate_ttl:
+                resource = hashlib.sha256(
+                    repr(self._response_key(view_fn, vary_headers)).encode()).hexdigest()[:32]
+
+                def current_etag():
+                    nonlocal fresh, etag
+                    if etag_fn is not None:
+                        etag = str(etag_fn(*args, **kwargs))
+                    else:
+                        # compare against the cached copy only; reused below if
+                        # the caller has to pay after all
+                        fresh = self._cache_hit(self._response_key(view_fn, vary_headers))
+                        etag = self._body_etag(fresh) if fresh is not None else None
+                    return etag
+
+                not_modified = self._revalidate(resource, current_etag)
+                if not_modified is not None:
+                    return not_modified
+
+            def serve(payload=None):
+                resp = fresh if fresh is not None else self._cached_view(view_fn, cache_ttl, args, kwargs,
+                                                                         vary_headers)
+                if resource is not None:
+                    tag = None
+                    if etag_fn is not None:
+                        tag = etag if etag is not None else str(etag_fn(*args, **kwargs))
+                    resp = self._issue_receipt(resp, resource, revalidate_ttl, tag)
+                return resp
+
+            # prepaid session: spend one credit instead of paying on-chain
+            session_token = request.headers.get("X-Payment-Session")
+            if session_token and self.session_ledger is not None:
+                try:
+                    remaining = self._spend_session(session_token)
+                except (ValueError, KeyError) as exc:
+                    return self._payment_required(req_json, f"session rejected: {exc}")
+                resp = serve()
+                resp.headers["X-PAYMENT-SESSION-CREDITS"] = str(remaining)
+                return resp
+
+            return self._paid(req_json, serve)
+        return wrapper
 
+    def sell_credits(self, credits: int):
+        """
+        Build a Flask view that sells a prepaid session of `credits` requests
+        for a single payment of ``credits * max_amount``.
+
+        The response carries a signed session token; clients send it back in
+        ``X-PAYMENT-SESSION`` to any route gated by this gate and each request
+        spends one credit from the local ledger with no facilitator round trip.
+
+            app.add_url_rule("/credits", "credits", gate.sell_credits(100),
+                             methods=["GET", "POST"])
+        """
+        if self.session_ledger is None:
+            raise ValueError("sell_credits requires X402Gate(session_ledger=...)")
+        credits = int(credits)
+
+        def issue(payload):
+            payer = payload["payload"]["authorization"].get("from")
+            sid = self.session_ledger.issue(credits, self.session_ttl, payer=payer)
+            expires_at = int(time.time()) + self.session_ttl
+            token = sign_token({"sid": sid, "exp": expires_at}, self.session_secret)
+            resp = make_response(jsonify({
+                "session": token,
+                "credits": credits,
+                "expiresAt": expires_at,
+            }))
+            resp.headers["X-PAYMENT-SESSION"] = token
             return resp
-        return wrapper
\ No newline at end of file
+
+        def view():
+            return self._paid(self._requirements(self.max_amount * credits),
+                              issue, settle_first=True)
+        view.__name__ = f"sell_credits_{credits}"
+        return view
+
+    def batch(self, max_items: int = 1000, stream: bool = False):
+        """
+        Decorator turning a per-item function into a bulk route: one payment
+        of ``len(items) * max_amount`` covers every item in the request.
+
+        The request body is ``{"items": [...]}``; the decorated function is
+        called once per item (plus any URL arguments). Results come back as ``{"results": [...]}``,
+        or as NDJSON lines (one ``{"index", "result"|"error"}`` object per
+        item) when `stream` is true. Streaming responses settle before the
+        first item is produced since headers go out with the first chunk.
+
+            @app.route("/weather/batch", methods=["POST"])
+            @gate.batch(max_items=1000, stream=True)
+            def weather_batch(city):
+                return {"city": city, "weather": "sunny"}
+        """
+        def decorator(item_fn):
+            def run(index, item, args, kwargs):
+                try:
+                    return {"index": index, "result": item_fn(item, *args, **kwargs)}
+                except Exception as exc:
+                    return {"index": index, "error": str(exc)}
+
+            def respond(items, args, kwargs):
+                if stream:
+                    def lines():
+                        for index, item in enumerate(items):
+                            yield json.dumps(run(index, item, args, kwargs), separators=(",", ":")) + "\n"
+                    return Response(stream_with_context(lines()), mimetype="application/x-ndjson")
+                return jsonify({"results": [run(i, item, args, kwargs) for i, item in enumerate(items)]})
+
+            @wraps(item_fn)
+            def wrapper(*args, **kwargs):
+                body = request.get_json(silent=True) or {}
+                items = body.get("items") if isinstance(body, dict) else None
+                if not isinstance(items, list) or not items:
+                    return make_response(jsonify({"error": "body must be {\"items\": [...]}"}), 400)
+                if len(items) > max_items:
+                    return make_response(jsonify({"error": f"at most {max_items} items per batch"}), 400)
+
+                req_json = self._requirements(self.max_amount * len(items))
+                return self._paid(req_json, lambda payload: respond(items, args, kwargs),
+                                  settle_first=stream)
+            return wrapper
+        return decorator
@@ -0,0 +1,243 @@
+import json
+from typing import Dict, Iterable, Optional
+from wsgiref.util import request_uri
+from web3 import Web3
+
+from . import tracing
+from .codec import PaymentContext, encode_header
+from .facilitator import FacilitatorClient
+
+class PriceRule:
+    """One priced route: its pattern, allowed methods and shared requirement template."""
+
+    __slots__ = ("pattern", "methods", "requirements", "facilitator")
+
+    def __init__(self, pattern, methods, requirements, facilitator):
+        self.pattern      = pattern
+        self.methods      = methods
+        self.requirements = requirements      # shared, never mutated
+        self.facilitator  = facilitator
+
+    def accepts(self, method: str) -> bool:
+        return self.methods is None or method in self.methods
+
+class _Node:
+    __slots__ = ("children", "param", "rules", "prefix_rules")
+
+    def __init__(self):
+        self.children = {}
+        self.param = None          # child matching any single segment
+        self.rules = []            # rules ending exactly here
+        self.prefix_rules = []     # rules for "<here>/*"
+
+def _segments(path: str):
+    return [seg for seg in path.split("/") if seg]
+
+def _normalize(path: str) -> str:
+    return "/" + "/".join(_segments(path))
+
+class RouteTable:
+    """
+    Compiled map of path patterns to x402 prices.
+
+    Patterns are static (``/weather``), single-segment parameters
+    (``/weather/<city>`` or ``/weather/{city}``) or prefixes (``/data/*``).
+    Static paths resolve with one dict lookup; the rest walk a segment trie.
+    Precedence is static, then parameter, then the longest matching prefix.
+
+    Route-level settings default to the ones given here. Requirement
+    templates and facilitator clients are interned, so routes with the same
+    price/asset share one object.
+    """
+
+    def __init__(self, *, pay_to, network, asset_address, asset_name,
+                 asset_version, facilitator_url, max_timeout_seconds=60):
+        self.defaults = {
+            "pay_to": pay_to,
+            "network": network,
+            "asset_address": asset_address,
+            "asset_name": asset_name,
+            "asset_version": asset_version,
+            "facilitator_url": facilitator_url,
+        }
+        self.max_timeout_seconds = max_timeout_seconds
+        self._static: Dict[str, list] = {}
+        self._root = _Node()
+        self._templates: Dict[tuple, dict] = {}
+        self._facilitators: Dict[str, FacilitatorClient] = {}
+
+    def _template(self, amount, opts) -> dict:
+        key = (
+            opts["network"],
+            Web3.to_checksum_address(opts["asset_address"]),
+            Web3.to_checksum_address(opts["pay_to"]),
+            int(amount),
+            opts["asset_name"],
+            opts["asset_version"],
+        )
+        tpl = self._templates.get(key)
+        if tpl is None:
+            network, asset, pay_to, amount, name, version = key
+            tpl = self._templates[key] = {
+                "scheme": "exact",
+                "network": network,
+                "maxAmountRequired": str(amount),
+                "resource": "",
+                "description": "",
+                "mimeType": "",
+                "payTo": pay_to,
+                "maxTimeoutSeconds": self.max_timeout_seconds,
+                "asset": asset,
+                "extra": {"name": name, "version": version},
+            }
+        return tpl
+
+    def _facilitator(self, url: str) -> FacilitatorClient:
+        client = self._facilitators.get(url)
+        if client is None:
+            client = self._facilitators[url] = FacilitatorClient(url)
+        return client
+
+    def add(self, pattern: str, amount: int, *, methods: Optional[Iterable[str]] = None,
+            **overrides) -> PriceRule:
+        """
+        Price `pattern` at `amount` atomic units.
+
+        :param methods: HTTP methods the price applies to (default: all)
+        :param overrides: Any of pay_to, network, asset_address, asset_name,
+                          asset_version, facilitator_url for this route only
+        """
+        unknown = set(overrides) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"unknown route option(s): {', '.join(sorted(unknown))}")
+        opts = dict(self.defaults, **overrides)
+        rule = PriceRule(
+            pattern,
+            frozenset(m.upper() for m in methods) if methods else None,
+            self._template(amount, opts),
+            self._facilitator(opts["facilitator_url"]),
+        )
+
+        segments = _segments(pattern)
+        is_prefix = bool(segments) and segments[-1] == "*"
+        if is_prefix:
+            segments = segments[:-1]
+        if not is_prefix and not any(_is_param(s) for s in segments):
+            self._static.setdefault(_normalize(pattern), []).append(rule)
+            return rule
+
+        node = self._root
+        for seg in segments:
+            if _is_param(seg):
+                node.param = node.param or _Node()
+                node = node.param
+            else:
+                node = node.children.setdefault(seg, _Node())
+        (node.prefix_rules if is_prefix else node.rules).append(rule)
+        return rule
+
+    def match(self, path: str, method: str = "GET") -> Optional[PriceRule]:
+        """Return the rule pricing `method path`, or None if the route is free."""
+        rule = _pick(self._static.get(_normalize(path)), method)
+        if rule is not None:
+            return rule
+        return self._walk(self._root, _segments(path), 0, method)
+
+    def _walk(self, node, segments, i, method):
+        if i == len(segments):
+            return _pick(node.rules, method) or _pick(node.prefix_rules, method)
+        for child in (node.children.get(segments[i]), node.param):
+            if child is not None:
+                rule = self._walk(child, segments, i + 1, method)
+                if rule is not None:
+                    return rule
+        return _pick(node.prefix_rules, method)
+
+def _is_param(seg: str) -> bool:
+    return (seg[0], seg[-1]) in (("<", ">"), ("{", "}"))
+
+def _pick(rules, method):
+    if rules:
+        for rule in rules:
+            if rule.accepts(method):
+                return rule
+    return None
+
+class X402Middleware:
+    """
+    WSGI middleware enforcing x402 payment for every route in a `RouteTable`.
+
+    Unpriced routes pass straight through, as do ``OPTIONS`` requests (CORS
+    preflights carry no payment and must not be billed). For priced ones the
+    payment is verified before the app runs and settled after it returns a
+    non-error response; the response is buffered so a failed settlement can
+    still be turned into a 402.
+
+        app.wsgi_app = X402Middleware(app.wsgi_app, routes)
+    """
+
+    def __init__(self, app, routes: RouteTable):
+        self.app    = app
+        self.routes = routes
+
+    @staticmethod
+    def _payment_required(start_response, req_json: dict, error: str):
+        body = json.dumps({"x402Version": 1, "error": error, "accepts": [req_json]}).encode()
+        start_response("402 Payment Required", [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+        ])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        method = environ.get("REQUEST_METHOD", "GET")
+        rule = None if method == "OPTIONS" else self.routes.match(environ.get("PATH_INFO") or "/", method)
+        if rule is None:
+            return self.app(environ, start_response)
+
+        parent = tracing.parse_traceparent(environ.get("HTTP_TRACEPARENT"))
+        with tracing.span("x402.middleware", parent=parent, path=environ.get("PATH_INFO")):
+            return self._paid(rule, environ, start_response)
+
+    def _paid(self, rule, environ, start_response):
+        req_json = dict(rule.requirements, resource=request_uri(environ, include_query=False))
+
+        pay_header = environ.get("HTTP_X_PAYMENT")
+        if not pay_header:
+            return self._payment_required(start_response, req_json, "X-PAYMENT header is required")
+
+        try:
+            with tracing.span("x402.decode"):
+                payment = PaymentContext.from_header(pay_header)
+            with tracing.span("x402.verify"):
+                rule.facilitator.verify(payment, req_json)
+        except Exception as exc:
+            return self._payment_required(start_response, req_json, f"verification failed: {exc}")
+
+        captured, written = {}, []
+        def capture(status, headers, exc_info=None):
+            captured["status"], captured["headers"] = status, list(headers)
+            return written.append
+
+        with tracing.span("x402.view"):
+            result = self.app(environ, capture)
+            try:
+                chunks = list(result)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        body = b"".join(written + chunks)
+
+        status, headers = captured["status"], captured["headers"]
+        if int(status.split(" ", 1)[0]) < 400:
+            try:
+                with tracing.span("x402.settle"):
+                    settle_json = rule.facilitator.settle(payment, req_json)
+                if settle_json.get("success") is False:
+                    raise ValueError(settle_json.get("errorReason") or "settlement rejected")
+                headers.append(("X-PAYMENT-RESPONSE", encode_header(settle_json)))
+            except Exception as exc:
+                return self._payment_required(start_response, req_json, f"settlement failed: {exc}")
+
+        start_response(status, headers)
+        return [body]
@@ -0,0 +1,117 @@
+import time
+import atexit
+import secrets
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+class CreditLedger:
+    """
+    Prepaid credit balances for X402Gate sessions.
+
+    Balances live in a dict so spending a credit is a single hash-map update;
+    SQLite is the durable copy. New sessions are written through immediately,
+    spends are flushed in batches (every `flush_every` spends, on `flush()`
+    and at interpreter exit).
+    """
+
+    def __init__(self, db_path: str = ":memory:", flush_every: int = 100):
+        """
+        :param db_path: SQLite file backing the ledger (":memory:" = process-local only).
+        :param flush_every: Number of spends buffered before balances are written back.
+        """
+        self.flush_every = max(1, int(flush_every))
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                payer      TEXT,
+                credits    INTEGER NOT NULL,
+                expires_at INTEGER NOT NULL
+            )
+        """)
+        self._con.commit()
+
+        # session_id -> [credits, expires_at]
+        self._sessions: Dict[str, List[int]] = {}
+        self._dirty = set()
+        self._pending = 0
+        self._next_sweep = 0.0
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        now = int(time.time())
+        rows = self._con.execute(
+            "SELECT session_id, credits, expires_at FROM sessions WHERE expires_at > ? AND credits > 0",
+            (now,),
+        ).fetchall()
+        for sid, credits, expires_at in rows:
+            self._sessions[sid] = [credits, expires_at]
+
+    def issue(self, credits: int, ttl: int, payer: Optional[str] = None) -> str:
+        """
+        Open a new session holding `credits` and return its id.
+        """
+        sid = secrets.token_hex(16)
+        expires_at = int(time.time()) + int(ttl)
+        with self._lock:
+            if time.time() >= self._next_sweep:
+                self._flush_locked()
+            self._sessions[sid] = [int(credits), expires_at]
+            self._con.execute(
+                "INSERT INTO sessions (session_id, payer, credits, expires_at) VALUES (?, ?, ?, ?)",
+                (sid, payer, int(credits), expires_at),
+            )
+            self._con.commit()
+        return sid
+
+    def spend(self, session_id: str, amount: int = 1) -> int:
+        """
+        Deduct `amount` credits and return the remaining balance.
+
+        :raises ValueError: if the session is unknown, expired or has too few credits left
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                raise ValueError("unknown_session")
+            if entry[1] <= time.time():
+                raise ValueError("session_expired")
+            if entry[0] < amount:
+                raise ValueError("session_exhausted")
+            entry[0] -= amount
+            self._dirty.add(session_id)
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush_locked()
+            return entry[0]
+
+    def balance(self, session_id: str) -> int:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry[0] if entry and entry[1] > time.time() else 0
+
+    def flush(self):
+        """Write buffered balances back to SQLite and drop spent or expired sessions from memory."""
+        with self._lock:
+            self._flush_locked()
+
+    # how often issuing a session also sweeps expired ones out of memory
+    SWEEP_SECS = 60
+
+    def _flush_locked(self):
+        now = time.time()
+        if self._dirty:
+            self._con.executemany(
+                "UPDATE sessions SET credits = ? WHERE session_id = ?",
+                [(self._sessions[sid][0], sid) for sid in self._dirty],
+            )
+            self._con.commit()
+            self._dirty.clear()
+        # the SQLite rows stay; expired and spent sessions are no longer needed in memory
+        for sid in [sid for sid, entry in self._sessions.items() if entry[0] <= 0 or entry[1] <= now]:
+            del self._sessions[sid]
+        self._pending = 0
+        self._next_sweep = now + self.SWEEP_SECS
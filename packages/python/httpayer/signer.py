@@ -0,0 +1,244 @@
+import time
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from eth_account import Account
+from web3 import Web3
+
+from .cache import LRUCache
+from .codec import encode_header
+
+# x402 network id -> EIP-155 chain id
+CHAIN_IDS: Dict[str, int] = {
+    "base": 8453,
+    "base-sepolia": 84532,
+    "avalanche": 43114,
+    "avalanche-fuji": 43113,
+    "ethereum": 1,
+    "sepolia": 11155111,
+    "polygon": 137,
+    "polygon-amoy": 80002,
+}
+
+TRANSFER_WITH_AUTHORIZATION_TYPES = {
+    "TransferWithAuthorization": [
+        {"name": "from", "type": "address"},
+        {"name": "to", "type": "address"},
+        {"name": "value", "type": "uint256"},
+        {"name": "validAfter", "type": "uint256"},
+        {"name": "validBefore", "type": "uint256"},
+        {"name": "nonce", "type": "bytes32"},
+    ]
+}
+
+def make_authorization(from_addr: str, to_addr: str, value: str, valid_secs: int = 60) -> dict:
+    """Build EIP-3009 authorization object."""
+    now = int(time.time())
+    return {
+        "from": from_addr,
+        "to": to_addr,
+        "value": str(value),
+        "validAfter": str(now - 5),            # tolerate small clock skew
+        "validBefore": str(now + valid_secs),
+        "nonce": "0x" + secrets.token_bytes(32).hex(),
+    }
+
+def encode_payment_header(payload: dict) -> str:
+    """Compact-JSON + base64 encode an x402 payment payload for X-PAYMENT."""
+    return encode_header(payload)
+
+class LocalSigner:
+    """
+    Signs x402 `exact` (EIP-3009 TransferWithAuthorization) payments locally,
+    so a client can attach X-PAYMENT itself instead of going through the router.
+    """
+
+    def __init__(self, private_key: str, *, max_value: Optional[int] = None,
+                 valid_secs: int = 60, chain_ids: Optional[Dict[str, int]] = None):
+        """
+        :param private_key: Hex private key of the paying account.
+        :param max_value: Refuse to sign any single payment above this many atomic units.
+        :param valid_secs: Lifetime of each authorization.
+        :param chain_ids: Extra/overriding network id -> chain id mappings.
+        """
+        self.account    = Account.from_key(private_key)
+        self.address    = self.account.address
+        self.max_value  = max_value
+        self.valid_secs = valid_secs
+        self.chain_ids  = dict(CHAIN_IDS, **(chain_ids or {}))
+        self._domains: Dict[tuple, dict] = {}
+
+    def select(self, accepts: list) -> dict:
+        """Pick the first `exact` requirement on a network this signer knows."""
+        for req in accepts or []:
+            if req.get("scheme") == "exact" and req.get("network") in self.chain_ids:
+                return req
+        raise ValueError("no supported 'exact' payment requirement in 402 response")
+
+    def domain(self, req: dict) -> dict:
+        key = (req["extra"]["name"], req["extra"]["version"], req["network"], req["asset"])
+        domain = self._domains.get(key)
+        if domain is None:
+            domain = self._domains[key] = {
+                "name": key[0],
+                "version": key[1],
+                "chainId": self.chain_ids[key[2]],
+                "verifyingContract": Web3.to_checksum_address(key[3]),
+            }
+        return domain
+
+    def _check_value(self, req: dict) -> int:
+        value = int(req["maxAmountRequired"])
+        if self.max_value is not None and value > self.max_value:
+            raise ValueError(f"Required {value} exceeds max_value {self.max_value}")
+        return value
+
+    def sign(self, req: dict) -> dict:
+        """Return the x402 payment payload authorizing `req`."""
+        value = self._check_value(req)
+        auth = make_authorization(self.address, Web3.to_checksum_address(req["payTo"]),
+                                  str(value), self.valid_secs)
+        message = dict(auth, value=value, validAfter=int(auth["validAfter"]),
+                       validBefore=int(auth["validBefore"]))
+        signed = Account.sign_typed_data(
+            self.account.key,
+            domain_data=self.domain(req),
+            message_types=TRANSFER_WITH_AUTHORIZATION_TYPES,
+            message_data=message,
+        )
+        sig = signed.signature.hex()
+        return {
+            "x402Version": 1,
+            "scheme": "exact",
+            "network": req["network"],
+            "payload": {
+                "signature": sig if sig.startswith("0x") else "0x" + sig,
+                "authorization": auth,
+            },
+        }
+
+    def payment_header(self, req: dict) -> str:
+        """Signed X-PAYMENT header value for `req`."""
+        return encode_payment_header(self.sign(req))
+
+class PresignedSigner(LocalSigner):
+    """
+    `LocalSigner` that keeps a few authorizations signed ahead of time for
+    each hot (network, asset, payTo, amount) combination.
+
+    Each pooled authorization has its own random nonce and is handed out at
+    most once. After a combination is first paid, its pool is topped up on a
+    background thread, which also re-signs entries shortly before they
+    expire (a rolling validity window). Later 402s are then answered without
+    signing on the request path, even after a pause. Combinations not paid
+    for `idle_secs` stop being refreshed.
+    """
+
+    def __init__(self, private_key: str, *, pool_size: int = 4, min_validity: int = 15,
+                 max_targets: int = 32, idle_secs: float = 300,
+                 refresh_secs: Optional[float] = None, **kwargs):
+        """
+        :param pool_size: Pre-signed authorizations kept per combination.
+        :param min_validity: Seconds of validity left below which a pooled
+                             authorization is discarded instead of used.
+        :param max_targets: Combinations kept warm; the least recently paid is dropped.
+        :param idle_secs: Combinations unpaid for this long are no longer re-signed.
+        :param refresh_secs: Seconds between background re-signing passes
+                             (default: a third of the usable validity).
+        :param kwargs: Passed to `LocalSigner` (max_value, valid_secs, chain_ids).
+        """
+        super().__init__(private_key, **kwargs)
+        if min_validity >= self.valid_secs:
+            raise ValueError("min_validity must be shorter than valid_secs")
+        self.pool_size    = pool_size
+        self.min_validity = min_validity
+        self.refresh_secs = refresh_secs or max(1.0, (self.valid_secs - min_validity) / 3)
+        self._pools       = LRUCache(maxsize=max_targets)
+        # target -> requirement, for combinations paid within idle_secs
+        self._active      = LRUCache(maxsize=max_targets, ttl=idle_secs)
+        self._lock        = threading.Lock()
+        self._refilling   = set()
+        self._executor    = ThreadPoolExecutor(max_workers=1, thread_name_prefix="x402-presign")
+        self._stop        = threading.Event()
+        threading.Thread(target=self._run, name="x402-presign-refresh", daemon=True).start()
+
+    @staticmethod
+    def _target(req: dict) -> tuple:
+        return (req["network"], req["asset"].lower(), req["payTo"].lower(),
+                str(req["maxAmountRequired"]), req["extra"]["name"], req["extra"]["version"])
+
+    def _take(self, target: tuple) -> Optional[dict]:
+        pool = self._pools.get(target)
+        if not pool:
+            return None
+        cutoff = time.time() + self.min_validity
+        with self._lock:
+            while pool:
+                payload = pool.popleft()
+                if int(payload["payload"]["authorization"]["validBefore"]) > cutoff:
+                    return payload
+        return None
+
+    def _refill(self, target: tuple, req: dict, horizon: float = 0.0):
+        """Drop entries expiring within `horizon` seconds of becoming unusable and top the pool up."""
+        try:
+            pool = self._pools.get(target)
+            if pool is None:
+                pool = deque()
+                self._pools.set(target, pool)
+            cutoff = time.time() + self.min_validity + horizon
+            with self._lock:
+                while pool and int(pool[0]["payload"]["authorization"]["validBefore"]) <= cutoff:
+                    pool.popleft()
+                missing = self.pool_size - len(pool)
+            for _ in range(missing):
+                payload = LocalSigner.sign(self, req)
+                with self._lock:
+                    pool.append(payload)
+        finally:
+            with self._lock:
+                self._refilling.discard(target)
+
+    def _schedule(self, target: tuple, req: dict, horizon: float = 0.0):
+        with self._lock:
+            if target in self._refilling:
+                return
+            self._refilling.add(target)
+        self._executor.submit(self._refill, target, dict(req), horizon)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_secs):
+            active = {target: req for target, req, _ in self._active.items()}
+            for target, _, _ in self._pools.items():
+                if target not in active:
+                    self._pools.pop(target)
+            for target, req in active.items():
+                # replace entries that would expire before the next pass
+                self._schedule(target, req, self.refresh_secs)
+
+    def warm(self, req: dict):
+        """Fill the pool for `req` now, e.g. at startup for known prices."""
+        self._check_value(req)
+        target = self._target(req)
+        self._active.set(target, dict(req))
+        with self._lock:
+            self._refilling.add(target)
+        self._refill(target, req)
+
+    def sign(self, req: dict) -> dict:
+        """Return a pooled authorization for `req`, signing one inline only if none is ready."""
+        self._check_value(req)
+        target = self._target(req)
+        payload = self._take(target)
+        if payload is None:
+            payload = LocalSigner.sign(self, req)
+        self._active.set(target, dict(req))
+        self._schedule(target, req)
+        return payload
+
+    def close(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
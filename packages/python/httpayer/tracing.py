@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import random
+import logging
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+import requests
+
+TRACEPARENT = "traceparent"
+
+class SpanContext:
+    """W3C trace context carried between services in the ``traceparent`` header."""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id  = span_id
+        self.sampled  = sampled
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parse a ``traceparent`` header; returns None if it is absent or malformed."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+class Span:
+    __slots__ = ("name", "context", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str], attributes: dict):
+        self.name       = name
+        self.context    = context
+        self.parent_id  = parent_id
+        self.start_ns   = time.time_ns()
+        self.end_ns     = None
+        self.attributes = attributes
+        self.error      = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_id,
+            "start": self.start_ns,
+            "end": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+_current: contextvars.ContextVar = contextvars.ContextVar("httpayer_span", default=None)
+
+def current() -> Optional[SpanContext]:
+    """Context of the active span in this thread/task, if any."""
+    return _current.get()
+
+def inject(headers: Optional[dict] = None) -> dict:
+    """Return `headers` (or a new dict) with the active span's ``traceparent`` added."""
+    headers = {} if headers is None else headers
+    ctx = _current.get()
+    if ctx is not None:
+        headers[TRACEPARENT] = ctx.traceparent
+    return headers
+
+def extract(headers) -> Optional[SpanContext]:
+    """Trace context sent by the caller, from an incoming request's headers."""
+    return parse_traceparent(headers.get(TRACEPARENT)) if headers is not None else None
+
+class JsonFileExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path  = os.path.expanduser(path)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    def export(self, span: Span, service: str):
+        line = json.dumps(dict(span.to_dict(), service=service), separators=(",", ":"))
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+class OTLPHttpExporter:
+    """
+    Sends spans to an OTLP/HTTP collector (``/v1/traces``, JSON encoding).
+
+    Spans are queued and posted in batches from a background thread, so
+    exporting never blocks the request path. When the collector falls
+    behind, spans beyond `max_queue` are dropped.
+    """
+
+    def __init__(self, endpoint: str, *, batch_size: int = 256, interval: float = 2.0,
+                 max_queue: int = 10_000, timeout: float = 5):
+        endpoint        = endpoint.rstrip("/")
+        self.endpoint   = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self.batch_size = batch_size
+        self.interval   = interval
+        self.max_queue  = max_queue
+        self.timeout    = timeout
+        self._http      = requests.Session()
+        self._queue     = []
+        self._lock      = threading.Lock()
+        self._wake      = threading.Event()
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+
+    def export(self, span: Span, service: str):
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                return
+            self._queue.append((service, span))
+            if len(self._queue) >= self.batch_size:
+                self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._queue = self._queue, []
+        if not batch:
+            return
+        by_service = {}
+        for service, span in batch:
+            by_service.setdefault(service, []).append(_otlp_span(span))
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attr("service.name", service)]},
+            "scopeSpans": [{"scope": {"name": "httpayer"}, "spans": spans}],
+        } for service, spans in by_service.items()]}
+        try:
+            self._http.post(self.endpoint, json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.getLogger(__name__).debug(f"trace export failed: {e}")
+
+def _otlp_attr(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def _otlp_span(span: Span) -> dict:
+    out = {
+        "traceId": span.context.trace_id,
+        "spanId": span.context.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_otlp_attr(k, v) for k, v in span.attributes.items() if v is not None],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        out["parentSpanId"] = span.parent_id
+    return out
+
+class Tracer:
+    """
+    Creates spans and hands finished, sampled ones to an exporter.
+
+    The sampling decision is made once at the root of a trace and travels
+    with the ``traceparent`` flag, so every service keeps or drops the same
+    traces. Without an exporter spans are still created (for propagation and
+    `log_event`) but never recorded.
+    """
+
+    def __init__(self, service: str = "httpayer", exporter=None, sample_rate: float = 1.0):
+        """
+        :param service: Name reported for spans from this process.
+        :param exporter: `JsonFileExporter`, `OTLPHttpExporter` or anything with ``export(span, service)``.
+        :param sample_rate: Fraction of new traces recorded (0..1).
+        """
+        self.service     = service
+        self.exporter    = exporter
+        self.sample_rate = sample_rate
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, **attributes):
+        """
+        Run the block inside a new span, a child of `parent` or else of the
+        active span. Exceptions are recorded on the span and re-raised.
+        """
+        parent = parent or _current.get()
+        if parent is not None:
+            ctx = SpanContext(parent.trace_id, secrets.token_hex(8), parent.sampled)
+        else:
+            ctx = SpanContext(secrets.token_hex(16), secrets.token_hex(8),
+                              random.random() < self.sample_rate)
+        span = Span(name, ctx, parent.span_id if parent else None, attributes)
+        token = _current.set(ctx)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            if ctx.sampled and self.exporter is not None:
+                self.exporter.export(span, self.service)
+
+_tracer: Optional[Tracer] = None
+
+def configure(service: str = "httpayer", exporter=None, sample_rate: float = 1.0) -> Tracer:
+    """Install the process-wide tracer used by the clients, gate and proxy."""
+    global _tracer
+    _tracer = Tracer(service, exporter, sample_rate)
+    return _tracer
+
+def get_tracer() -> Tracer:
+    """
+    The process-wide tracer, configured from the environment on first use:
+    ``OTEL_EXPORTER_OTLP_ENDPOINT`` or ``HTTPAYER_TRACE_FILE`` choose the
+    exporter, ``HTTPAYER_TRACE_SAMPLE`` the sample rate and
+    ``HTTPAYER_SERVICE_NAME`` the service name.
+    """
+    global _tracer
+    if _tracer is None:
+        exporter = None
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            exporter = OTLPHttpExporter(os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"])
+        elif os.getenv("HTTPAYER_TRACE_FILE"):
+            exporter = JsonFileExporter(os.environ["HTTPAYER_TRACE_FILE"])
+        _tracer = Tracer(os.getenv("HTTPAYER_SERVICE_NAME", "httpayer"), exporter,
+                         float(os.getenv("HTTPAYER_TRACE_SAMPLE", 1.0)))
+    return _tracer
+
+def span(name: str, parent: Optional[SpanContext] = None, **attributes):
+    """Shortcut for ``get_tracer().span(...)``."""
+    return get_tracer().span(name, parent, **attributes)
+
+LOG_SAMPLE_RATE = float(os.getenv("HTTPAYER_LOG_SAMPLE", 0.01))
+
+def log_event(logger: logging.Logger, event: str, **fields):
+    """
+    Log one compact JSON line for `event`, for a sample of traces only.
+
+    Traces are sampled by trace id (``HTTPAYER_LOG_SAMPLE``, default 1%), so
+    either every event of a request is logged or none is.
+    """
+    ctx = _current.get()
+    if ctx is not None:
+        keep = int(ctx.trace_id[-8:], 16) < LOG_SAMPLE_RATE * 0xFFFFFFFF
+    else:
+        keep = random.random() < LOG_SAMPLE_RATE
+    if keep and logger.isEnabledFor(logging.INFO):
+        record = {"event": event, "traceId": ctx.trace_id if ctx else None}
+        record.update(fields)
+        logger.info(json.dumps(record, separators=(",", ":"), default=str))
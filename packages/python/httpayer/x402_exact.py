@@ -1,38 +1,110 @@
-from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from collections import namedtuple
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Dict, Any, Optional, Union
 from datetime import datetime, timezone
 
-from eth_utils import to_checksum_address, keccak, to_bytes
+from eth_keys import keys
+from eth_utils import to_checksum_address, keccak, to_bytes, to_int
 from web3 import Web3
 from web3.contract import Contract
 
+from .codec import dumps, loads
+
 # ─────────────────────────────────────────────────────────────
-# 1.  Dataclasses / types
+# 1.  Models / types
 # ─────────────────────────────────────────────────────────────
-@dataclass
-class PaymentRequirements:
-    scheme:              str
-    network:             str
-    maxAmountRequired:   int          # (atomic units)
-    resource:            str
-    payTo:               str
-    asset:               str          # token contract
-    maxTimeoutSeconds:   int
-    extra:               Dict[str, str]   # { name, version }
-
-@dataclass
-class VerifyResponse:
-    isValid:        bool
-    invalidReason:  Optional[str]
-    payer:          str               # from-address (checksummed)
-
-@dataclass
-class SettleResponse:
-    success:        bool
-    transaction:    str               # tx hash hex
-    network:        str
-    payer:          str
-    errorReason:    Optional[str] = None
+@lru_cache(maxsize=4096)
+def checksum(address: str) -> str:
+    """EIP-55 checksum `address`, memoized (the same few addresses recur on every request)."""
+    return to_checksum_address(address)
+
+class FrozenMap(Mapping):
+    """Read-only, hashable mapping (used for ``extra``)."""
+
+    __slots__ = ("_data", "_hash")
+
+    def __init__(self, data=()):
+        self._data = dict(data)
+        self._hash = None
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self._data.items()))
+        return self._hash
+
+    def __repr__(self):
+        return f"FrozenMap({self._data!r})"
+
+class PaymentRequirements(namedtuple("PaymentRequirements", (
+        "scheme", "network", "maxAmountRequired", "resource", "payTo", "asset",
+        "maxTimeoutSeconds", "extra", "description", "mimeType"))):
+    """
+    One x402 payment requirement. Immutable, slotted and hashable, so it can
+    be used as a cache key; addresses are checksummed and the amount is an int.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, scheme: str, network: str, maxAmountRequired: int, resource: str,
+                payTo: str, asset: str, maxTimeoutSeconds: int = 60,
+                extra: Optional[Dict[str, str]] = None, description: str = "", mimeType: str = ""):
+        return super().__new__(
+            cls, scheme, network, int(maxAmountRequired), resource,
+            checksum(payTo), checksum(asset), int(maxTimeoutSeconds),
+            extra if isinstance(extra, FrozenMap) else FrozenMap(extra or {}),
+            description or "", mimeType or "",
+        )
+
+    @classmethod
+    def from_json(cls, data: Union[dict, str, bytes]) -> "PaymentRequirements":
+        """Build from the wire form (a dict or raw JSON of ``paymentRequirements``)."""
+        if not isinstance(data, dict):
+            data = loads(data)
+        return cls(data["scheme"], data["network"], data["maxAmountRequired"],
+                   data.get("resource", ""), data["payTo"], data["asset"],
+                   data.get("maxTimeoutSeconds", 60), data.get("extra"),
+                   data.get("description", ""), data.get("mimeType", ""))
+
+    def to_dict(self) -> dict:
+        d = self._asdict()
+        d["maxAmountRequired"] = str(self.maxAmountRequired)
+        d["extra"] = dict(self.extra)
+        return dict(d)
+
+    def to_json(self) -> bytes:
+        return dumps(self.to_dict())
+
+class VerifyResponse(namedtuple("VerifyResponse", ("isValid", "invalidReason", "payer"))):
+    __slots__ = ()
+    # payer: from-address (checksummed)
+
+    def to_dict(self) -> dict:
+        return dict(self._asdict())
+
+    def to_json(self) -> bytes:
+        return dumps(self.to_dict())
+
+class SettleResponse(namedtuple("SettleResponse",
+                                ("success", "transaction", "network", "payer", "errorReason"),
+                                defaults=(None,))):
+    __slots__ = ()
+    # transaction: tx hash hex
+
+    def to_dict(self) -> dict:
+        return dict(self._asdict())
+
+    def to_json(self) -> bytes:
+        return dumps(self.to_dict())
 
 # ─────────────────────────────────────────────────────────────
 # 2.  Helpers – EIP-712 + signature
@@ -98,13 +170,15 @@ def verify_exact(
 ) -> VerifyResponse:
     auth = payment_payload["authorization"]
     sig  = payment_payload["signature"]
-    payer_addr = to_checksum_address(auth["from"])
+    payer_addr = checksum(auth["from"])
     now = int(datetime.now(tz=timezone.utc).timestamp())
 
     if int(auth["value"]) > req.maxAmountRequired:
         return VerifyResponse(False, "amount_too_high", payer_addr)
+    if int(auth["value"]) < req.maxAmountRequired:
+        return VerifyResponse(False, "insufficient_amount", payer_addr)
 
-    if to_checksum_address(req.payTo) != to_checksum_address(auth["to"]):
+    if req.payTo != checksum(auth["to"]):
         return VerifyResponse(False, "wrong_payee", payer_addr)
 
     if now < int(auth["validAfter"]):
@@ -124,14 +198,16 @@ def verify_exact(
     sig_obj = sig if isinstance(sig, dict) else _split_sig(sig)
 
     try:
-        signer = w3.eth.account.recover_hash(
-            hexstr=digest.hex(),
-            vrs=(sig_obj["v"], sig_obj["r"], sig_obj["s"]),
-        )
+        v = int(sig_obj["v"])
+        r, s = (x if isinstance(x, int) else to_int(hexstr=x) for x in (sig_obj["r"], sig_obj["s"]))
+        # eth_keys wants the recovery id (0/1); accept v as 27/28 or 0/1 like _split_sig
+        signer = (keys.Signature(vrs=(v - 27 if v >= 27 else v, r, s))
+                  .recover_public_key_from_msg_hash(digest)
+                  .to_checksum_address())
     except Exception as exc:
         return VerifyResponse(False, f"bad_signature:{exc}", payer_addr)
 
-    if to_checksum_address(signer) != payer_addr:
+    if checksum(signer) != payer_addr:
         return VerifyResponse(False, "signer_mismatch", signer)
 
     return VerifyResponse(True, None, payer_addr)
@@ -167,7 +243,7 @@ def settle_exact(
     auth = payment_payload["authorization"]
     sig  = payment_payload["signature"]
     sig_obj = sig if isinstance(sig, dict) else _split_sig(sig)
-    payer_addr = to_checksum_address(auth["from"])
+    payer_addr = checksum(auth["from"])
 
     try:
         token: Contract = w3.eth.contract(address=req.asset, abi=ERC20_AUTH_ABI)
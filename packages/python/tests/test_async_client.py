@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+
+from httpayer.async_client import AsyncHTTPayerClient, BudgetExceeded, SpendBudget
+
+ROUTER = "http://router/pay"
+ACCEPTS = [{"scheme": "exact", "network": "base-sepolia", "maxAmountRequired": "100"}]
+
+class FakeUpstream:
+    """Paywalled API plus router: every API URL answers 402, the router pays after `delay`."""
+
+    def __init__(self, delay=0.0, router_status=200):
+        self.delay, self.router_status = delay, router_status
+        self.paid, self.in_flight, self.max_in_flight = [], 0, 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) != ROUTER:
+            return httpx.Response(402, json={"accepts": ACCEPTS})
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.router_status == 200:
+            self.paid.append(request.url)
+        return httpx.Response(self.router_status, json={"ok": True})
+
+def make_client(upstream):
+    return AsyncHTTPayerClient(ROUTER, "key", retries=0,
+                               client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)))
+
+def test_spend_budget_reserve_and_refund():
+    async def run():
+        budget = SpendBudget(250)
+        await budget.reserve(100)
+        await budget.reserve(100)
+        with pytest.raises(BudgetExceeded):
+            await budget.reserve(100)
+        await budget.refund(100)
+        assert budget.remaining == 150
+    asyncio.run(run())
+
+def test_gather_caps_concurrency_and_spend():
+    upstream = FakeUpstream(delay=0.01)
+
+    async def run():
+        async with make_client(upstream) as client:
+            return await client.gather([f"http://api/{i}" for i in range(5)],
+                                       concurrency=2, budget=300)
+
+    results = asyncio.run(run())
+    assert [r.status_code for r in results[:3]] == [200, 200, 200]
+    assert all(isinstance(r, BudgetExceeded) for r in results[3:])
+    assert len(upstream.paid) == 3
+    assert upstream.max_in_flight <= 2
+
+def test_budget_exceeded_keeps_cached_requirements():
+    async def run():
+        async with make_client(FakeUpstream()) as client:
+            await client.request("GET", "http://api/a")
+            with pytest.raises(BudgetExceeded):
+                await client.request("GET", "http://api/a", budget=SpendBudget(50))
+            return client.requirements.get("GET", "http://api/a")
+
+    assert asyncio.run(run()) == ACCEPTS
+
+def test_failed_payment_refunds_and_forgets_requirements():
+    async def run():
+        async with make_client(FakeUpstream(router_status=500)) as client:
+            client.requirements.put("GET", "http://api/a", ACCEPTS)
+            budget = SpendBudget(100)
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.request("GET", "http://api/a", budget=budget)
+            return budget.spent, client.requirements.get("GET", "http://api/a")
+
+    assert asyncio.run(run()) == (0, None)
+
+def test_cancelled_payment_keeps_reservation_and_requirements():
+    async def run():
+        async with make_client(FakeUpstream(delay=5)) as client:
+            client.requirements.put("GET", "http://api/a", ACCEPTS)
+            budget = SpendBudget(100)
+            task = asyncio.create_task(client.request("GET", "http://api/a", budget=budget))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return budget.spent, client.requirements.get("GET", "http://api/a")
+
+    assert asyncio.run(run()) == (100, ACCEPTS)
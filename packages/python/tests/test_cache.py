@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from httpayer.cache import ResponseCache, cache_control_ttl
+
+@pytest.mark.parametrize("header, ttl", [
+    (None, 60),
+    ("public, max-age=30", 30),
+    ('max-age="15"', 15),
+    ("max-age=0", None),
+    ("no-store", None),
+    ("private, no-cache", None),
+    ("max-age=soon", 60),
+])
+def test_cache_control_ttl(header, ttl):
+    headers = {"Cache-Control": header} if header else {}
+    assert cache_control_ttl(headers, 60) == ttl
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "responses.db")
+    ResponseCache(path=path).put("k", 200, {"Content-Type": "text/plain"}, b"body", ttl=60)
+    cache = ResponseCache(path=path)
+    assert cache.get("k") == (200, {"Content-Type": "text/plain"}, b"body")
+    # promoted into the memory tier
+    assert cache._mem.get("k") is not None
+
+def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    path = str(tmp_path / "responses.db")
+    ResponseCache(path=path).put("k", 200, {}, b"body", ttl=10)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    cache = ResponseCache(path=path)
+    assert cache.get("k") is None
+    assert cache._con.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.db"), maxsize=1, max_bytes=10)
+    cache.put("a", 200, {}, b"aaaa")
+    cache.put("b", 200, {}, b"bbbb")
+    time.sleep(0.01)
+    assert cache.get("a") is not None          # from disk; now the most recent
+    cache.put("c", 200, {}, b"cccc")
+    keys = {k for (k,) in cache._con.execute("SELECT key FROM responses")}
+    assert keys == {"a", "c"}
+
+def test_zero_ttl_is_not_stored():
+    cache = ResponseCache()
+    cache.put("k", 200, {}, b"body", ttl=0)
+    assert cache.get("k") is None
@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from httpayer.cache import ResponseCache
+from httpayer.client import HTTPayerClient
+from httpayer.signer import LocalSigner
+
+PRIVATE_KEY = "0x" + "11" * 32
+
+REQ = {
+    "scheme": "exact",
+    "network": "base-sepolia",
+    "maxAmountRequired": "100",
+    "resource": "",
+    "payTo": "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0",
+    "asset": "0x036CbD53842c5426634e7929541eC2318f3dCF7e",
+    "maxTimeoutSeconds": 60,
+    "extra": {"name": "USDC", "version": "2"},
+}
+
+class FakeUpstream:
+    """Paywalled API: 402 without X-PAYMENT; paid calls get `body`, sent in two parts."""
+
+    def __init__(self):
+        self.body, self.headers = [b"first,", b"second"], {}
+        self.release = threading.Event()     # holds back the second part while unset
+        self.release.set()
+        self.calls = []                      # (method, path, paid)
+        self.unavailable = 0                 # calls to answer with 503 first
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.handle_call()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self.handle_call()
+
+            def handle_call(self):
+                paid = "X-PAYMENT" in self.headers
+                upstream.calls.append((self.command, self.path, paid))
+                if upstream.unavailable:
+                    upstream.unavailable -= 1
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if not paid:
+                    out = json.dumps({"error": "payment required", "accepts": [REQ]}).encode()
+                    self.send_response(402)
+                    self.send_header("Content-Length", str(len(out)))
+                    self.end_headers()
+                    self.wfile.write(out)
+                    return
+                self.send_response(200)
+                for name, value in upstream.headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(sum(map(len, upstream.body))))
+                self.end_headers()
+                for part in upstream.body:
+                    self.wfile.write(part)
+                    self.wfile.flush()
+                    upstream.release.wait(5)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+@pytest.fixture
+def upstream():
+    fake = FakeUpstream()
+    yield fake
+    fake.release.set()
+    fake.server.shutdown()
+
+@pytest.fixture
+def client():
+    with HTTPayerClient(signer=LocalSigner(PRIVATE_KEY), retries=0) as client:
+        yield client
+
+def test_paid_stream_is_not_buffered(client, upstream):
+    upstream.release.clear()
+    start = time.monotonic()
+    resp = client.request("GET", upstream.url + "/data", stream=True)
+    assert resp.status_code == 200
+    assert time.monotonic() - start < 2
+    chunks = resp.iter_content(chunk_size=len(b"first,"))
+    assert next(chunks) == b"first,"       # arrives while the rest is still held back
+    upstream.release.set()
+    assert b"".join(chunks) == b"second"
+    assert upstream.calls == [("GET", "/data", False), ("GET", "/data", True)]
+
+def test_iter_content_yields_the_paid_body(client, upstream):
+    assert b"".join(client.iter_content("GET", upstream.url + "/data")) == b"first,second"
+
+def test_session_is_mounted_with_the_retry_policy():
+    client = HTTPayerClient(signer=LocalSigner(PRIVATE_KEY), retries=2, pool_maxsize=7)
+    for url in ("http://api.example", "https://api.example"):
+        adapter = client.session.get_adapter(url)
+        assert adapter._pool_maxsize == 7
+        retry = adapter.max_retries
+        assert retry.total == 2 and 503 in retry.status_forcelist
+        assert "GET" in retry.allowed_methods and "POST" not in retry.allowed_methods
+
+def test_transient_errors_are_retried_for_get_only(upstream):
+    with HTTPayerClient(signer=LocalSigner(PRIVATE_KEY), retries=2, backoff_factor=0) as client:
+        upstream.unavailable = 1
+        assert client.request("GET", upstream.url + "/data").content == b"first,second"
+        assert [c[2] for c in upstream.calls] == [False, False, True]
+
+        upstream.calls.clear()
+        upstream.unavailable = 1
+        assert client.request("POST", upstream.url + "/data", json={}).status_code == 503
+        assert upstream.calls == [("POST", "/data", False)]
+
+@pytest.fixture
+def cached_client():
+    with HTTPayerClient(signer=LocalSigner(PRIVATE_KEY), retries=0,
+                        response_cache=ResponseCache(ttl=60)) as client:
+        yield client
+
+def paid_calls(upstream):
+    return sum(1 for _, _, paid in upstream.calls if paid)
+
+def test_response_cache_reuses_paid_get(cached_client, upstream):
+    first = cached_client.request("GET", upstream.url + "/data", params={"q": 1})
+    second = cached_client.request("GET", upstream.url + "/data", params={"q": 1})
+    assert first.content == second.content == b"first,second"
+    assert second.headers["X-HTTPAYER-CACHE"] == "HIT"
+    assert paid_calls(upstream) == 1
+    cached_client.request("GET", upstream.url + "/data", params={"q": 2})
+    assert paid_calls(upstream) == 2
+
+def test_response_cache_honors_max_age(cached_client, upstream, monkeypatch):
+    upstream.headers = {"Cache-Control": "max-age=5"}
+    cached_client.request("GET", upstream.url + "/data")
+    cached_client.request("GET", upstream.url + "/data")
+    assert paid_calls(upstream) == 1
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 6)
+    cached_client.request("GET", upstream.url + "/data")
+    assert paid_calls(upstream) == 2
+
+def test_response_cache_skips_no_store(cached_client, upstream):
+    upstream.headers = {"Cache-Control": "no-store"}
+    for _ in range(2):
+        assert "X-HTTPAYER-CACHE" not in cached_client.request("GET", upstream.url + "/data").headers
+    assert paid_calls(upstream) == 2
+
+def test_response_cache_bypasses_non_get(cached_client, upstream):
+    for _ in range(2):
+        assert cached_client.request("POST", upstream.url + "/data", json={"a": 1}).status_code == 200
+    assert paid_calls(upstream) == 2
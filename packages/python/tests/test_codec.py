@@ -0,0 +1,62 @@
+import base64
+import importlib.util
+import sys
+
+import pytest
+
+import httpayer.codec
+
+PAYMENT = {"x402Version": 1, "scheme": "exact", "network": "base-sepolia",
+           "payload": {"signature": "0xab", "authorization": {"from": "0x1", "value": "1000"}}}
+
+@pytest.fixture(params=["orjson", "json"])
+def codec(request, monkeypatch):
+    """A private copy of httpayer.codec on each JSON backend."""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setitem(sys.modules, "orjson", None)     # makes `import orjson` fail
+    spec = importlib.util.spec_from_file_location(f"codec_{request.param}", httpayer.codec.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert (module.orjson is not None) == (request.param == "orjson")
+    return module
+
+def test_round_trip_in_both_base64_alphabets(codec):
+    header = codec.encode_header(PAYMENT)
+    assert codec.decode_header(header) == PAYMENT
+    urlsafe = header.replace("+", "-").replace("/", "_").rstrip("=")
+    assert codec.decode_header(urlsafe) == PAYMENT
+    assert codec.decode_header(header.encode()) == PAYMENT
+
+def test_headers_over_the_size_limit_are_rejected(codec):
+    big = dict(PAYMENT, padding="x" * codec.MAX_HEADER_BYTES)
+    header = codec.encode_header(big)
+    assert len(header) > codec.MAX_HEADER_BYTES
+    with pytest.raises(ValueError, match="larger than"):
+        codec.decode_header(header)
+    assert codec.decode_header(header, max_bytes=len(header)) == big
+
+@pytest.mark.parametrize("header", [
+    "not base64!",
+    base64.b64encode(b"{not json").decode(),
+    base64.b64encode(b"[1, 2]").decode(),
+    base64.b64encode(b"\xff\xfe").decode(),
+    "",
+])
+def test_malformed_headers_raise_value_error(codec, header):
+    with pytest.raises(ValueError, match="Invalid X-PAYMENT header"):
+        codec.decode_header(header)
+
+def test_compact_and_sorted_dumps(codec):
+    assert codec.dumps({"b": 1, "a": [1, 2]}) == b'{"b":1,"a":[1,2]}'
+    assert codec.dumps({"b": 1, "a": 2}, sort_keys=True) == b'{"a":2,"b":1}'
+    assert codec.payment_digest(PAYMENT, {"x": 1}) == httpayer.codec.payment_digest(PAYMENT, {"x": 1})
+
+def test_backends_encode_non_ascii_identically(codec):
+    payment = dict(PAYMENT, description="météo · 天気")
+    assert codec.dumps(payment, sort_keys=True) == httpayer.codec.dumps(payment, sort_keys=True)
+    assert "météo".encode() in codec.dumps(payment)
+    assert codec.encode_header(payment) == httpayer.codec.encode_header(payment)
+    assert codec.payment_digest(payment, {}) == httpayer.codec.payment_digest(payment, {})
+    assert codec.decode_header(codec.encode_header(payment)) == payment
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from httpayer.codec import payment_digest
+from httpayer.facilitator import FacilitatorClient
+
+PAY_TO = "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0"
+
+REQS = {
+    "scheme": "exact",
+    "network": "base-sepolia",
+    "payTo": PAY_TO,
+    "maxAmountRequired": "1000",
+}
+
+def payment(**auth):
+    now = int(time.time())
+    authorization = {"from": "0x1", "to": PAY_TO.lower(), "value": "1000",
+                     "validAfter": str(now - 5), "validBefore": str(now + 60), "nonce": "0x01"}
+    authorization.update(auth)
+    return {"x402Version": 1, "scheme": "exact", "network": "base-sepolia",
+            "payload": {"signature": "0xab", "authorization": authorization}}
+
+@pytest.fixture
+def client():
+    client = FacilitatorClient("http://facilitator")
+    client.remote_calls = []
+
+    def verify_remote(payload, reqs):
+        client.remote_calls.append(payload)
+        return (True, {"isValid": True})
+
+    client._verify_remote = verify_remote
+    return client
+
+@pytest.mark.parametrize("change, reason", [
+    ({"to": "0x2"}, "wrong_payee"),
+    ({"value": "0"}, "invalid_amount"),
+    ({"value": "1001"}, "amount_too_high"),
+    ({"value": "1"}, "insufficient_amount"),
+    ({"value": "999"}, "insufficient_amount"),
+    ({"validBefore": str(int(time.time()) - 1)}, "authorization_expired"),
+    ({"validAfter": str(int(time.time()) + 60)}, "not_yet_valid"),
+    ({"value": "ten"}, "invalid_payload"),
+])
+def test_prevalidate_rejects_locally(client, change, reason):
+    with pytest.raises(ValueError, match=reason):
+        client.verify(payment(**change), REQS)
+    assert client.remote_calls == []
+
+def test_prevalidate_checks_scheme_and_network():
+    with pytest.raises(ValueError, match="unsupported_scheme"):
+        FacilitatorClient.prevalidate(dict(payment(), scheme="upto"), REQS)
+    with pytest.raises(ValueError, match="invalid_network"):
+        FacilitatorClient.prevalidate(dict(payment(), network="base"), REQS)
+
+def test_verify_result_is_cached(client):
+    pay = payment()
+    client.verify(pay, REQS)
+    client.verify(pay, REQS)
+    assert len(client.remote_calls) == 1
+    client.verify(payment(nonce="0x02"), REQS)
+    assert len(client.remote_calls) == 2
+
+def test_rejections_are_cached(client):
+    pay = payment(to="0x2")
+    with pytest.raises(ValueError):
+        client.verify(pay, REQS)
+    assert client._verify_cache.get(payment_digest(pay, REQS)) == (False, "wrong_payee")
+
+def test_not_yet_valid_is_not_cached(client):
+    pay = payment(validAfter=str(int(time.time()) + 1))
+    with pytest.raises(ValueError, match="not_yet_valid"):
+        client.verify(pay, REQS)
+    time.sleep(1.1)
+    assert client.verify(pay, REQS) == {"isValid": True}
@@ -0,0 +1,225 @@
+import time
+
+import pytest
+from flask import Flask, request
+
+from httpayer.codec import encode_header
+from httpayer.facilitator import FacilitatorClient
+from httpayer.gate import X402Gate
+from httpayer.sessions import CreditLedger
+
+PAY_TO = "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0"
+USDC   = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+
+class FakeFacilitator:
+    verify_url = "http://facilitator/facilitator/verify"
+    settle_url = "http://facilitator/facilitator/settle"
+
+    def __init__(self):
+        self.settle_result = {"success": True, "transaction": "0xtx"}
+        self.settled = []
+
+    def verify(self, payment, reqs):
+        return {"isValid": True}
+
+    def settle(self, payment, reqs):
+        self.settled.append(reqs["maxAmountRequired"])
+        return self.settle_result
+
+PAYMENT = encode_header({
+    "x402Version": 1, "scheme": "exact", "network": "base-sepolia",
+    "payload": {"signature": "0xab", "authorization": {"from": "0x1"}},
+})
+
+@pytest.fixture
+def facilitator():
+    return FakeFacilitator()
+
+@pytest.fixture
+def app(facilitator):
+    gate = X402Gate(pay_to=PAY_TO, network="base-sepolia", asset_address=USDC,
+                    max_amount=100, asset_name="USDC", asset_version="2",
+                    facilitator=facilitator, session_ledger=CreditLedger())
+    app = Flask(__name__)
+    app.served = []
+
+    @app.route("/weather")
+    @gate.gate
+    def weather():
+        app.served.append("weather")
+        return {"weather": "sunny"}
+
+    @app.route("/batch", methods=["POST"])
+    @gate.batch(stream=True)
+    def batch(city):
+        app.served.append(city)
+        return {"city": city}
+
+    app.add_url_rule("/credits", "credits", gate.sell_credits(10))
+    return app
+
+def test_paid_request_carries_settlement_header(app, facilitator):
+    resp = app.test_client().get("/weather", headers={"X-PAYMENT": PAYMENT})
+    assert resp.status_code == 200
+    assert resp.headers["X-PAYMENT-RESPONSE"]
+    assert facilitator.settled == ["100"]
+
+def test_missing_payment_is_402(app):
+    resp = app.test_client().get("/weather")
+    assert resp.status_code == 402
+    assert resp.get_json()["accepts"][0]["maxAmountRequired"] == "100"
+
+def test_failed_settlement_issues_no_session(app, facilitator):
+    facilitator.settle_result = {"success": False, "errorReason": "insufficient_funds"}
+    resp = app.test_client().get("/credits", headers={"X-PAYMENT": PAYMENT})
+    assert resp.status_code == 402
+    assert "insufficient_funds" in resp.get_json()["error"]
+    assert "X-PAYMENT-SESSION" not in resp.headers
+    assert facilitator.settled == ["1000"]
+
+def test_failed_settlement_withholds_streamed_batch(app, facilitator):
+    facilitator.settle_result = {"success": False}
+    resp = app.test_client().post("/batch", json={"items": ["paris", "rome"]},
+                                  headers={"X-PAYMENT": PAYMENT})
+    assert resp.status_code == 402
+    assert app.served == []
+
+def test_failed_settlement_replaces_the_response(app, facilitator):
+    facilitator.settle_result = {"success": False, "errorReason": "invalid_signature"}
+    resp = app.test_client().get("/weather", headers={"X-PAYMENT": PAYMENT})
+    assert resp.status_code == 402
+    assert "X-PAYMENT-RESPONSE" not in resp.headers
+
+def test_revalidation_needs_etag_fn_or_cache():
+    gate = X402Gate(pay_to=PAY_TO, network="base-sepolia", asset_address=USDC,
+                    max_amount=100, asset_name="USDC", asset_version="2",
+                    facilitator=FakeFacilitator())
+    with pytest.raises(ValueError):
+        gate.gate(revalidate_ttl=60)
+
+def test_revalidation_never_runs_the_view_unpaid(facilitator):
+    gate = X402Gate(pay_to=PAY_TO, network="base-sepolia", asset_address=USDC,
+                    max_amount=100, asset_name="USDC", asset_version="2",
+                    facilitator=facilitator)
+    app = Flask(__name__)
+    runs = []
+
+    @app.route("/report")
+    @gate.gate(cache_ttl=60, revalidate_ttl=60)
+    def report():
+        runs.append(1)
+        return {"report": "q3"}
+
+    client = app.test_client()
+    paid = client.get("/report", headers={"X-PAYMENT": PAYMENT})
+    assert paid.status_code == 200 and len(runs) == 1
+    revalidate = {"X-PAYMENT-RECEIPT": paid.headers["X-PAYMENT-RECEIPT"],
+                  "If-None-Match": paid.headers["ETag"]}
+    assert client.get("/report", headers=revalidate).status_code == 304
+
+    gate._response_cache.clear()
+    resp = client.get("/report", headers=revalidate)
+    assert resp.status_code == 402
+    assert len(runs) == 1
+
+@pytest.fixture
+def cached(facilitator):
+    gate = X402Gate(pay_to=PAY_TO, network="base-sepolia", asset_address=USDC,
+                    max_amount=100, asset_name="USDC", asset_version="2",
+                    facilitator=facilitator)
+    app = Flask(__name__)
+    app.served = []
+
+    @app.route("/forecast", methods=["GET", "POST"])
+    @gate.gate(cache_ttl=30)
+    def forecast():
+        app.served.append(request.get_data())
+        return {"forecast": len(app.served)}
+
+    @app.route("/greeting")
+    @gate.gate(cache_ttl=30, vary_headers=["Accept-Language"])
+    def greeting():
+        app.served.append(request.headers.get("Accept-Language"))
+        return {"lang": request.headers.get("Accept-Language")}
+
+    return app
+
+def test_response_cache_replays_paid_hits(cached, facilitator):
+    client = cached.test_client()
+    first = client.get("/forecast", headers={"X-PAYMENT": PAYMENT})
+    second = client.get("/forecast", headers={"X-PAYMENT": PAYMENT})
+    assert first.get_json() == second.get_json() == {"forecast": 1}
+    assert len(cached.served) == 1
+    assert facilitator.settled == ["100", "100"]
+    assert client.get("/forecast").status_code == 402
+
+def test_response_cache_expires_after_ttl(cached, monkeypatch):
+    client = cached.test_client()
+    client.get("/forecast", headers={"X-PAYMENT": PAYMENT})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 31)
+    assert client.get("/forecast", headers={"X-PAYMENT": PAYMENT}).get_json() == {"forecast": 2}
+
+def test_response_cache_keys_post_by_body(cached):
+    client = cached.test_client()
+    for body in ("paris", "rome", "paris"):
+        client.post("/forecast", data=body, headers={"X-PAYMENT": PAYMENT})
+    assert cached.served == [b"paris", b"rome"]
+
+def test_response_cache_keys_by_vary_headers(cached):
+    client = cached.test_client()
+    for lang in ("en", "fr", "en"):
+        resp = client.get("/greeting", headers={"X-PAYMENT": PAYMENT, "Accept-Language": lang})
+        assert resp.get_json() == {"lang": lang}
+    assert cached.served == ["en", "fr"]
+    assert "Accept-Language" in resp.headers["Vary"]
+
+def exact_payment(value):
+    now = int(time.time())
+    return encode_header({
+        "x402Version": 1, "scheme": "exact", "network": "base-sepolia",
+        "payload": {"signature": "0xab", "authorization": {
+            "from": "0x1", "to": PAY_TO, "value": str(value), "nonce": "0x01",
+            "validAfter": str(now - 5), "validBefore": str(now + 60)}},
+    })
+
+@pytest.fixture
+def batch_app():
+    # real local prevalidation; only the remote verify and settle are faked
+    facilitator = FacilitatorClient("http://facilitator")
+    facilitator._verify_remote = lambda payload, reqs: (True, {"isValid": True})
+    facilitator.settle = lambda payment, reqs: {"success": True, "transaction": "0xtx"}
+    gate = X402Gate(pay_to=PAY_TO, network="base-sepolia", asset_address=USDC,
+                    max_amount=100, asset_name="USDC", asset_version="2",
+                    facilitator=facilitator)
+    app = Flask(__name__)
+    app.served = []
+
+    @app.route("/batch", methods=["POST"])
+    @gate.batch(max_items=3)
+    def batch(city):
+        app.served.append(city)
+        return {"city": city}
+
+    return app
+
+def test_batch_payment_for_fewer_items_is_insufficient(batch_app):
+    client = batch_app.test_client()
+    resp = client.post("/batch", json={"items": ["paris", "rome"]},
+                       headers={"X-PAYMENT": exact_payment(100)})
+    assert resp.status_code == 402
+    assert "insufficient_amount" in resp.get_json()["error"]
+    assert resp.get_json()["accepts"][0]["maxAmountRequired"] == "200"
+    assert batch_app.served == []
+
+    resp = client.post("/batch", json={"items": ["paris", "rome"]},
+                       headers={"X-PAYMENT": exact_payment(200)})
+    assert resp.status_code == 200
+    assert [r["result"]["city"] for r in resp.get_json()["results"]] == ["paris", "rome"]
+
+def test_batch_enforces_max_items(batch_app):
+    resp = batch_app.test_client().post("/batch", json={"items": ["a", "b", "c", "d"]},
+                                        headers={"X-PAYMENT": exact_payment(400)})
+    assert resp.status_code == 400
+    assert "at most 3 items" in resp.get_json()["error"]
+    assert batch_app.served == []
@@ -0,0 +1,105 @@
+import pytest
+
+from httpayer.codec import encode_header
+from httpayer.middleware import RouteTable, X402Middleware
+
+PAY_TO = "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0"
+USDC   = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+
+@pytest.fixture
+def routes():
+    return RouteTable(pay_to=PAY_TO, network="base-sepolia", asset_address=USDC,
+                      asset_name="USDC", asset_version="2", facilitator_url="http://facilitator")
+
+def price(rule):
+    return None if rule is None else int(rule.requirements["maxAmountRequired"])
+
+def test_static_route_ignores_slashes(routes):
+    routes.add("/weather", 100)
+    assert price(routes.match("/weather")) == 100
+    assert price(routes.match("weather/")) == 100
+    assert routes.match("/weather/today") is None
+
+def test_param_and_prefix_routes(routes):
+    routes.add("/weather/<city>", 200)
+    routes.add("/forecast/{city}/daily", 300)
+    routes.add("/data/*", 400)
+    assert price(routes.match("/weather/paris")) == 200
+    assert routes.match("/weather/paris/extra") is None
+    assert price(routes.match("/forecast/rome/daily")) == 300
+    assert price(routes.match("/data/a/b/c")) == 400
+    assert routes.match("/other") is None
+
+def test_precedence_static_then_param_then_longest_prefix(routes):
+    routes.add("/api/*", 1)
+    routes.add("/api/v1/*", 2)
+    routes.add("/api/v1/<item>", 3)
+    routes.add("/api/v1/special", 4)
+    assert price(routes.match("/api/v1/special")) == 4
+    assert price(routes.match("/api/v1/other")) == 3
+    assert price(routes.match("/api/v1/other/deeper")) == 2
+    assert price(routes.match("/api/v2/x")) == 1
+
+def test_methods_restrict_a_route(routes):
+    routes.add("/items", 10, methods=["post"])
+    routes.add("/items", 5)
+    assert price(routes.match("/items", "POST")) == 10
+    assert price(routes.match("/items", "GET")) == 5
+
+def test_requirements_and_facilitators_are_interned(routes):
+    a = routes.add("/a", 100)
+    b = routes.add("/b/<x>", 100)
+    c = routes.add("/c", 200, facilitator_url="http://other")
+    assert a.requirements is b.requirements
+    assert a.facilitator is b.facilitator
+    assert c.requirements is not a.requirements
+    assert c.facilitator is not a.facilitator
+
+def test_unknown_override_is_rejected(routes):
+    with pytest.raises(ValueError):
+        routes.add("/a", 1, colour="red")
+
+class FakeFacilitator:
+    def __init__(self, settle_result):
+        self.settle_result = settle_result
+
+    def verify(self, payment, reqs):
+        return {"isValid": True}
+
+    def settle(self, payment, reqs):
+        return self.settle_result
+
+def call(routes, settle_result, method="GET"):
+    rule = routes.add("/weather", 100)
+    rule.facilitator = FakeFacilitator(settle_result)
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"sunny"]
+
+    environ = {"PATH_INFO": "/weather", "REQUEST_METHOD": method, "wsgi.url_scheme": "http",
+               "HTTP_HOST": "localhost", "SERVER_NAME": "localhost", "SERVER_PORT": "80"}
+    if method != "OPTIONS":
+        environ["HTTP_X_PAYMENT"] = encode_header({"scheme": "exact", "payload": {}})
+    started = {}
+    body = X402Middleware(app, routes)(environ, lambda status, headers: started.update(
+        status=status, headers=dict(headers)))
+    return started, b"".join(body)
+
+def test_middleware_releases_response_after_settlement(routes):
+    started, body = call(routes, {"success": True, "transaction": "0xtx"})
+    assert started["status"] == "200 OK"
+    assert "X-PAYMENT-RESPONSE" in started["headers"]
+    assert body == b"sunny"
+
+def test_middleware_withholds_response_when_settlement_fails(routes):
+    started, body = call(routes, {"success": False, "errorReason": "insufficient_funds"})
+    assert started["status"].startswith("402")
+    assert b"sunny" not in body
+    assert b"insufficient_funds" in body
+
+def test_middleware_passes_preflight_through_unpaid(routes):
+    started, body = call(routes, {"success": False}, method="OPTIONS")
+    assert started["status"] == "200 OK"
+    assert "X-PAYMENT-RESPONSE" not in started["headers"]
+    assert body == b"sunny"
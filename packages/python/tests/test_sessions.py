@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from httpayer.sessions import CreditLedger
+
+def stored_credits(ledger, sid):
+    return ledger._con.execute("SELECT credits FROM sessions WHERE session_id = ?", (sid,)).fetchone()[0]
+
+def test_spend_and_balance():
+    ledger = CreditLedger()
+    sid = ledger.issue(3, ttl=60)
+    assert ledger.spend(sid) == 2
+    assert ledger.spend(sid, 2) == 0
+    assert ledger.balance(sid) == 0
+    with pytest.raises(ValueError, match="session_exhausted"):
+        ledger.spend(sid)
+    with pytest.raises(ValueError, match="unknown_session"):
+        ledger.spend("nope")
+
+def test_spends_are_buffered_until_flush_every():
+    ledger = CreditLedger(flush_every=3)
+    sid = ledger.issue(10, ttl=60)
+    ledger.spend(sid)
+    ledger.spend(sid)
+    assert stored_credits(ledger, sid) == 10
+    ledger.spend(sid)
+    assert stored_credits(ledger, sid) == 7
+    ledger.spend(sid)
+    ledger.flush()
+    assert stored_credits(ledger, sid) == 6
+
+def test_balances_survive_a_restart(tmp_path):
+    db = str(tmp_path / "ledger.db")
+    ledger = CreditLedger(db)
+    sid = ledger.issue(5, ttl=60)
+    ledger.spend(sid, 2)
+    ledger.flush()
+    assert CreditLedger(db).balance(sid) == 3
+
+def test_expired_sessions_are_rejected_and_evicted():
+    ledger = CreditLedger()
+    expired = ledger.issue(5, ttl=60)
+    live = ledger.issue(5, ttl=60)
+    ledger._sessions[expired][1] = time.time() - 1
+    assert ledger.balance(expired) == 0
+    with pytest.raises(ValueError, match="session_expired"):
+        ledger.spend(expired)
+    ledger.flush()
+    assert expired not in ledger._sessions
+    assert live in ledger._sessions
+
+def test_spent_sessions_are_evicted_on_flush():
+    ledger = CreditLedger()
+    sid = ledger.issue(1, ttl=60)
+    ledger.spend(sid)
+    ledger.flush()
+    assert sid not in ledger._sessions
+    assert stored_credits(ledger, sid) == 0
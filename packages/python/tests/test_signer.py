@@ -0,0 +1,116 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from eth_account import Account
+
+from httpayer.codec import decode_header, encode_header
+from httpayer.signer import LocalSigner, PresignedSigner
+from httpayer.x402_exact import PaymentRequirements, _split_sig, verify_exact
+
+PRIVATE_KEY = "0x" + "11" * 32
+PAY_TO = "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0"
+USDC   = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+
+REQ = {
+    "scheme": "exact",
+    "network": "base-sepolia",
+    "maxAmountRequired": "1000",
+    "resource": "http://localhost/weather",
+    "payTo": PAY_TO,
+    "asset": USDC,
+    "maxTimeoutSeconds": 60,
+    "extra": {"name": "USDC", "version": "2"},
+}
+
+# verify_exact only needs the chain id from its Web3 instance
+W3 = SimpleNamespace(eth=SimpleNamespace(chain_id=84532))
+
+def verify(header, req=REQ, w3=W3):
+    payment = decode_header(header)
+    return verify_exact(w3, payment["payload"], PaymentRequirements.from_json(req))
+
+def test_signed_header_verifies():
+    signer = LocalSigner(PRIVATE_KEY)
+    result = verify(signer.payment_header(REQ))
+    assert result.isValid, result.invalidReason
+    assert result.payer == Account.from_key(PRIVATE_KEY).address
+
+@pytest.mark.parametrize("v_offset", [27, 0])
+def test_dict_signature_verifies_with_either_v_convention(v_offset):
+    payment = LocalSigner(PRIVATE_KEY).sign(REQ)
+    parts = _split_sig(payment["payload"]["signature"])
+    parts["v"] = parts["v"] - 27 + v_offset
+    payment["payload"]["signature"] = parts
+    result = verify_exact(W3, payment["payload"], PaymentRequirements.from_json(REQ))
+    assert result.isValid, result.invalidReason
+
+def test_tampered_or_foreign_chain_payment_does_not_verify():
+    signer = LocalSigner(PRIVATE_KEY)
+    payment = signer.sign(REQ)
+    payment["payload"]["authorization"]["nonce"] = "0x" + "22" * 32
+    tampered = verify_exact(W3, payment["payload"], PaymentRequirements.from_json(REQ))
+    assert not tampered.isValid
+
+    other_chain = SimpleNamespace(eth=SimpleNamespace(chain_id=8453))
+    assert not verify(signer.payment_header(REQ), w3=other_chain).isValid
+
+def test_select_and_max_value():
+    signer = LocalSigner(PRIVATE_KEY, max_value=999)
+    assert signer.select([dict(REQ, network="unknown"), REQ]) is REQ
+    with pytest.raises(ValueError):
+        signer.select([dict(REQ, scheme="upto")])
+    with pytest.raises(ValueError, match="exceeds max_value"):
+        signer.sign(REQ)
+
+def pooled(signer):
+    pool = signer._pools.get(signer._target(REQ))
+    return list(pool) if pool is not None else []
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_pool_serves_presigned_authorizations_and_refills():
+    signer = PresignedSigner(PRIVATE_KEY, pool_size=3)
+    try:
+        signer.warm(REQ)
+        ready = pooled(signer)
+        assert len(ready) == 3
+        payment = signer.sign(REQ)
+        assert payment is ready[0]
+        assert verify(encode_header(payment)).isValid
+        wait_for(lambda: len(pooled(signer)) == 3)
+        nonces = [p["payload"]["authorization"]["nonce"] for p in pooled(signer)]
+        assert len(set(nonces)) == 3 and payment["payload"]["authorization"]["nonce"] not in nonces
+    finally:
+        signer.close()
+
+def test_nearly_expired_authorizations_are_not_handed_out():
+    signer = PresignedSigner(PRIVATE_KEY, pool_size=2, min_validity=15)
+    try:
+        signer.warm(REQ)
+        stale = pooled(signer)
+        for p in stale:
+            p["payload"]["authorization"]["validBefore"] = str(int(time.time()) + 5)
+        payment = signer.sign(REQ)
+        assert payment not in stale
+        assert int(payment["payload"]["authorization"]["validBefore"]) > time.time() + 15
+        wait_for(lambda: len(pooled(signer)) == 2)
+        assert not any(p in stale for p in pooled(signer))
+    finally:
+        signer.close()
+
+def test_background_pass_re_signs_before_expiry():
+    signer = PresignedSigner(PRIVATE_KEY, pool_size=2, valid_secs=3, min_validity=1,
+                             refresh_secs=0.2)
+    try:
+        signer.warm(REQ)
+        first = pooled(signer)
+        wait_for(lambda: not any(p in first for p in pooled(signer)) and len(pooled(signer)) == 2)
+        cutoff = time.time() + signer.min_validity
+        assert all(int(p["payload"]["authorization"]["validBefore"]) > cutoff for p in pooled(signer))
+    finally:
+        signer.close()
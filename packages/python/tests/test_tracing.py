@@ -0,0 +1,123 @@
+import json
+import logging
+
+import pytest
+
+from httpayer import tracing
+from httpayer.tracing import JsonFileExporter, OTLPHttpExporter, Tracer, parse_traceparent
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID  = "00f067aa0ba902b7"
+
+class Collect:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span, service):
+        self.spans.append((service, span))
+
+def test_parse_traceparent():
+    ctx = parse_traceparent(f" 00-{TRACE_ID}-{SPAN_ID}-01 ")
+    assert (ctx.trace_id, ctx.span_id, ctx.sampled) == (TRACE_ID, SPAN_ID, True)
+    assert ctx.traceparent == f"00-{TRACE_ID}-{SPAN_ID}-01"
+    assert parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-00").sampled is False
+
+@pytest.mark.parametrize("value", [
+    None, "", "garbage", f"00-{TRACE_ID}-{SPAN_ID}", f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",
+    f"00-{'z' * 32}-{SPAN_ID}-01", f"00-{'0' * 32}-{SPAN_ID}-01", f"00-{TRACE_ID}-{'0' * 16}-01",
+])
+def test_malformed_traceparent_is_ignored(value):
+    assert parse_traceparent(value) is None
+
+def test_inject_extract_round_trip():
+    tracer = Tracer(exporter=Collect())
+    assert tracing.inject() == {}
+    with tracer.span("client") as client:
+        headers = tracing.inject({"x-api-key": "k"})
+    assert headers["x-api-key"] == "k"
+    parent = tracing.extract(headers)
+    assert (parent.trace_id, parent.span_id) == (client.context.trace_id, client.context.span_id)
+
+    with tracer.span("server", parent=parent) as server:
+        with tracer.span("child") as child:
+            pass
+    assert server.context.trace_id == child.context.trace_id == client.context.trace_id
+    assert server.parent_id == client.context.span_id
+    assert child.parent_id == server.context.span_id
+    assert tracing.current() is None
+
+def test_sampling_decision_travels_with_the_trace():
+    collect = Collect()
+    tracer = Tracer(exporter=collect, sample_rate=0.0)
+    with tracer.span("root") as root:
+        with tracer.span("child"):
+            pass
+    assert not root.context.sampled and collect.spans == []
+    sampled = parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-01")
+    with tracer.span("remote", parent=sampled):
+        pass
+    assert [s.name for _, s in collect.spans] == ["remote"]
+
+def test_errors_are_recorded_and_reraised():
+    collect = Collect()
+    with pytest.raises(KeyError):
+        with Tracer(exporter=collect).span("boom"):
+            raise KeyError("x")
+    assert collect.spans[0][1].error == "KeyError: 'x'"
+
+def test_json_file_exporter(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    tracer = Tracer("svc", JsonFileExporter(str(path)))
+    with tracer.span("outer", path="/weather"):
+        with tracer.span("inner"):
+            pass
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(line["name"], line["service"]) for line in lines] == [("inner", "svc"), ("outer", "svc")]
+    assert lines[0]["parentSpanId"] == lines[1]["spanId"]
+    assert lines[1]["attributes"] == {"path": "/weather"}
+
+def test_otlp_exporter_batches_by_service():
+    exporter = OTLPHttpExporter("http://collector:4318/", interval=3600)
+    posted = []
+    exporter._http.post = lambda url, json, timeout: posted.append((url, json))
+    with Tracer("proxy", exporter).span("call", status=200, ok=True, ratio=0.5, skip=None):
+        pass
+    exporter.flush()
+    exporter.flush()        # nothing queued: no second post
+    assert len(posted) == 1
+    url, body = posted[0]
+    assert url == "http://collector:4318/v1/traces"
+    resource = body["resourceSpans"][0]
+    assert resource["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": "proxy"}}]
+    span = resource["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "call" and "parentSpanId" not in span
+    assert span["attributes"] == [
+        {"key": "status", "value": {"intValue": "200"}},
+        {"key": "ok", "value": {"boolValue": True}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+    ]
+    assert span["status"] == {"code": 1}
+
+def test_otlp_exporter_drops_spans_beyond_max_queue():
+    exporter = OTLPHttpExporter("http://collector", interval=3600, max_queue=2)
+    tracer = Tracer(exporter=exporter)
+    for _ in range(3):
+        with tracer.span("s"):
+            pass
+    assert len(exporter._queue) == 2
+
+def test_log_event_samples_whole_traces(caplog, monkeypatch):
+    logger = logging.getLogger("test_tracing")
+    tracer = Tracer()
+    caplog.set_level(logging.INFO, logger="test_tracing")
+    keep = parse_traceparent(f"00-{'0' * 31}1-{SPAN_ID}-01")       # low trace id: always kept
+    drop = parse_traceparent(f"00-{'f' * 32}-{SPAN_ID}-01")
+    monkeypatch.setattr(tracing, "LOG_SAMPLE_RATE", 0.5)
+    for parent in (keep, drop):
+        with tracer.span("req", parent=parent):
+            tracing.log_event(logger, "paid", amount=100)
+            tracing.log_event(logger, "settled")
+    records = [json.loads(r.getMessage()) for r in caplog.records]
+    assert records == [{"event": "paid", "traceId": keep.trace_id, "amount": 100},
+                       {"event": "settled", "traceId": keep.trace_id}]
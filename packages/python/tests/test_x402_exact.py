@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from httpayer.x402_exact import FrozenMap, PaymentRequirements
+
+WIRE = {
+    "scheme": "exact",
+    "network": "base-sepolia",
+    "maxAmountRequired": "1000",
+    "resource": "http://localhost/weather",
+    "payTo": "0x58a4cae5e8dda3a5614972f34951e482a29ef0f0",
+    "asset": "0x036cbd53842c5426634e7929541ec2318f3dcf7e",
+    "maxTimeoutSeconds": 60,
+    "extra": {"name": "USDC", "version": "2"},
+    "description": "weather",
+    "mimeType": "application/json",
+}
+
+def test_from_json_normalizes_and_round_trips():
+    req = PaymentRequirements.from_json(WIRE)
+    assert req.maxAmountRequired == 1000
+    assert req.payTo == "0x58a4Cae5e8dDA3a5614972F34951e482a29ef0f0"
+    assert req.asset == "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+    assert isinstance(req.extra, FrozenMap) and req.extra["name"] == "USDC"
+
+    out = req.to_dict()
+    assert out == dict(WIRE, payTo=req.payTo, asset=req.asset)
+    assert type(out["extra"]) is dict
+    assert PaymentRequirements.from_json(out) == req
+    assert PaymentRequirements.from_json(req.to_json()) == req
+    assert PaymentRequirements.from_json(json.dumps(WIRE)) == req
+
+def test_optional_fields_default():
+    minimal = {k: WIRE[k] for k in ("scheme", "network", "maxAmountRequired", "payTo", "asset")}
+    req = PaymentRequirements.from_json(minimal)
+    assert (req.resource, req.maxTimeoutSeconds, dict(req.extra), req.description, req.mimeType) \
+        == ("", 60, {}, "", "")
+    with pytest.raises(KeyError):
+        PaymentRequirements.from_json({"scheme": "exact", "network": "base-sepolia"})
+
+def test_requirements_are_hashable_cache_keys():
+    a = PaymentRequirements.from_json(WIRE)
+    b = PaymentRequirements.from_json(dict(WIRE, payTo=WIRE["payTo"].upper().replace("0X", "0x"),
+                                           extra={"version": "2", "name": "USDC"}))
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b, PaymentRequirements.from_json(dict(WIRE, maxAmountRequired="2000"))}) == 2
+    with pytest.raises(AttributeError):
+        a.network = "base"